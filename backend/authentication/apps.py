@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
+
+    def ready(self):
+        # Cache de usuários por processo (authentication/current_user.py)
+        from django.db.models.signals import post_save, post_delete
+        from .current_user import clear_user_cache
+        from .models import User, Clinica, Filial
+
+        for model in [User, Clinica, Filial]:
+            uid = f'current_user_cache_{model._meta.model_name}'
+            post_save.connect(clear_user_cache, sender=model, dispatch_uid=f'{uid}_post_save')
+            post_delete.connect(clear_user_cache, sender=model, dispatch_uid=f'{uid}_post_delete')
@@ -0,0 +1,136 @@
+"""
+Identificação do usuário atual das requisições
+
+O frontend identifica o usuário pela sessão do Django ou, em desenvolvimento,
+pelo header X-User-Id (ou parâmetro ?user_id=). As views usam
+get_current_user(request), que:
+
+- resolve o usuário uma única vez por requisição (guardado no próprio request);
+- carrega clínica e filial junto (select_related), evitando novas consultas
+  ao acessar user.clinica / user.filial;
+- mantém um cache curto por processo (CURRENT_USER_CACHE_TTL segundos) de
+  usuário -> clínica/filial/perfil, para que requisições seguidas do mesmo
+  usuário não consultem o banco. Gravações em User, Clinica ou Filial limpam
+  o cache do processo (signals em authentication/apps.py).
+
+get_fallback_user(**filtros) devolve o usuário padrão de desenvolvimento
+(primeiro usuário ativo que atenda aos filtros), com o id também em cache.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+
+
+# user_id -> (expira_em, usuário com clínica e filial carregadas)
+_users = {}
+# filtros do usuário padrão -> (expira_em, user_id ou None)
+_fallbacks = {}
+_lock = threading.Lock()
+
+_REQUEST_ATTR = '_current_user'
+_MISSING = object()
+
+
+def _ttl():
+    return getattr(settings, 'CURRENT_USER_CACHE_TTL', 30)
+
+
+def _cache_get(store, key):
+    with _lock:
+        entry = store.get(key)
+    if entry is None or entry[0] < time.monotonic():
+        return _MISSING
+    return entry[1]
+
+
+def _cache_set(store, key, value):
+    if _ttl() <= 0:
+        return
+    with _lock:
+        store[key] = (time.monotonic() + _ttl(), value)
+
+
+def clear_user_cache(**kwargs):
+    """Limpa o cache do processo (usado pelos signals de User, Clinica e Filial)"""
+    with _lock:
+        _users.clear()
+        _fallbacks.clear()
+
+
+def load_user(user_id):
+    """
+    Usuário com clínica e filial carregadas, pelo cache do processo.
+    Cada chamada recebe uma cópia, para que alterações em uma requisição
+    não vazem para outras.
+    """
+    from .models import User
+
+    user = _cache_get(_users, user_id)
+    if user is _MISSING:
+        user = User.objects.select_related('clinica', 'filial').filter(id=user_id).first()
+        _cache_set(_users, user_id, user)
+    return copy.copy(user) if user is not None else None
+
+
+def requested_user_id(request):
+    """Id informado pelo frontend (header X-User-Id ou parâmetro user_id), se houver"""
+    raw_id = request.headers.get('X-User-Id') or request.GET.get('user_id')
+    try:
+        return int(raw_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _resolve(request):
+    if request.user.is_authenticated:
+        return load_user(request.user.pk)
+
+    user_id = requested_user_id(request)
+    if user_id is None:
+        return None
+    user = load_user(user_id)
+    return user if user is not None and user.is_active_user else None
+
+
+def get_current_user(request):
+    """
+    Usuário da requisição: sessão do Django, depois header X-User-Id,
+    depois parâmetro user_id. Retorna None se nenhum usuário ativo for
+    identificado. O resultado fica guardado no request.
+    """
+    # Request do DRF: guarda no HttpRequest original, compartilhado com o Django
+    http_request = getattr(request, '_request', request)
+    user = getattr(http_request, _REQUEST_ATTR, _MISSING)
+    if user is _MISSING:
+        user = _resolve(request)
+        setattr(http_request, _REQUEST_ATTR, user)
+    return user
+
+
+def get_fallback_user(**filters):
+    """
+    Usuário padrão de desenvolvimento: primeiro usuário ativo (por id)
+    que atenda aos filtros, ex.: get_fallback_user(user_type='FISIOTERAPEUTA')
+    """
+    from .models import User
+
+    key = tuple(sorted((name, repr(value)) for name, value in filters.items()))
+    user_id = _cache_get(_fallbacks, key)
+    if user_id is _MISSING:
+        user_id = User.objects.filter(is_active_user=True, **filters).order_by('id').values_list('id', flat=True).first()
+        _cache_set(_fallbacks, key, user_id)
+    return load_user(user_id) if user_id is not None else None
+
+
+def get_current_user_or_default(request, **filters):
+    """
+    Usuário atual ou, quando a requisição não identifica nenhum usuário,
+    o usuário padrão (get_fallback_user). Um id informado mas inválido
+    retorna None.
+    """
+    user = get_current_user(request)
+    if user is None and requested_user_id(request) is None:
+        user = get_fallback_user(**filters)
+    return user
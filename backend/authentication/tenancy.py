@@ -0,0 +1,59 @@
+"""
+Escopo de tenant (clínica) dos querysets
+
+Os modelos com dados de clínica declaram um TenantScopedManager informando
+os caminhos até a clínica, a filial e o fisioterapeuta responsável:
+
+    objects = TenantScopedManager(clinica='clinica', filial='filial', fisioterapeuta='fisioterapeuta')
+
+e as views usam Model.objects.for_user(user) (ou queryset.for_user(user)),
+que aplica as regras de papel:
+
+- sem usuário ou usuário sem clínica: nenhum registro
+- Gestor Geral: toda a clínica (rede)
+- Gestor de Filial e Atendente: a própria filial (quando o modelo tem filial)
+- Fisioterapeuta: os próprios registros (quando o modelo tem fisioterapeuta)
+
+Os índices compostos dos modelos seguem esses caminhos, ex.:
+(clinica, filial, is_active) e (fisioterapeuta, scheduled_date, status).
+"""
+from django.db import models
+
+
+class TenantScopedQuerySet(models.QuerySet):
+
+    def for_user(self, user):
+        """Registros visíveis para o usuário, conforme o papel"""
+        paths = self.model._tenant_paths
+
+        if user is None or not getattr(user, 'clinica_id', None):
+            return self.none()
+
+        queryset = self.filter(**{paths['clinica']: user.clinica_id})
+
+        if user.is_fisioterapeuta and paths['fisioterapeuta']:
+            queryset = queryset.filter(**{paths['fisioterapeuta']: user.pk})
+        elif (user.is_gestor_filial or user.is_atendente) and paths['filial']:
+            queryset = queryset.filter(**{paths['filial']: user.filial_id})
+
+        return queryset
+
+
+class TenantScopedManager(models.Manager.from_queryset(TenantScopedQuerySet)):
+    """
+    Manager com for_user(user)
+
+    Args:
+        clinica: caminho até a clínica (ex.: 'clinica', 'patient__clinica')
+        filial: caminho até a filial, ou None se o modelo não é filtrado por filial
+        fisioterapeuta: caminho até o fisioterapeuta responsável, ou None
+    """
+
+    def __init__(self, clinica='clinica', filial=None, fisioterapeuta=None):
+        super().__init__()
+        self.tenant_paths = {'clinica': clinica, 'filial': filial, 'fisioterapeuta': fisioterapeuta}
+
+    def contribute_to_class(self, cls, name):
+        super().contribute_to_class(cls, name)
+        # Os querysets (inclusive os de relacionamentos) leem os caminhos do modelo
+        cls._tenant_paths = self.tenant_paths
@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.contrib.auth import authenticate, login, logout
 from .models import User, Filial, Lead
+from .current_user import get_current_user, get_current_user_or_default, get_fallback_user
 from .serializers import (
     UserSerializer,
     UserListSerializer,
@@ -110,23 +111,9 @@ def current_user(request):
     Retorna informações do usuário logado
     GET /api/auth/me/
     """
-    # Prioridade 1: Sessão Django autenticada
-    if request.user.is_authenticated:
-        serializer = UserProfileSerializer(request.user)
-        return Response(serializer.data)
-    
-    # Prioridade 2: Header X-User-Id enviado pelo frontend
-    user_id = request.headers.get('X-User-Id')
-    if user_id:
-        try:
-            user = User.objects.get(id=int(user_id), is_active_user=True)
-            serializer = UserProfileSerializer(user)
-            return Response(serializer.data)
-        except (User.DoesNotExist, ValueError):
-            pass
-    
-    # Fallback para desenvolvimento: primeiro usuário ativo
-    user = User.objects.filter(is_active_user=True).order_by('id').first()
+    # Sessão Django, header X-User-Id enviado pelo frontend ou,
+    # em desenvolvimento, o primeiro usuário ativo
+    user = get_current_user(request) or get_fallback_user()
     if user:
         serializer = UserProfileSerializer(user)
         return Response(serializer.data)
@@ -210,14 +197,7 @@ def list_filiais(request):
     - Gestor Geral: todas as filiais da rede
     - Outros: apenas sua própria filial
     """
-    user_id = request.query_params.get('user_id')
-    if user_id:
-        try:
-            user = User.objects.get(id=int(user_id), is_active_user=True)
-        except (User.DoesNotExist, ValueError):
-            user = None
-    else:
-        user = User.objects.filter(is_active_user=True).order_by('id').first()
+    user = get_current_user_or_default(request)
     
     if not user or not user.clinica:
         return Response([], status=status.HTTP_200_OK)
@@ -253,16 +233,9 @@ def list_fisioterapeutas(request):
     from prontuario.models import Patient
     from django.db.models import Count
     
-    user_id = request.query_params.get('user_id')
     filial_id = request.query_params.get('filial_id')
     
-    if user_id:
-        try:
-            simulated_user = User.objects.get(id=int(user_id), is_active_user=True)
-        except (User.DoesNotExist, ValueError):
-            simulated_user = None
-    else:
-        simulated_user = User.objects.filter(is_active_user=True).order_by('id').first()
+    simulated_user = get_current_user_or_default(request)
     
     if not simulated_user or not simulated_user.clinica:
         return Response([], status=status.HTTP_200_OK)
@@ -325,15 +298,7 @@ def list_fisioterapeutas_for_transfer(request):
     """
     from django.db.models import Count
     
-    user_id = request.query_params.get('user_id')
-    
-    if user_id:
-        try:
-            user = User.objects.get(id=int(user_id), is_active_user=True)
-        except (User.DoesNotExist, ValueError):
-            user = None
-    else:
-        user = User.objects.filter(is_active_user=True).order_by('id').first()
+    user = get_current_user_or_default(request)
     
     if not user or not user.clinica:
         return Response([], status=status.HTTP_200_OK)
@@ -378,15 +343,11 @@ def create_fisioterapeuta(request):
     Cria um novo fisioterapeuta na clínica do gestor logado
     POST /api/auth/fisioterapeutas/create/
     """
-    # Tentar obter user_id do header X-User-Id ou da query param
-    user_id = request.headers.get('X-User-Id') or request.query_params.get('user_id')
-    if user_id:
-        try:
-            simulated_user = User.objects.get(id=int(user_id))
-        except User.DoesNotExist:
-            simulated_user = User.objects.filter(user_type__in=['GESTOR_GERAL', 'GESTOR_FILIAL'], is_active_user=True).order_by('id').first()
-    else:
-        simulated_user = User.objects.filter(user_type__in=['GESTOR_GERAL', 'GESTOR_FILIAL'], is_active_user=True).order_by('id').first()
+    # Usuário do header X-User-Id ou da query param (fallback: primeiro gestor ativo)
+    simulated_user = (
+        get_current_user(request)
+        or get_fallback_user(user_type__in=['GESTOR_GERAL', 'GESTOR_FILIAL'])
+    )
     
     if not simulated_user or not simulated_user.is_gestor:
         return Response(
@@ -526,16 +487,9 @@ def list_atendentes(request):
     - Gestor Geral: todos os atendentes da rede (pode filtrar por filial)
     - Gestor Filial: apenas atendentes da sua filial
     """
-    user_id = request.query_params.get('user_id')
     filial_id = request.query_params.get('filial_id')
     
-    if user_id:
-        try:
-            simulated_user = User.objects.get(id=int(user_id), is_active_user=True)
-        except (User.DoesNotExist, ValueError):
-            simulated_user = None
-    else:
-        simulated_user = User.objects.filter(is_active_user=True).order_by('id').first()
+    simulated_user = get_current_user_or_default(request)
     
     if not simulated_user or not simulated_user.clinica:
         return Response([], status=status.HTTP_200_OK)
@@ -582,15 +536,11 @@ def create_atendente(request):
     Cria um novo atendente na clínica do gestor logado
     POST /api/auth/atendentes/create/
     """
-    # Tentar obter user_id do header X-User-Id ou da query param
-    user_id = request.headers.get('X-User-Id') or request.query_params.get('user_id')
-    if user_id:
-        try:
-            simulated_user = User.objects.get(id=int(user_id))
-        except User.DoesNotExist:
-            simulated_user = User.objects.filter(user_type__in=['GESTOR_GERAL', 'GESTOR_FILIAL'], is_active_user=True).order_by('id').first()
-    else:
-        simulated_user = User.objects.filter(user_type__in=['GESTOR_GERAL', 'GESTOR_FILIAL'], is_active_user=True).order_by('id').first()
+    # Usuário do header X-User-Id ou da query param (fallback: primeiro gestor ativo)
+    simulated_user = (
+        get_current_user(request)
+        or get_fallback_user(user_type__in=['GESTOR_GERAL', 'GESTOR_FILIAL'])
+    )
     
     if not simulated_user or not simulated_user.is_gestor:
         return Response(
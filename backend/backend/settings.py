@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -52,6 +53,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'prontuario.sql_profiling.SQLProfilingMiddleware',  # Só com SQL_PROFILING = True
     'corsheaders.middleware.CorsMiddleware',  # <-- Adicionado para o CORS
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,6 +92,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Workers de OCR escrevem em paralelo: transações já começam com
+            # a trava de escrita e esperam por ela em vez de falhar na hora
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -233,6 +241,44 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
 }
 
+# --- Cache ---
+# Local: cache em memória do processo. Em produção com vários workers,
+# defina REDIS_URL para compartilhar o cache (e a invalidação) entre eles.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'physiocapture',
+        }
+    }
+
+# Tempo (segundos) das respostas dos dashboards no cache; 0 desativa
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', 300))
+
+# Cache por processo do usuário atual (clínica/filial/perfil), em segundos; 0 desativa
+CURRENT_USER_CACHE_TTL = 30
+
+# --- Perfil SQL por requisição (prontuario/sql_profiling.py) ---
+# Cabeçalhos X-Query-Count/Server-Timing e log de requisições lentas; independe de DEBUG
+SQL_PROFILING = os.environ.get('SQL_PROFILING', '').lower() in ('1', 'true', 'yes')
+SQL_PROFILING_TOP_N = 5                    # consultas mais lentas no Server-Timing e no log
+SQL_PROFILING_EXPOSE_SQL = False           # True: texto do SQL no Server-Timing (só em desenvolvimento)
+SQL_PROFILING_DUPLICATE_THRESHOLD = 3      # repetições da mesma consulta tratadas como N+1
+SQL_PROFILING_SLOW_MS = int(os.environ.get('SQL_PROFILING_SLOW_MS', 500))
+SQL_PROFILING_SLOW_QUERIES = 50
+SQL_PROFILING_LOG = BASE_DIR / 'logs' / 'sql_slow_requests.jsonl'
+SQL_PROFILING_LOG_MAX_BYTES = 10 * 1024 * 1024
+SQL_PROFILING_LOG_BACKUPS = 5
+# Permite ao frontend (outra origem) ler os cabeçalhos do perfil
+CORS_EXPOSE_HEADERS = ['X-Query-Count', 'X-Query-Duplicates', 'Server-Timing']
+
 # --- File Upload Settings ---
 # Max upload size: 50MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50 MB
@@ -251,8 +297,15 @@ TESSERACT_CMD = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 # OCR Languages
 OCR_LANGUAGES = 'por+eng'  # Português e Inglês
 
+# OCR de PDFs: processos em paralelo (None = número de CPUs) e páginas rasterizadas por vez
+OCR_PDF_WORKERS = None
+OCR_PDF_PAGE_WINDOW = 4
+
+# Cache de resultados de OCR por conteúdo do arquivo (LRU): limite de entradas e de bytes de texto
+OCR_CACHE_MAX_ENTRIES = 10000
+OCR_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
 # --- Hugging Face Configuration ---
-import os
 HUGGINGFACE_API_TOKEN = os.environ.get('HUGGINGFACE_API_TOKEN', '')
 HUGGINGFACE_MODEL = 'openai/gpt-oss-20b'
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import DocumentCategory, Document, DocumentAccessLog
+from .models import DocumentCategory, Document, DocumentAccessLog, OCRJob, OCRCacheEntry
 
 
 @admin.register(DocumentCategory)
@@ -51,3 +51,19 @@ class DocumentAccessLogAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         # Não permite deletar logs
         return False
+
+
+@admin.register(OCRJob)
+class OCRJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'document', 'status', 'processed_pages', 'total_pages', 'attempts', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['document__title', 'document__patient__full_name']
+    raw_id_fields = ['document', 'requested_by']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
+
+
+@admin.register(OCRCacheEntry)
+class OCRCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ['content_hash', 'pages', 'confidence', 'size_bytes', 'hits', 'created_at', 'last_used_at']
+    search_fields = ['content_hash', 'key']
+    readonly_fields = ['key', 'content_hash', 'created_at', 'last_used_at']
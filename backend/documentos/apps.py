@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class DocumentosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'documentos'
+
+    def ready(self):
+        # Registra o índice de documentos na busca textual do prontuário
+        from . import search  # noqa: F401
+        from prontuario.signals import connect_search_signals
+        connect_search_signals()
@@ -0,0 +1,149 @@
+"""
+Benchmark da listagem de documentos (latência e bytes transferidos)
+
+Cria uma clínica sintética com `--documents` documentos, cada um com
+`--ocr-chars` caracteres de texto de OCR, e mede:
+
+- o endpoint GET /api/documentos/documents/ (latência p50/p95 e tamanho
+  da resposta);
+- a leitura de uma página de 20 documentos no banco com todas as colunas
+  (SELECT *) e com Document.objects.summary() (sem ocr_text/description).
+
+Os dados são criados dentro de uma transação desfeita ao final (use
+--keep para mantê-los).
+
+Uso:
+    python manage.py benchmark_document_list                       # 50.000 documentos
+    python manage.py benchmark_document_list --documents 5000 --runs 20 --json
+"""
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from authentication.models import Clinica, Filial, User
+from documentos.models import Document
+from prontuario.benchmarks import benchmark_client, ocr_texts, timings as _timings
+from prontuario.models import Patient
+
+
+PAGE_SIZE = 20
+
+
+def _fetch_rows(queryset):
+    """Executa o SQL do queryset e devolve as linhas brutas (sem montar objetos)"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _row_bytes(rows):
+    return sum(len(str(value).encode()) for row in rows for value in row if value is not None)
+
+
+class Command(BaseCommand):
+    help = 'Mede latência e bytes da listagem de documentos com OCR grande'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=50000, help='Documentos sintéticos')
+        parser.add_argument('--ocr-chars', type=int, default=5000, help='Caracteres de OCR por documento')
+        parser.add_argument('--runs', type=int, default=10, help='Repetições de cada medição')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Tamanho dos lotes do bulk_create')
+        parser.add_argument('--keep', action='store_true', help='Mantém os dados criados')
+        parser.add_argument('--json', action='store_true', help='Saída em JSON')
+
+    def handle(self, *args, **options):
+        if options['documents'] < 1 or options['runs'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--documents, --runs e --batch-size devem ser maiores que zero')
+
+        with transaction.atomic():
+            user = self._seed(options)
+            report = self._measure(user, options)
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        endpoint, full, summary = report['endpoint'], report['page_select_all'], report['page_summary']
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['documents']} documentos, {report['ocr_chars']} caracteres de OCR cada"
+        ))
+        self.stdout.write(
+            f"Endpoint: p50 {endpoint['p50_ms']} ms, p95 {endpoint['p95_ms']} ms, {endpoint['bytes']} bytes"
+        )
+        self.stdout.write(f"Página (SELECT *): p50 {full['p50_ms']} ms, {full['bytes']} bytes do banco")
+        self.stdout.write(f"Página (summary): p50 {summary['p50_ms']} ms, {summary['bytes']} bytes do banco")
+
+    def _seed(self, options):
+        rng = random.Random(42)
+        suffix = f'{time.time_ns()}'[-8:]
+        clinica = Clinica.objects.create(
+            nome=f'Benchmark {suffix}', cnpj=f'99.{suffix[:3]}.{suffix[3:6]}/0001-{suffix[6:]}',
+            razao_social='Benchmark LTDA', email='benchmark@example.com', telefone='(00) 0000-0000',
+            endereco='Rua Benchmark', numero='1', bairro='Centro', cidade='Recife', estado='PE', cep='50000-000'
+        )
+        filial = Filial.objects.create(
+            clinica=clinica, nome=f'Benchmark {suffix}', endereco='Rua Benchmark', numero='1',
+            bairro='Centro', cidade='Recife', estado='PE', cep='50000-000', telefone='(00) 0000-0000'
+        )
+        user = User.objects.create(
+            username=f'benchmark_{suffix}', cpf=f'999.{suffix[:3]}.{suffix[3:6]}-{suffix[6:]}',
+            clinica=clinica, user_type='GESTOR_GERAL'
+        )
+        patient = Patient.objects.create(
+            clinica=clinica, filial=filial, full_name='Paciente Benchmark', cpf=f'998.{suffix[:3]}.{suffix[3:6]}-{suffix[6:]}',
+            birth_date='1980-01-01', phone='(00) 00000-0000'
+        )
+
+        texts = ocr_texts(rng, options['ocr_chars']) or ['']
+        batch = []
+        for number in range(options['documents']):
+            batch.append(Document(
+                patient=patient, title=f'Exame {number}', document_type='EXAME',
+                file=f'documents/patient_{patient.id}/exame_{number}.pdf', file_size=250000,
+                ocr_text=texts[number % len(texts)], ocr_processed=True, ocr_confidence=90.0,
+            ))
+            if len(batch) >= options['batch_size']:
+                Document.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Document.objects.bulk_create(batch)
+        return user
+
+    def _measure(self, user, options):
+        client = benchmark_client()
+        url = '/api/documentos/documents/'
+        timings, size = [], 0
+        for _ in range(options['runs']):
+            start = time.perf_counter()
+            response = client.get(url, HTTP_X_USER_ID=user.id)
+            timings.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise CommandError(f'{url} respondeu {response.status_code}')
+            size = len(response.content)
+
+        documents = Document.objects.filter(patient__clinica=user.clinica).order_by('-created_at')
+        results = {}
+        for name, queryset in [
+            ('page_select_all', documents[:PAGE_SIZE]),
+            ('page_summary', documents.summary()[:PAGE_SIZE]),
+        ]:
+            values, rows = [], []
+            for _ in range(options['runs']):
+                start = time.perf_counter()
+                rows = _fetch_rows(queryset)
+                values.append(time.perf_counter() - start)
+            results[name] = {**_timings(values), 'bytes': _row_bytes(rows)}
+
+        return {
+            'documents': options['documents'],
+            'ocr_chars': options['ocr_chars'],
+            'runs': options['runs'],
+            'endpoint': {**_timings(timings), 'bytes': size},
+            **results,
+        }
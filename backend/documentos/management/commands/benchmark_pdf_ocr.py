@@ -0,0 +1,123 @@
+"""
+Benchmark do OCR de PDFs (páginas/segundo e pico de memória)
+
+Gera um PDF sintético com texto em todas as páginas e executa o
+OCRProcessor.extract_text_from_pdf sobre ele.
+
+Uso:
+    python manage.py benchmark_pdf_ocr                      # 50 páginas, todas as CPUs
+    python manage.py benchmark_pdf_ocr --pages 20 --workers 1
+    python manage.py benchmark_pdf_ocr --window 2 --dpi 200 --json
+
+Requer o poppler (pdftoppm) e o Tesseract instalados.
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from PIL import Image, ImageDraw
+
+from documentos.ocr_utils import OCRProcessor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def build_synthetic_pdf(path, pages, width=1240, height=1754):
+    """Cria um PDF com `pages` páginas A4 (150 DPI) preenchidas de texto"""
+    draw_lines = [
+        'FICHA DE AVALIACAO FISIOTERAPEUTICA',
+        'Paciente: Maria da Silva   Idade: 54 anos',
+        'Queixa principal: dor lombar ha tres meses',
+        'Conduta: cinesioterapia e eletroterapia',
+    ]
+
+    def page_image(number):
+        image = Image.new('L', (width, height), 255)
+        draw = ImageDraw.Draw(image)
+        y = 80
+        while y < height - 120:
+            for line in draw_lines:
+                draw.text((80, y), f'{line} - pagina {number}', fill=0)
+                y += 40
+        return image
+
+    first = page_image(1)
+    first.save(
+        path, 'PDF', resolution=150, save_all=True,
+        append_images=(page_image(number) for number in range(2, pages + 1)),
+    )
+
+
+def _peak_rss_mb(who):
+    """Pico de memória residente (MB) do processo atual ou do maior processo filho"""
+    if resource is None:
+        return None
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    divisor = 1024 * 1024 if os.uname().sysname == 'Darwin' else 1024
+    return round(resource.getrusage(who).ru_maxrss / divisor, 1)
+
+
+class Command(BaseCommand):
+    help = 'Mede páginas/segundo e pico de memória do OCR de um PDF sintético'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=50, help='Páginas do PDF sintético')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processos de OCR')
+        parser.add_argument('--window', type=int, default=getattr(settings, 'OCR_PDF_PAGE_WINDOW', 4),
+                            help='Páginas rasterizadas por vez em cada processo')
+        parser.add_argument('--dpi', type=int, default=getattr(settings, 'OCR_PDF_DPI', 300),
+                            help='Resolução da rasterização')
+        parser.add_argument('--json', action='store_true', help='Saída em JSON')
+
+    def handle(self, *args, **options):
+        if not shutil.which('pdftoppm'):
+            raise CommandError('poppler (pdftoppm) não encontrado no PATH')
+        if options['pages'] < 1 or options['workers'] < 1 or options['window'] < 1:
+            raise CommandError('--pages, --workers e --window devem ser maiores que zero')
+
+        with tempfile.TemporaryDirectory(prefix='physiocapture_bench_') as folder:
+            pdf_path = os.path.join(folder, 'sintetico.pdf')
+            build_synthetic_pdf(pdf_path, options['pages'])
+
+            with override_settings(OCR_PDF_PAGE_WINDOW=options['window'], OCR_PDF_DPI=options['dpi']):
+                processor = OCRProcessor(pdf_workers=options['workers'])
+                start = time.perf_counter()
+                result = processor.extract_text_from_pdf(pdf_path)
+                elapsed = time.perf_counter() - start
+
+        if not result['success']:
+            raise CommandError(f"OCR falhou: {result.get('error')}")
+
+        report = {
+            'pages': result['pages'],
+            'workers': options['workers'],
+            'window': options['window'],
+            'dpi': options['dpi'],
+            'seconds': round(elapsed, 2),
+            'pages_per_second': round(result['pages'] / elapsed, 2),
+            'peak_rss_mb_main': _peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+            'peak_rss_mb_worker': _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+            'confidence': result['confidence'],
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['pages']} páginas em {report['seconds']}s "
+            f"({report['pages_per_second']} páginas/s, {report['workers']} processos, janela {report['window']})"
+        ))
+        if resource:
+            self.stdout.write(
+                f"Pico de memória: processo principal {report['peak_rss_mb_main']} MB, "
+                f"maior processo de OCR {report['peak_rss_mb_worker']} MB"
+            )
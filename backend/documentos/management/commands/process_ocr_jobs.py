@@ -0,0 +1,125 @@
+"""
+Worker da fila de OCR (OCRJob)
+
+Uso:
+    python manage.py process_ocr_jobs                # roda continuamente
+    python manage.py process_ocr_jobs --once         # esvazia a fila e sai
+    python manage.py process_ocr_jobs --workers 4    # tamanho do pool de processos
+    python manage.py process_ocr_jobs --workers 0    # sem pool, no próprio processo
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from documentos.ocr_jobs import (
+    claim_jobs, init_worker, mark_failed, release_jobs, requeue_stale_jobs, run_ocr_job
+)
+
+
+class Command(BaseCommand):
+    help = 'Processa a fila de OCR dos documentos em um pool de processos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processos de OCR em paralelo (padrão: número de CPUs; 0 = sem pool)')
+        parser.add_argument('--once', action='store_true', help='Sai quando a fila estiver vazia')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Segundos entre consultas à fila quando ociosa')
+        parser.add_argument('--stale-minutes', type=int, default=30,
+                            help='Devolve à fila tarefas em processamento há mais tempo que isso')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 0:
+            raise CommandError('--workers deve ser maior ou igual a zero')
+
+        requeued = requeue_stale_jobs(options['stale_minutes'])
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'{requeued} tarefa(s) interrompida(s) devolvida(s) à fila'))
+
+        if workers == 0:
+            processed = self._run_inline(options)
+        else:
+            processed = self._run_pool(workers, options)
+
+        self.stdout.write(self.style.SUCCESS(f'{processed} tarefa(s) de OCR processada(s)'))
+
+    def _report(self, job_id, final_status):
+        style = self.style.SUCCESS if final_status == 'DONE' else self.style.ERROR
+        self.stdout.write(style(f'OCR #{job_id}: {final_status}'))
+
+    def _run_inline(self, options):
+        processed = 0
+        while True:
+            ids = claim_jobs(1)
+            if not ids:
+                if options['once']:
+                    return processed
+                time.sleep(options['poll_interval'])
+                continue
+            self._report(*run_ocr_job(ids[0]))
+            processed += 1
+
+    def _run_pool(self, workers, options):
+        # Processos 'spawn' não herdam as conexões abertas deste processo
+        connections.close_all()
+
+        processed = 0
+        running = {}
+        pool = self._new_pool(workers)
+        try:
+            while True:
+                broken = False
+                pending = claim_jobs(workers - len(running))
+                try:
+                    while pending:
+                        running[pool.submit(run_ocr_job, pending[0])] = pending[0]
+                        pending.pop(0)
+                except BrokenProcessPool:
+                    release_jobs(pending)
+                    broken = True
+
+                if not broken:
+                    if not running:
+                        if options['once']:
+                            return processed
+                        time.sleep(options['poll_interval'])
+                        continue
+                    done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                    broken = any(isinstance(future.exception(), BrokenProcessPool) for future in done)
+                    processed += self._collect(done, running)
+
+                if broken:
+                    # Um processo do pool morreu (ex.: falta de memória): as tarefas em
+                    # andamento falham, as reservadas e não enviadas voltaram à fila
+                    # e o pool é recriado
+                    done, _ = wait(running)
+                    processed += self._collect(done, running)
+                    pool.shutdown(wait=True)
+                    self.stdout.write(self.style.WARNING('Processo de OCR interrompido: reiniciando o pool'))
+                    pool = self._new_pool(workers)
+        finally:
+            pool.shutdown(wait=True)
+
+    def _new_pool(self, workers):
+        context = multiprocessing.get_context('spawn')
+        # As páginas de cada PDF também são processadas em paralelo: divide as CPUs entre as tarefas
+        pdf_workers = max(1, (os.cpu_count() or 1) // workers)
+        return ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                   initializer=init_worker, initargs=(pdf_workers,))
+
+    def _collect(self, done, running):
+        """Registra o resultado das tarefas concluídas e as remove de `running`"""
+        for future in done:
+            job_id = running.pop(future)
+            try:
+                self._report(*future.result())
+            except Exception as e:
+                mark_failed(job_id, f'Processo de OCR interrompido: {e}')
+                self._report(job_id, 'FAILED')
+        return len(done)
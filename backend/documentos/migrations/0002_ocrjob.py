@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 00:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentos', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OCRJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('QUEUED', 'Na fila'), ('RUNNING', 'Processando'), ('DONE', 'Concluído'), ('FAILED', 'Falhou')], default='QUEUED', max_length=10, verbose_name='Status')),
+                ('total_pages', models.PositiveIntegerField(default=0, verbose_name='Total de Páginas')),
+                ('processed_pages', models.PositiveIntegerField(default=0, verbose_name='Páginas Processadas')),
+                ('error', models.TextField(blank=True, null=True, verbose_name='Erro')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado em')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finalizado em')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocr_jobs', to='documentos.document', verbose_name='Documento')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ocr_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Solicitado por')),
+            ],
+            options={
+                'verbose_name': 'Tarefa de OCR',
+                'verbose_name_plural': 'Tarefas de OCR',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='ocrjob_fila_idx')],
+            },
+        ),
+    ]
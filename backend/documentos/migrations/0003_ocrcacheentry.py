@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 00:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentos', '0002_ocrjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OCRCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Chave')),
+                ('content_hash', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256 do Arquivo')),
+                ('text', models.TextField(blank=True, verbose_name='Texto Extraído')),
+                ('confidence', models.FloatField(default=0, verbose_name='Confiança (%)')),
+                ('pages', models.PositiveIntegerField(default=1, verbose_name='Páginas')),
+                ('size_bytes', models.PositiveIntegerField(default=0, verbose_name='Tamanho do Texto (bytes)')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Acertos')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Último Uso')),
+            ],
+            options={
+                'verbose_name': 'Cache de OCR',
+                'verbose_name_plural': 'Cache de OCR',
+                'ordering': ['-last_used_at'],
+            },
+        ),
+    ]
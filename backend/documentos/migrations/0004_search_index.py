@@ -0,0 +1,57 @@
+# Índice de busca textual de documentos (FTS5 no SQLite, GIN no PostgreSQL)
+#
+# Tabela e colunas congeladas aqui, com o modelo histórico (veja
+# prontuario/migrations/0006_search_index.py).
+
+from django.db import migrations
+
+
+FIELDS = ['title', 'tags', 'description', 'ocr_text']
+
+
+def _pg_vector(fields):
+    weights = ['A', 'B', 'C', 'D']
+    return ' || '.join(
+        f"setweight(to_tsvector('portuguese', coalesce(\"{field}\", '')), '{weights[min(position, 3)]}')"
+        for position, field in enumerate(fields)
+    )
+
+
+def create_index(apps, schema_editor):
+    model = apps.get_model('documentos', 'Document')
+    table = model._meta.db_table
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        columns = ', '.join(FIELDS)
+        values = ', '.join(f"coalesce({field}, '')" for field in FIELDS)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts "
+            f"USING fts5({columns}, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {table}_fts (rowid, {columns}) SELECT {model._meta.pk.column}, {values} FROM {table}'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_search_gin ON {table} USING gin (({_pg_vector(FIELDS)}))'
+        )
+
+
+def drop_index(apps, schema_editor):
+    table = apps.get_model('documentos', 'Document')._meta.db_table
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+    elif schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_search_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentos', '0003_ocrcacheentry'),
+        ('prontuario', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-18 00:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentos', '0004_search_index'),
+        ('prontuario', '0006_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['patient', 'is_active', 'created_at'], name='document_patient_active_idx'),
+        ),
+    ]
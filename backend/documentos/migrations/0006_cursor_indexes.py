@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 00:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentos', '0005_tenant_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='documentaccesslog',
+            index=models.Index(fields=['document', 'timestamp', 'id'], name='access_log_cursor_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:43
+
+import django.db.models.deletion
+import prontuario.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentos', '0006_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSearchEntry',
+            fields=[
+                ('document', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='documentos.document')),
+                ('fts', prontuario.models.SearchColumn(db_column='documentos_document_fts')),
+            ],
+            options={
+                'db_table': 'documentos_document_fts',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+    ]
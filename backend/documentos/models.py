@@ -1,9 +1,15 @@
 from django.db import models
+from django.db.models.functions import Substr
 from django.conf import settings
-from prontuario.models import Patient
+from prontuario.models import Patient, SearchColumn, SearchEntry
+from authentication.tenancy import TenantScopedManager, TenantScopedQuerySet
 import os
 
 
+# Caracteres do texto do OCR exibidos nas listagens (ocr_snippet)
+OCR_SNIPPET_LENGTH = 200
+
+
 def document_upload_path(instance, filename):
     """
     Define o caminho de upload dos documentos
@@ -33,6 +39,18 @@ class DocumentCategory(models.Model):
         return self.name
 
 
+class DocumentQuerySet(TenantScopedQuerySet):
+
+    # Colunas grandes (o OCR de um PDF pode ter centenas de KB), lidas só no detalhe
+    HEAVY_FIELDS = ['ocr_text', 'description']
+
+    def summary(self):
+        """Listagens e buscas: sem as colunas grandes, com o início do OCR calculado no SQL"""
+        return self.defer(*self.HEAVY_FIELDS).annotate(
+            ocr_snippet=Substr('ocr_text', 1, OCR_SNIPPET_LENGTH)
+        )
+
+
 class Document(models.Model):
     """
     Modelo para armazenar documentos digitalizados dos pacientes
@@ -103,10 +121,17 @@ class Document(models.Model):
         help_text="Se marcado, atendentes podem visualizar este documento"
     )
 
+    objects = TenantScopedManager.from_queryset(DocumentQuerySet)(
+        clinica='patient__clinica', fisioterapeuta='patient__fisioterapeuta'
+    )
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Documento"
         verbose_name_plural = "Documentos"
+        indexes = [
+            models.Index(fields=['patient', 'is_active', 'created_at'], name='document_patient_active_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.patient.full_name}"
@@ -174,6 +199,104 @@ class DocumentAccessLog(models.Model):
         ordering = ['-timestamp']
         verbose_name = "Log de Acesso a Documento"
         verbose_name_plural = "Logs de Acesso a Documentos"
+        indexes = [
+            # Paginação por cursor dos logs de um documento
+            models.Index(fields=['document', 'timestamp', 'id'], name='access_log_cursor_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_action_display()} - {self.document.title} - {self.user} ({self.timestamp.strftime('%d/%m/%Y %H:%M')})"
+
+
+class OCRJob(models.Model):
+    """
+    Tarefa de OCR em segundo plano
+
+    Criada pelo upload (POST /api/documentos/digitalize/) e executada pelo
+    worker `python manage.py process_ocr_jobs`. O progresso é atualizado a
+    cada página processada; o texto extraído é gravado no próprio documento.
+    """
+    STATUS_CHOICES = [
+        ('QUEUED', 'Na fila'),
+        ('RUNNING', 'Processando'),
+        ('DONE', 'Concluído'),
+        ('FAILED', 'Falhou'),
+    ]
+
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='ocr_jobs', verbose_name="Documento")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED', verbose_name="Status")
+
+    # Progresso por página
+    total_pages = models.PositiveIntegerField(default=0, verbose_name="Total de Páginas")
+    processed_pages = models.PositiveIntegerField(default=0, verbose_name="Páginas Processadas")
+
+    error = models.TextField(blank=True, null=True, verbose_name="Erro")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Tentativas")
+
+    # Controle
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='ocr_jobs', verbose_name="Solicitado por")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name="Iniciado em")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="Finalizado em")
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Tarefa de OCR"
+        verbose_name_plural = "Tarefas de OCR"
+        indexes = [
+            # Fila do worker: próximas tarefas por ordem de chegada
+            models.Index(fields=['status', 'created_at'], name='ocrjob_fila_idx'),
+        ]
+
+    def __str__(self):
+        return f"OCR #{self.id} - {self.document.title} ({self.get_status_display()})"
+
+    @property
+    def progress(self):
+        """Percentual de páginas processadas (0-100)"""
+        if self.status == 'DONE':
+            return 100
+        if not self.total_pages:
+            return 0
+        return round(self.processed_pages * 100 / self.total_pages)
+
+
+class OCRCacheEntry(models.Model):
+    """
+    Resultado de OCR reaproveitável (ver documentos/ocr_cache.py)
+
+    A chave combina o SHA-256 do conteúdo do arquivo com o idioma e as
+    configurações de pré-processamento; o mesmo arquivo enviado de novo
+    reaproveita o texto sem executar o Tesseract.
+    """
+    key = models.CharField(max_length=64, unique=True, verbose_name="Chave")
+    content_hash = models.CharField(max_length=64, db_index=True, verbose_name="SHA-256 do Arquivo")
+
+    text = models.TextField(blank=True, verbose_name="Texto Extraído")
+    confidence = models.FloatField(default=0, verbose_name="Confiança (%)")
+    pages = models.PositiveIntegerField(default=1, verbose_name="Páginas")
+    size_bytes = models.PositiveIntegerField(default=0, verbose_name="Tamanho do Texto (bytes)")
+
+    hits = models.PositiveIntegerField(default=0, verbose_name="Acertos")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Último Uso")
+
+    class Meta:
+        ordering = ['-last_used_at']
+        verbose_name = "Cache de OCR"
+        verbose_name_plural = "Cache de OCR"
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.pages} pág., {self.hits} acertos)"
+
+
+class DocumentSearchEntry(SearchEntry):
+    """Linha do índice de busca de documentos (ver prontuario.models.SearchEntry)"""
+    document = models.OneToOneField(
+        Document, on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', db_constraint=False, related_name='search_entry'
+    )
+    fts = SearchColumn(db_column='documentos_document_fts')
+
+    class Meta(SearchEntry.Meta):
+        db_table = 'documentos_document_fts'
@@ -0,0 +1,139 @@
+"""
+Cache de resultados de OCR por conteúdo
+
+Clínicas reenviam os mesmos exames e encaminhamentos com frequência. O
+resultado do OCR é guardado no banco (OCRCacheEntry) com a chave
+SHA-256(conteúdo do arquivo + idioma + configurações de pré-processamento),
+compartilhado entre a API e os workers de OCR.
+
+- Tamanho limitado: ao passar de OCR_CACHE_MAX_ENTRIES entradas ou de
+  OCR_CACHE_MAX_BYTES bytes de texto, as entradas usadas há mais tempo
+  são removidas (LRU).
+- Contadores de acertos/erros ficam no cache do Django (compartilhados entre
+  processos quando REDIS_URL está configurado); cada entrada também conta
+  os próprios acertos.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import OCRCacheEntry
+
+
+STATS_KEY = 'ocr_cache:stats:{}'
+
+
+def content_hash(content):
+    """SHA-256 do conteúdo do arquivo"""
+    return hashlib.sha256(content).hexdigest()
+
+
+class OCRResultCache:
+    """
+    Cache LRU de resultados de OCR
+
+    Uso:
+        ocr_cache = OCRResultCache()
+        result = ocr_cache.get(content, processor)
+        if result is None:
+            result = processor.process_document(content, filename=name)
+            ocr_cache.set(content, processor, result)
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries or getattr(settings, 'OCR_CACHE_MAX_ENTRIES', 10000)
+        self.max_bytes = max_bytes or getattr(settings, 'OCR_CACHE_MAX_BYTES', 50 * 1024 * 1024)
+
+    @staticmethod
+    def make_key(digest, options):
+        payload = json.dumps(options, sort_keys=True)
+        return hashlib.sha256(f'{digest}:{payload}'.encode()).hexdigest()
+
+    def get(self, content, processor):
+        """
+        Retorna o resultado guardado (mesmo formato de process_document,
+        com 'cached': True) ou None.
+        """
+        key = self.make_key(content_hash(content), processor.cache_options())
+        entry = OCRCacheEntry.objects.filter(key=key).first()
+
+        if entry is None:
+            self._count('misses')
+            return None
+
+        # Marca como usado recentemente (ordem do LRU)
+        OCRCacheEntry.objects.filter(pk=entry.pk).update(hits=F('hits') + 1, last_used_at=timezone.now())
+        self._count('hits')
+        return {
+            'text': entry.text,
+            'confidence': entry.confidence,
+            'pages': entry.pages,
+            'success': True,
+            'cached': True,
+        }
+
+    def set(self, content, processor, result):
+        """Guarda um resultado bem-sucedido e aplica o limite de tamanho"""
+        if not result.get('success'):
+            return
+
+        digest = content_hash(content)
+        text = result.get('text') or ''
+        OCRCacheEntry.objects.update_or_create(
+            key=self.make_key(digest, processor.cache_options()),
+            defaults={
+                'content_hash': digest,
+                'text': text,
+                'confidence': result.get('confidence') or 0,
+                'pages': result.get('pages') or 1,
+                'size_bytes': len(text.encode()),
+                'last_used_at': timezone.now(),
+            }
+        )
+        self.evict()
+
+    def evict(self):
+        """Remove as entradas usadas há mais tempo até respeitar os limites"""
+        totals = OCRCacheEntry.objects.aggregate(entries=Count('id'), size=Sum('size_bytes', default=0))
+        entries, size = totals['entries'] or 0, totals['size']
+        if entries <= self.max_entries and size <= self.max_bytes:
+            return 0
+
+        removed = []
+        for pk, size_bytes in OCRCacheEntry.objects.order_by('last_used_at').values_list('pk', 'size_bytes').iterator():
+            if entries <= self.max_entries and size <= self.max_bytes:
+                break
+            removed.append(pk)
+            entries -= 1
+            size -= size_bytes
+
+        OCRCacheEntry.objects.filter(pk__in=removed).delete()
+        return len(removed)
+
+    def _count(self, name):
+        key = STATS_KEY.format(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 0, timeout=None)
+            cache.incr(key)
+
+    def stats(self):
+        """Acertos, erros e ocupação do cache"""
+        counters = cache.get_many([STATS_KEY.format('hits'), STATS_KEY.format('misses')])
+        hits = counters.get(STATS_KEY.format('hits'), 0)
+        misses = counters.get(STATS_KEY.format('misses'), 0)
+        totals = OCRCacheEntry.objects.aggregate(entries=Count('id'), size=Sum('size_bytes', default=0))
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits * 100 / (hits + misses), 2) if hits + misses else 0,
+            'entries': totals['entries'] or 0,
+            'size_bytes': totals['size'],
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+        }
@@ -0,0 +1,181 @@
+"""
+Fila de OCR em segundo plano
+
+O upload cria um OCRJob (status QUEUED) e responde na hora; o worker
+`python manage.py process_ocr_jobs` reserva as tarefas da fila e executa o
+OCR em um pool de processos.
+
+A reserva usa select_for_update(skip_locked=True): vários workers (inclusive
+em máquinas diferentes) podem consumir a mesma fila sem pegar a mesma tarefa.
+No SQLite o banco inteiro é travado na escrita e o skip_locked é ignorado,
+o que também é seguro, apenas com menos paralelismo entre workers.
+
+Os modelos são importados dentro das funções: os processos do pool são
+iniciados com 'spawn' e só carregam o Django em init_worker().
+"""
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+THUMBNAIL_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp']
+
+# Processos de OCR por PDF dentro de cada processo do pool (ver init_worker)
+_pdf_workers = None
+
+
+def enqueue_ocr(document, requested_by=None):
+    """Coloca o documento na fila de OCR e retorna a tarefa criada"""
+    from .models import OCRJob
+
+    return OCRJob.objects.create(document=document, requested_by=requested_by)
+
+
+def claim_jobs(limit):
+    """
+    Reserva até `limit` tarefas da fila (as mais antigas primeiro),
+    marcando-as como RUNNING. Retorna os ids reservados.
+    """
+    from .models import OCRJob
+
+    if limit <= 0:
+        return []
+
+    with transaction.atomic():
+        ids = list(
+            OCRJob.objects.select_for_update(skip_locked=True)
+            .filter(status='QUEUED')
+            .order_by('created_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        if ids:
+            OCRJob.objects.filter(id__in=ids).update(
+                status='RUNNING',
+                started_at=timezone.now(),
+                attempts=F('attempts') + 1,
+            )
+    return ids
+
+
+def requeue_stale_jobs(minutes):
+    """
+    Devolve à fila tarefas presas em RUNNING há mais de `minutes` minutos
+    (worker interrompido no meio do processamento).
+    """
+    from .models import OCRJob
+
+    return OCRJob.objects.filter(
+        status='RUNNING',
+        started_at__lt=timezone.now() - timedelta(minutes=minutes)
+    ).update(status='QUEUED', processed_pages=0)
+
+
+def release_jobs(ids):
+    """
+    Devolve à fila tarefas reservadas que não chegaram a ser executadas
+    (pool de processos quebrado antes do envio); a tentativa não conta.
+    """
+    from .models import OCRJob
+
+    if not ids:
+        return 0
+    return OCRJob.objects.filter(id__in=ids, status='RUNNING').update(
+        status='QUEUED', started_at=None, processed_pages=0, attempts=F('attempts') - 1
+    )
+
+
+def _save_thumbnail(document):
+    """Gera a miniatura de documentos de imagem (sem salvar o documento)"""
+    if document.file_extension not in THUMBNAIL_EXTENSIONS:
+        return
+
+    from .ocr_utils import create_thumbnail
+
+    thumbnail_name = f"thumb_{document.id}.jpg"
+    thumbnail_path = os.path.join(settings.MEDIA_ROOT, 'documents', 'thumbnails', thumbnail_name)
+    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+
+    if create_thumbnail(document.file.path, thumbnail_path):
+        with open(thumbnail_path, 'rb') as thumb_file:
+            document.thumbnail.save(thumbnail_name, ContentFile(thumb_file.read()), save=False)
+
+
+def run_ocr_job(job_id):
+    """
+    Executa uma tarefa reservada: OCR página a página, atualizando o progresso,
+    e grava o resultado no documento. Retorna (job_id, status final).
+    """
+    from .models import OCRJob
+    from .ocr_cache import OCRResultCache
+    from .ocr_utils import OCRProcessor
+
+    close_old_connections()
+    job = OCRJob.objects.select_related('document').get(id=job_id)
+    document = job.document
+
+    def progress(done, total):
+        OCRJob.objects.filter(id=job_id).update(processed_pages=done, total_pages=total)
+
+    error = None
+    try:
+        processor = OCRProcessor(pdf_workers=_pdf_workers)
+        with document.file.open('rb') as f:
+            content = f.read()
+
+        # Arquivo já processado antes (mesmo conteúdo e configurações): reaproveita
+        ocr_cache = OCRResultCache()
+        result = ocr_cache.get(content, processor)
+        if result is None:
+            result = processor.process_document(content, progress_callback=progress, filename=document.file.name)
+            ocr_cache.set(content, processor, result)
+
+        if result['success']:
+            document.ocr_text = result['text']
+            document.ocr_confidence = result['confidence']
+            document.ocr_processed = True
+            _save_thumbnail(document)
+        else:
+            # OCR falhou, mas o documento continua salvo
+            document.ocr_processed = False
+            error = result.get('error') or 'Falha no processamento OCR'
+        document.save()
+
+    except Exception as e:
+        error = str(e)
+
+    final_status = 'FAILED' if error else 'DONE'
+    OCRJob.objects.filter(id=job_id).update(
+        status=final_status,
+        error=error,
+        finished_at=timezone.now(),
+    )
+    return job_id, final_status
+
+
+def mark_failed(job_id, error):
+    """Registra a falha de uma tarefa cujo processo do pool foi interrompido"""
+    from .models import OCRJob
+
+    OCRJob.objects.filter(id=job_id).update(status='FAILED', error=error, finished_at=timezone.now())
+
+
+def init_worker(pdf_workers=None):
+    """
+    Initializer dos processos do pool: carrega o Django no processo filho.
+    `pdf_workers` limita o pool de páginas de cada PDF, para que tarefas
+    simultâneas não disputem mais processos do que há CPUs.
+    """
+    import django
+    from django.apps import apps
+
+    global _pdf_workers
+    _pdf_workers = pdf_workers
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    if not apps.ready:
+        django.setup()
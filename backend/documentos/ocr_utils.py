@@ -4,99 +4,225 @@ Suporta imagens e PDFs
 """
 import pytesseract
 from PIL import Image
-from pdf2image import convert_from_path
+from pdf2image import convert_from_bytes, convert_from_path, pdfinfo_from_bytes, pdfinfo_from_path
 import cv2
 import numpy as np
 from django.conf import settings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import io
+import math
+import multiprocessing
 import os
 
 
+# Resolução da rasterização dos PDFs
+PDF_DPI = 300
+
+# Páginas rasterizadas por vez em cada processo
+PDF_PAGE_WINDOW = 4
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif']
+
+# Parâmetros do pré-processamento (fazem parte da chave do cache de OCR)
+PREPROCESSING = {
+    'threshold_block_size': 11,
+    'threshold_c': 2,
+    'median_blur': 3,
+}
+
+
+def load_grayscale(image):
+    """
+    Carrega uma imagem em escala de cinza (numpy array) sem passar pelo disco
+    quando ela já está em memória.
+    
+    Args:
+        image: Caminho, bytes, arquivo aberto (upload), imagem PIL ou numpy array
+    """
+    if isinstance(image, np.ndarray):
+        if image.ndim == 2:
+            return image
+        code = cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        return cv2.cvtColor(image, code)
+    
+    if isinstance(image, Image.Image):
+        return np.asarray(image.convert('L'))
+    
+    if hasattr(image, 'read'):
+        image = image.read()
+    
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        gray = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    else:
+        gray = cv2.imread(os.fspath(image), cv2.IMREAD_GRAYSCALE)
+    
+    if gray is None:
+        raise ValueError('Não foi possível decodificar a imagem')
+    return gray
+
+
+def load_pil_image(image):
+    """Converte qualquer entrada aceita por load_grayscale em imagem PIL (sem pré-processamento)"""
+    if isinstance(image, Image.Image):
+        return image
+    if isinstance(image, np.ndarray):
+        return Image.fromarray(image)
+    if hasattr(image, 'read'):
+        image = image.read()
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(image))
+    return Image.open(image)
+
+
+def words_from_data(data):
+    """
+    Palavras reconhecidas a partir do resultado de pytesseract.image_to_data
+    (Output.DICT), com confiança e posição no layout (bloco/parágrafo/linha).
+    """
+    words = []
+    for i, text in enumerate(data['text']):
+        text = (text or '').strip()
+        if not text:
+            continue
+        words.append({
+            'text': text,
+            'confidence': round(float(data['conf'][i]), 2),
+            'block': data['block_num'][i],
+            'paragraph': data['par_num'][i],
+            'line': data['line_num'][i],
+            'left': data['left'][i],
+            'top': data['top'][i],
+            'width': data['width'][i],
+            'height': data['height'][i],
+        })
+    return words
+
+
+def text_from_words(words):
+    """
+    Remonta o texto no formato do pytesseract.image_to_string: palavras da
+    mesma linha separadas por espaço, linhas por quebra de linha e
+    parágrafos/blocos por uma linha em branco.
+    """
+    paragraphs = []
+    current_paragraph = None
+    current_line = None
+    
+    for word in words:
+        paragraph_key = (word['block'], word['paragraph'])
+        line_key = paragraph_key + (word['line'],)
+        
+        if paragraph_key != current_paragraph:
+            paragraphs.append([])
+            current_paragraph = paragraph_key
+            current_line = None
+        if line_key != current_line:
+            paragraphs[-1].append([])
+            current_line = line_key
+        paragraphs[-1][-1].append(word['text'])
+    
+    return '\n\n'.join(
+        '\n'.join(' '.join(line) for line in lines)
+        for lines in paragraphs
+    )
+
+
 class OCRProcessor:
     """
     Classe para processar OCR em documentos
     """
     
-    def __init__(self, tesseract_cmd=None, language='por+eng'):
+    def __init__(self, tesseract_cmd=None, language='por+eng', pdf_workers=None):
         """
         Inicializa o processador OCR
         
         Args:
             tesseract_cmd: Caminho para o executável do Tesseract
             language: Idiomas para OCR (padrão: português + inglês)
+            pdf_workers: Processos para o OCR das páginas de PDFs
+                         (padrão: settings.OCR_PDF_WORKERS ou número de CPUs)
         """
         self.language = language
+        self.pdf_workers = pdf_workers or getattr(settings, 'OCR_PDF_WORKERS', None) or os.cpu_count() or 1
+        self.pdf_page_window = getattr(settings, 'OCR_PDF_PAGE_WINDOW', PDF_PAGE_WINDOW)
+        self.pdf_dpi = getattr(settings, 'OCR_PDF_DPI', PDF_DPI)
         
         if tesseract_cmd:
             pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
         elif hasattr(settings, 'TESSERACT_CMD'):
             pytesseract.pytesseract.tesseract_cmd = settings.TESSERACT_CMD
     
-    def preprocess_image(self, image_path):
+    def cache_options(self):
+        """Configurações que alteram o resultado do OCR (usadas na chave do cache)"""
+        return {
+            'language': self.language,
+            'pdf_dpi': self.pdf_dpi,
+            'preprocessing': PREPROCESSING,
+        }
+    
+    def preprocess_image(self, image):
         """
         Pré-processa a imagem para melhorar a precisão do OCR
         
         Args:
-            image_path: Caminho para a imagem
+            image: Caminho, bytes, arquivo aberto, imagem PIL ou numpy array
             
         Returns:
             Imagem pré-processada (numpy array)
         """
-        # Carrega a imagem
-        img = cv2.imread(image_path)
-        
-        # Converte para escala de cinza
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        # Carrega a imagem (já em escala de cinza)
+        gray = load_grayscale(image)
         
         # Aplica threshold adaptativo para melhorar contraste
         processed = cv2.adaptiveThreshold(
             gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-            cv2.THRESH_BINARY, 11, 2
+            cv2.THRESH_BINARY, PREPROCESSING['threshold_block_size'], PREPROCESSING['threshold_c']
         )
         
         # Remove ruído
-        processed = cv2.medianBlur(processed, 3)
+        processed = cv2.medianBlur(processed, PREPROCESSING['median_blur'])
         
         return processed
     
-    def extract_text_from_image(self, image_path, preprocess=True):
+    def extract_text_from_image(self, image, preprocess=True):
         """
         Extrai texto de uma imagem usando OCR
         
         Args:
-            image_path: Caminho para a imagem
+            image: Caminho, bytes, arquivo aberto, imagem PIL ou numpy array
             preprocess: Se deve pré-processar a imagem
             
         Returns:
-            dict com 'text' e 'confidence'
+            dict com 'text', 'confidence' e 'words' (palavras com confiança e posição)
         """
         try:
             if preprocess:
                 # Pré-processa a imagem
-                processed_img = self.preprocess_image(image_path)
+                processed_img = self.preprocess_image(image)
                 
                 # Converte para PIL Image
                 pil_img = Image.fromarray(processed_img)
             else:
                 # Carrega imagem diretamente
-                pil_img = Image.open(image_path)
+                pil_img = load_pil_image(image)
             
-            # Executa OCR
+            # Executa OCR (uma única passada: o texto é remontado a partir dos dados)
             data = pytesseract.image_to_data(
                 pil_img, 
                 lang=self.language, 
                 output_type=pytesseract.Output.DICT
             )
             
-            # Extrai texto
-            text = pytesseract.image_to_string(pil_img, lang=self.language)
+            words = words_from_data(data)
             
-            # Calcula confiança média
-            confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
+            # Calcula confiança média das palavras reconhecidas
+            confidences = [word['confidence'] for word in words if word['confidence'] > 0]
             avg_confidence = sum(confidences) / len(confidences) if confidences else 0
             
             return {
-                'text': text.strip(),
+                'text': text_from_words(words),
                 'confidence': round(avg_confidence, 2),
+                'words': words,
                 'success': True
             }
             
@@ -108,45 +234,73 @@ class OCRProcessor:
                 'error': str(e)
             }
     
-    def extract_text_from_pdf(self, pdf_path):
+    def extract_text_from_pdf(self, pdf, progress_callback=None):
         """
         Extrai texto de um PDF (converte para imagens e aplica OCR)
         
+        As páginas são rasterizadas em janelas (first_page/last_page) e as
+        janelas são processadas em paralelo por um pool de processos. Cada
+        processo mantém em memória no máximo uma janela de páginas em escala
+        de cinza, então o pico de memória não depende do número de páginas.
+        
         Args:
-            pdf_path: Caminho para o PDF
+            pdf: Caminho para o PDF ou conteúdo do PDF (bytes)
+            progress_callback: Função chamada com (páginas_processadas, total_páginas)
             
         Returns:
             dict com 'text', 'confidence' e 'pages'
         """
         try:
-            # Converte PDF para imagens
-            pages = convert_from_path(pdf_path, 300)  # 300 DPI
+            if isinstance(pdf, (bytes, bytearray, memoryview)):
+                pdf = bytes(pdf)
+                total_pages = pdfinfo_from_bytes(pdf)['Pages']
+            else:
+                total_pages = pdfinfo_from_path(pdf)['Pages']
+            workers = max(1, min(self.pdf_workers, total_pages))
+            
+            # Janelas menores quando há poucas páginas, para ocupar todos os processos
+            window = max(1, min(self.pdf_page_window, math.ceil(total_pages / workers)))
+            windows = [
+                (first, min(first + window - 1, total_pages))
+                for first in range(1, total_pages + 1, window)
+            ]
+            tesseract_cmd = pytesseract.pytesseract.tesseract_cmd
             
+            page_results = {}
+            
+            def collect(results):
+                page_results.update(results)
+                if progress_callback:
+                    progress_callback(len(page_results), total_pages)
+            
+            if workers == 1:
+                for first, last in windows:
+                    collect(_ocr_pdf_window(pdf, first, last, self.pdf_dpi, self.language, tesseract_cmd))
+            else:
+                context = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                    futures = [
+                        pool.submit(_ocr_pdf_window, pdf, first, last, self.pdf_dpi, self.language, tesseract_cmd)
+                        for first, last in windows
+                    ]
+                    for future in as_completed(futures):
+                        collect(future.result())
+            
+            # Remonta o texto na ordem das páginas
             all_text = []
             all_confidences = []
-            
-            for i, page in enumerate(pages):
-                # Salva temporariamente
-                temp_path = f'/tmp/temp_page_{i}.png'
-                page.save(temp_path, 'PNG')
-                
-                # Processa OCR
-                result = self.extract_text_from_image(temp_path)
-                
+            for page_number in sorted(page_results):
+                result = page_results[page_number]
                 if result['success']:
-                    all_text.append(f"=== PÁGINA {i+1} ===\n{result['text']}")
+                    all_text.append(f"=== PÁGINA {page_number} ===\n{result['text']}")
                     all_confidences.append(result['confidence'])
-                
-                # Remove arquivo temporário
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
             
             avg_confidence = sum(all_confidences) / len(all_confidences) if all_confidences else 0
             
             return {
                 'text': '\n\n'.join(all_text),
                 'confidence': round(avg_confidence, 2),
-                'pages': len(pages),
+                'pages': total_pages,
                 'success': True
             }
             
@@ -159,22 +313,33 @@ class OCRProcessor:
                 'error': str(e)
             }
     
-    def process_document(self, file_path):
+    def process_document(self, source, progress_callback=None, filename=None):
         """
         Processa qualquer tipo de documento (detecta automaticamente)
         
         Args:
-            file_path: Caminho para o documento
+            source: Caminho para o documento ou conteúdo do arquivo (bytes)
+            progress_callback: Função chamada com (páginas_processadas, total_páginas)
+            filename: Nome original do arquivo, usado para detectar o tipo
+                      quando `source` são bytes
             
         Returns:
             dict com resultado do OCR
         """
-        ext = os.path.splitext(file_path)[1].lower()
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            ext = os.path.splitext(filename or '')[1].lower()
+            if not ext and bytes(source[:5]) == b'%PDF-':
+                ext = '.pdf'
+        else:
+            ext = os.path.splitext(os.fspath(source))[1].lower()
         
         if ext == '.pdf':
-            return self.extract_text_from_pdf(file_path)
-        elif ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif']:
-            return self.extract_text_from_image(file_path)
+            return self.extract_text_from_pdf(source, progress_callback)
+        elif ext in IMAGE_EXTENSIONS:
+            result = self.extract_text_from_image(source)
+            if progress_callback:
+                progress_callback(1, 1)
+            return result
         else:
             return {
                 'text': '',
@@ -184,6 +349,35 @@ class OCRProcessor:
             }
 
 
+def _ocr_pdf_window(pdf, first_page, last_page, dpi, language, tesseract_cmd):
+    """
+    OCR de uma janela de páginas de um PDF (executada nos processos do pool)
+    
+    As páginas da janela são rasterizadas em memória, em escala de cinza,
+    e liberadas uma a uma após o OCR.
+    
+    Args:
+        pdf: Caminho para o PDF ou conteúdo do PDF (bytes)
+    
+    Returns:
+        dict {número_da_página: resultado do OCR}
+    """
+    processor = OCRProcessor(tesseract_cmd=tesseract_cmd, language=language, pdf_workers=1)
+    convert = convert_from_bytes if isinstance(pdf, bytes) else convert_from_path
+    pages = convert(pdf, dpi, first_page=first_page, last_page=last_page, grayscale=True)
+    
+    results = {}
+    page_number = first_page
+    while pages:
+        result = processor.extract_text_from_image(pages.pop(0))
+        # O texto do PDF é remontado por página; as palavras não voltam ao processo principal
+        result.pop('words', None)
+        results[page_number] = result
+        page_number += 1
+    
+    return results
+
+
 def create_thumbnail(image_path, thumbnail_path, size=(300, 300)):
     """
     Cria uma miniatura de uma imagem
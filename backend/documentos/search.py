@@ -0,0 +1,13 @@
+"""
+Índice textual de documentos (ver prontuario/search.py)
+
+Cobre título, tags, descrição e o texto extraído pelo OCR.
+"""
+from prontuario.search import SearchIndex, register
+
+
+DOCUMENT_INDEX = register(SearchIndex(
+    'documents', 'documentos.Document',
+    ['title', 'tags', 'description', 'ocr_text'],
+    weights=[10.0, 5.0, 2.0, 1.0],
+))
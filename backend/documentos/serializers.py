@@ -1,14 +1,17 @@
 from rest_framework import serializers
-from .models import DocumentCategory, Document, DocumentAccessLog
+from .models import DocumentCategory, Document, DocumentAccessLog, OCRJob
 from prontuario.models import Patient
+from prontuario.fieldsets import SparseFieldsetMixin
 
 
-class DocumentCategorySerializer(serializers.ModelSerializer):
+class DocumentCategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para categorias de documentos
     """
     documents_count = serializers.SerializerMethodField()
     
+    field_dependencies = {'documents_count': []}
+    
     class Meta:
         model = DocumentCategory
         fields = ['id', 'name', 'description', 'icon', 'color', 'created_at', 'is_active', 'documents_count']
@@ -21,7 +24,7 @@ class DocumentCategorySerializer(serializers.ModelSerializer):
         return obj.documents.filter(is_active=True).count()
 
 
-class DocumentAccessLogSerializer(serializers.ModelSerializer):
+class DocumentAccessLogSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para logs de acesso
     """
@@ -37,7 +40,7 @@ class DocumentAccessLogSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
-class DocumentSerializer(serializers.ModelSerializer):
+class DocumentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer completo para documentos com OCR
     """
@@ -52,6 +55,8 @@ class DocumentSerializer(serializers.ModelSerializer):
     thumbnail_url = serializers.SerializerMethodField()
     access_logs = DocumentAccessLogSerializer(many=True, read_only=True)
     
+    field_dependencies = {'file_size_formatted': ['file_size'], 'file_url': ['file'], 'thumbnail_url': ['thumbnail']}
+    
     class Meta:
         model = Document
         fields = [
@@ -95,7 +100,7 @@ class DocumentSerializer(serializers.ModelSerializer):
         return None
 
 
-class DocumentListSerializer(serializers.ModelSerializer):
+class DocumentListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer resumido para listagem de documentos (otimizado para mobile)
     """
@@ -105,6 +110,16 @@ class DocumentListSerializer(serializers.ModelSerializer):
     file_size_formatted = serializers.CharField(read_only=True)
     file_url = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
+    # Anotado por Document.objects.summary() (início do texto do OCR)
+    ocr_snippet = serializers.CharField(read_only=True, default=None)
+    
+    field_dependencies = {
+        'file_size_formatted': ['file_size'], 'file_url': ['file'], 'thumbnail_url': ['thumbnail'],
+        'ocr_snippet': [],
+    }
+    expandable_fields = {
+        'patient': ('prontuario.serializers.PatientListSerializer', ['patient__fisioterapeuta', 'patient__filial']),
+    }
     
     class Meta:
         model = Document
@@ -112,7 +127,7 @@ class DocumentListSerializer(serializers.ModelSerializer):
             'id', 'patient', 'patient_name', 'category', 'category_name',
             'title', 'document_type', 'document_type_display',
             'file_url', 'thumbnail_url', 'file_size_formatted',
-            'ocr_processed', 'ocr_confidence',
+            'ocr_processed', 'ocr_confidence', 'ocr_snippet',
             'created_at', 'is_verified'
         ]
     
@@ -192,3 +207,43 @@ class DocumentUpdateSerializer(serializers.ModelSerializer):
             'access_level', 'allowed_users', 'document_date',
             'tags', 'is_verified'
         ]
+
+
+class OCRJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer para tarefas de OCR em segundo plano (polling do status)
+    """
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    progress = serializers.IntegerField(read_only=True)
+    status_url = serializers.SerializerMethodField()
+    result = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = OCRJob
+        fields = [
+            'id', 'document', 'status', 'status_display',
+            'total_pages', 'processed_pages', 'progress',
+            'error', 'attempts', 'created_at', 'started_at', 'finished_at',
+            'status_url', 'result'
+        ]
+        read_only_fields = fields
+    
+    def get_status_url(self, obj):
+        """
+        Retorna a URL de acompanhamento da tarefa
+        """
+        from django.urls import reverse
+        url = reverse('ocr-job-status', args=[obj.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+    
+    def get_result(self, obj):
+        """
+        Retorna o texto extraído quando a tarefa foi concluída
+        """
+        if obj.status != 'DONE':
+            return None
+        return {
+            'text': obj.document.ocr_text,
+            'confidence': obj.document.ocr_confidence,
+        }
@@ -1,3 +1,690 @@
-from django.test import TestCase
+"""
+Testes do app de documentos
+Digitalização com OCR em segundo plano (fila OCRJob), OCR de PDFs em janelas
+de páginas, entradas em memória, cache de resultados de OCR e busca textual
+"""
+import io
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework import status
+
+from authentication.models import Clinica, Filial, User
+from prontuario.models import Patient
+from documentos.models import Document, OCRJob, OCRCacheEntry
+from documentos.ocr_cache import OCRResultCache
+from documentos.ocr_jobs import claim_jobs, requeue_stale_jobs
+
+
+def _png_upload(name='ficha.png'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 20), 'white').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class OCRJobQueueTests(TestCase):
+    """Testes da fila de OCR: upload assíncrono, worker e polling"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.clinica = Clinica.objects.create(
+            nome="Rede FisioVida Teste",
+            cnpj="00.000.000/0001-00",
+            razao_social="FisioVida Teste LTDA",
+            email="teste@fisiovida.com",
+            telefone="(81) 99999-9999",
+            endereco="Rua Teste",
+            numero="123",
+            bairro="Centro",
+            cidade="Recife",
+            estado="PE",
+            cep="50000-000"
+        )
+        self.filial = Filial.objects.create(
+            clinica=self.clinica,
+            nome="FisioVida Recife",
+            endereco="Av. Boa Viagem",
+            numero="100",
+            bairro="Boa Viagem",
+            cidade="Recife",
+            estado="PE",
+            cep="51020-000",
+            telefone="(81) 3333-1001"
+        )
+        self.patient = Patient.objects.create(
+            clinica=self.clinica,
+            filial=self.filial,
+            full_name="Paciente OCR",
+            cpf="301.000.000-01",
+            birth_date=date(1990, 1, 1),
+            phone="(81) 98888-0001"
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _upload(self, **extra):
+        data = {'file': _png_upload(), 'patient_id': self.patient.id, 'title': 'Ficha', **extra}
+        return self.client.post(reverse('digitalize-document'), data)
+
+    def _run_worker(self):
+        call_command('process_ocr_jobs', once=True, workers=0, stdout=io.StringIO())
+
+    def test_upload_responde_202_sem_executar_ocr(self):
+        """O upload só enfileira a tarefa; o OCR não roda dentro da requisição"""
+        with mock.patch('documentos.ocr_utils.OCRProcessor.process_document') as process:
+            response = self._upload()
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        process.assert_not_called()
+
+        job = OCRJob.objects.get(id=response.json()['ocr_job']['id'])
+        self.assertEqual(job.status, 'QUEUED')
+        self.assertEqual(job.document_id, response.json()['id'])
+        self.assertTrue(response.json()['ocr_job']['status_url'].endswith(f'/ocr-jobs/{job.id}/'))
+
+    def test_upload_sem_ocr_nao_cria_tarefa(self):
+        response = self._upload(process_ocr='false')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(OCRJob.objects.exists())
+
+    def test_worker_processa_tarefa_e_polling_retorna_resultado(self):
+        """O worker grava texto, progresso por página e o status DONE"""
+        job_id = self._upload().json()['ocr_job']['id']
+
+        def fake_ocr(content, progress_callback=None, filename=None):
+            progress_callback(1, 2)
+            progress_callback(2, 2)
+            return {'text': 'Texto da ficha', 'confidence': 91.5, 'success': True}
+
+        with mock.patch('documentos.ocr_utils.OCRProcessor.process_document', side_effect=fake_ocr):
+            self._run_worker()
+
+        response = self.client.get(reverse('ocr-job-status', args=[job_id]))
+        data = response.json()
+
+        self.assertEqual(data['status'], 'DONE')
+        self.assertEqual(data['processed_pages'], 2)
+        self.assertEqual(data['total_pages'], 2)
+        self.assertEqual(data['progress'], 100)
+        self.assertEqual(data['attempts'], 1)
+        self.assertEqual(data['result'], {'text': 'Texto da ficha', 'confidence': 91.5})
+
+        document = Document.objects.get(id=data['document'])
+        self.assertTrue(document.ocr_processed)
+        self.assertTrue(document.thumbnail)
+
+    def test_texto_do_ocr_entra_na_busca_textual(self):
+        """O documento gravado pelo worker é encontrado pelo texto extraído"""
+        self._upload(title='Exame de imagem')
+        outro = self._upload(title='Ressonância lombar', process_ocr='false').json()['id']
+
+        with mock.patch(
+            'documentos.ocr_utils.OCRProcessor.process_document',
+            return_value={'text': 'Hérnia de disco em L4-L5', 'confidence': 90.0, 'success': True}
+        ):
+            self._run_worker()
+
+        gestor = User.objects.create_user(
+            username='gestor_busca', password='senha123', cpf='000.000.009-01',
+            clinica=self.clinica, user_type='GESTOR_GERAL'
+        )
+
+        def buscar(termo):
+            response = self.client.get('/api/documentos/documents/search/', {'q': termo}, HTTP_X_USER_ID=str(gestor.id))
+            return [item['title'] for item in response.json()['results']]
+
+        self.assertEqual(buscar('hernia disco'), ['Exame de imagem'])
+        self.assertEqual(buscar('lombar'), ['Ressonância lombar'])
+
+        Document.objects.get(id=outro).delete()
+        self.assertEqual(buscar('lombar'), [])
+
+    def test_busca_pelo_nome_do_paciente(self):
+        """O nome do paciente também encontra os documentos; acertos no índice vêm antes"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        outro_paciente = Patient.objects.create(
+            clinica=self.clinica, filial=self.filial, full_name='Maria Lombardi',
+            cpf='301.000.000-02', birth_date=date(1985, 5, 5), phone='(81) 98888-0002'
+        )
+        self._upload(title='Ficha de avaliação', process_ocr='false')
+        self._upload(title='Raio-X lombar', patient_id=outro_paciente.id, process_ocr='false')
+        self._upload(title='Atestado', patient_id=outro_paciente.id, process_ocr='false')
+        gestor = User.objects.create_user(
+            username='gestor_busca_nome', password='senha123', cpf='000.000.009-02',
+            clinica=self.clinica, user_type='GESTOR_GERAL'
+        )
+
+        def buscar(termo):
+            response = self.client.get('/api/documentos/documents/search/', {'q': termo}, HTTP_X_USER_ID=str(gestor.id))
+            return [item['title'] for item in response.json()['results']]
+
+        self.assertEqual(buscar('Paciente OCR'), ['Ficha de avaliação'])
+        # "lombar" está no título de um documento e no nome da paciente dos dois
+        self.assertEqual(buscar('lombar'), ['Raio-X lombar', 'Atestado'])
+
+        # SQLite: a tabela FTS5 entra por JOIN (bm25 na mesma linha, sem subconsulta por linha)
+        # e o nome do paciente por uma união, um MATCH em cada parte
+        with CaptureQueriesContext(connection) as consultas:
+            buscar('lombar')
+        selects = [q['sql'] for q in consultas.captured_queries if 'documentos_document_fts' in q['sql']]
+        self.assertTrue(selects)
+        if connection.vendor == 'sqlite':
+            for sql in selects:
+                self.assertIn('INNER JOIN "documentos_document_fts"', sql)
+                self.assertIn(' UNION ALL ', sql)
+                self.assertEqual(sql.count(' MATCH '), 2, sql)
+                self.assertNotIn('rowid =', sql)
+
+    def test_falha_do_ocr_marca_tarefa_como_failed(self):
+        job_id = self._upload().json()['ocr_job']['id']
+
+        with mock.patch(
+            'documentos.ocr_utils.OCRProcessor.process_document',
+            return_value={'text': '', 'confidence': 0, 'success': False, 'error': 'tesseract ausente'}
+        ):
+            self._run_worker()
+
+        job = OCRJob.objects.get(id=job_id)
+        self.assertEqual(job.status, 'FAILED')
+        self.assertEqual(job.error, 'tesseract ausente')
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(self.client.get(reverse('ocr-job-status', args=[job_id])).json()['result'])
+
+    def test_reserva_nao_repete_tarefas_e_recupera_interrompidas(self):
+        """Tarefas reservadas saem da fila; as presas em RUNNING voltam para ela"""
+        first = self._upload().json()['ocr_job']['id']
+        second = self._upload().json()['ocr_job']['id']
+
+        self.assertEqual(claim_jobs(1), [first])
+        self.assertEqual(claim_jobs(5), [second])
+        self.assertEqual(claim_jobs(5), [])
+
+        OCRJob.objects.filter(id=first).update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(30), 1)
+        self.assertEqual(claim_jobs(5), [first])
+
+    def test_pool_quebrado_devolve_reservadas_e_reinicia(self):
+        """Processo do pool morto: a tarefa dele falha, as reservadas voltam à fila e um novo pool as executa"""
+        from concurrent.futures import Future
+        from concurrent.futures.process import BrokenProcessPool
+
+        ids = [self._upload().json()['ocr_job']['id'] for _ in range(3)]
+        pools = []
+
+        class PoolQueQuebra:
+            """O primeiro pool perde o processo da primeira tarefa; os seguintes executam no próprio processo"""
+
+            def __init__(self, **kwargs):
+                self.quebrado = not pools
+                self.enviadas = 0
+                pools.append(self)
+
+            def submit(self, fn, job_id):
+                future = Future()
+                if not self.quebrado:
+                    future.set_result(fn(job_id))
+                elif self.enviadas:
+                    raise BrokenProcessPool('processo morto')
+                else:
+                    future.set_exception(BrokenProcessPool('processo morto'))
+                self.enviadas += 1
+                return future
+
+            def shutdown(self, wait=True):
+                pass
+
+        out = io.StringIO()
+        with mock.patch('documentos.management.commands.process_ocr_jobs.ProcessPoolExecutor', PoolQueQuebra), \
+                mock.patch('documentos.ocr_utils.OCRProcessor.process_document',
+                           return_value={'text': 'Ficha', 'confidence': 90.0, 'success': True}):
+            call_command('process_ocr_jobs', once=True, workers=3, stdout=out)
+
+        self.assertEqual(len(pools), 2)
+        jobs = {job.id: job for job in OCRJob.objects.filter(id__in=ids)}
+        self.assertEqual([jobs[job_id].status for job_id in ids], ['FAILED', 'DONE', 'DONE'])
+        self.assertIn('processo morto', jobs[ids[0]].error)
+        # As devolvidas à fila contam só a tentativa que de fato rodou
+        self.assertEqual([jobs[job_id].attempts for job_id in ids], [1, 1, 1])
+        self.assertIn('3 tarefa(s) de OCR processada(s)', out.getvalue())
+
+    def test_polling_de_tarefa_inexistente(self):
+        response = self.client.get(reverse('ocr-job-status', args=[999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(OCR_PDF_PAGE_WINDOW=4)
+class PDFWindowedOCRTests(TestCase):
+    """Testes do OCR de PDFs em janelas de páginas"""
+
+    def _fake_window(self, calls):
+        def fake(pdf_path, first, last, dpi, language, tesseract_cmd):
+            calls.append((first, last))
+            return {
+                page: {'text': f'texto {page}', 'confidence': 80 + page, 'success': True}
+                for page in range(last, first - 1, -1)
+            }
+        return fake
+
+    def test_paginas_em_janelas_e_texto_na_ordem(self):
+        """Cada janela rasteriza só o seu intervalo; o texto volta na ordem das páginas"""
+        from documentos.ocr_utils import OCRProcessor
+
+        calls = []
+        progress = []
+        with mock.patch('documentos.ocr_utils.pdfinfo_from_path', return_value={'Pages': 10}), \
+                mock.patch('documentos.ocr_utils._ocr_pdf_window', side_effect=self._fake_window(calls)):
+            result = OCRProcessor(pdf_workers=1).extract_text_from_pdf(
+                'exame.pdf', progress_callback=lambda done, total: progress.append((done, total))
+            )
+
+        self.assertEqual(calls, [(1, 4), (5, 8), (9, 10)])
+        self.assertEqual(progress, [(4, 10), (8, 10), (10, 10)])
+        self.assertEqual(result['pages'], 10)
+        self.assertEqual(result['confidence'], 85.5)
+        self.assertEqual(
+            result['text'].split('\n\n')[:2],
+            ['=== PÁGINA 1 ===\ntexto 1', '=== PÁGINA 2 ===\ntexto 2']
+        )
+
+    def test_janela_passa_paginas_em_memoria_para_o_ocr(self):
+        """Só as páginas da janela são rasterizadas e vão direto (PIL) para o OCR"""
+        from documentos import ocr_utils
+
+        pages = [Image.new('L', (10, 10), 255) for _ in range(3)]
+        received = []
+
+        def fake_extract(processor, image, preprocess=True):
+            received.append(image)
+            return {'text': 'ok', 'confidence': 90, 'words': [], 'success': True}
+
+        with mock.patch('documentos.ocr_utils.convert_from_bytes', return_value=list(pages)) as convert, \
+                mock.patch.object(ocr_utils.OCRProcessor, 'extract_text_from_image', autospec=True,
+                                  side_effect=fake_extract):
+            results = ocr_utils._ocr_pdf_window(b'%PDF-1.4', 5, 7, 300, 'por', None)
+
+        self.assertEqual(convert.call_args.kwargs['first_page'], 5)
+        self.assertEqual(convert.call_args.kwargs['last_page'], 7)
+        self.assertEqual(sorted(results), [5, 6, 7])
+        self.assertNotIn('words', results[5])
+        self.assertEqual(received, pages)
+
+
+class OCRTextReconstructionTests(TestCase):
+    """Testes do texto remontado a partir de uma única passada do image_to_data"""
+
+    # Saída de image_to_data (Output.DICT): níveis de página/bloco/parágrafo/linha
+    # têm texto vazio e conf -1; as palavras (nível 5) trazem texto e confiança
+    DATA = {
+        'level': [1, 2, 3, 4, 5, 5, 4, 5, 3, 4, 5, 5],
+        'block_num': [0, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+        'par_num': [0, 0, 1, 1, 1, 1, 1, 1, 2, 2, 2, 2],
+        'line_num': [0, 0, 0, 1, 1, 1, 2, 2, 0, 1, 1, 1],
+        'word_num': [0, 0, 0, 0, 1, 2, 0, 1, 0, 0, 1, 2],
+        'left': [0] * 12,
+        'top': [0] * 12,
+        'width': [10] * 12,
+        'height': [10] * 12,
+        'conf': ['-1', '-1', '-1', '-1', '96.5', '90', '-1', '88', '-1', '-1', '70.25', '0'],
+        'text': ['', '', '', '', 'Dor', 'lombar', '', 'crônica', '', '', 'Conduta:', 'RPG'],
+    }
+
+    def test_layout_de_linhas_e_paragrafos(self):
+        from documentos.ocr_utils import text_from_words, words_from_data
+
+        words = words_from_data(self.DATA)
+
+        self.assertEqual(text_from_words(words), 'Dor lombar\ncrônica\n\nConduta: RPG')
+        self.assertEqual([w['confidence'] for w in words], [96.5, 90.0, 88.0, 70.25, 0.0])
+
+    def test_texto_exato_com_varios_blocos_sem_tesseract(self):
+        """Quebras de linha e de parágrafo/bloco exatas; entradas vazias e de conf -1 não geram texto"""
+        from documentos.ocr_utils import text_from_words, words_from_data
+
+        # (level, block, par, line, word, conf, text)
+        rows = [
+            (1, 0, 0, 0, 0, '-1', ''),
+            (2, 1, 0, 0, 0, '-1', ''),
+            (3, 1, 1, 0, 0, '-1', ''),
+            (4, 1, 1, 1, 0, '-1', ''),
+            (5, 1, 1, 1, 1, '95', 'FICHA'),
+            (5, 1, 1, 1, 2, '93.4', 'DE'),
+            (5, 1, 1, 1, 3, '91', 'AVALIAÇÃO'),
+            (4, 1, 1, 2, 0, '-1', ''),
+            (5, 1, 1, 2, 1, '-1', ' '),
+            (5, 1, 1, 2, 2, '87', 'Paciente:'),
+            (5, 1, 1, 2, 3, '80', 'Maria'),
+            (3, 1, 2, 0, 0, '-1', ''),
+            (4, 1, 2, 1, 0, '-1', ''),
+            (5, 1, 2, 1, 1, '90', 'Queixa:'),
+            (5, 1, 2, 1, 2, '89', 'dor'),
+            # Linha só com entradas vazias: não vira linha em branco
+            (4, 1, 2, 2, 0, '-1', ''),
+            (5, 1, 2, 2, 1, '-1', ''),
+            (5, 1, 2, 2, 2, '-1', None),
+            (4, 1, 2, 3, 0, '-1', ''),
+            (5, 1, 2, 3, 1, '85', 'lombar'),
+            # Bloco vazio entre os blocos com texto
+            (2, 2, 0, 0, 0, '-1', ''),
+            (5, 2, 1, 1, 1, '-1', '  '),
+            (2, 3, 0, 0, 0, '-1', ''),
+            (3, 3, 1, 0, 0, '-1', ''),
+            (4, 3, 1, 1, 0, '-1', ''),
+            (5, 3, 1, 1, 1, '78', 'Conduta:'),
+            (5, 3, 1, 1, 2, '0', 'RPG'),
+        ]
+        data = {
+            key: [row[position] for row in rows]
+            for position, key in enumerate(['level', 'block_num', 'par_num', 'line_num', 'word_num', 'conf', 'text'])
+        }
+        for key in ('left', 'top', 'width', 'height'):
+            data[key] = [0] * len(rows)
+
+        words = words_from_data(data)
+
+        self.assertEqual(
+            text_from_words(words),
+            'FICHA DE AVALIAÇÃO\nPaciente: Maria\n\nQueixa: dor\nlombar\n\nConduta: RPG'
+        )
+        self.assertEqual(len(words), 10)
+        self.assertEqual(text_from_words([]), '')
+
+    def test_uma_unica_passada_do_tesseract(self):
+        """image_to_string não é mais chamado; a confiança ignora palavras com conf 0"""
+        from documentos.ocr_utils import OCRProcessor
+
+        with tempfile.TemporaryDirectory() as folder:
+            image_path = os.path.join(folder, 'ficha.png')
+            Image.new('L', (20, 20), 255).save(image_path)
+
+            with mock.patch('documentos.ocr_utils.pytesseract.image_to_data', return_value=self.DATA) as to_data, \
+                    mock.patch('documentos.ocr_utils.pytesseract.image_to_string') as to_string:
+                result = OCRProcessor().extract_text_from_image(image_path, preprocess=False)
+
+        to_data.assert_called_once()
+        to_string.assert_not_called()
+        self.assertEqual(result['text'], 'Dor lombar\ncrônica\n\nConduta: RPG')
+        self.assertEqual(result['confidence'], 86.19)
+        self.assertEqual(len(result['words']), 5)
+
+    @skipUnless(shutil.which('tesseract'), 'Tesseract não instalado')
+    def test_texto_igual_ao_image_to_string(self):
+        """Regressão: o texto remontado coincide com a saída antiga em imagens de exemplo"""
+        import pytesseract
+        from PIL import ImageDraw
+        from documentos.ocr_utils import OCRProcessor
+
+        fixtures = [
+            ['FICHA DE AVALIACAO', 'Paciente: Maria da Silva'],
+            ['Queixa principal: dor lombar', '', 'Conduta: cinesioterapia'],
+        ]
+        processor = OCRProcessor(tesseract_cmd=shutil.which('tesseract'), language='eng')
+
+        with tempfile.TemporaryDirectory() as folder:
+            for index, lines in enumerate(fixtures):
+                image = Image.new('L', (900, 60 + 50 * len(lines)), 255)
+                draw = ImageDraw.Draw(image)
+                for i, line in enumerate(lines):
+                    draw.text((30, 30 + 50 * i), line, fill=0, font_size=28)
+                image_path = os.path.join(folder, f'fixture_{index}.png')
+                image.save(image_path)
+
+                old_text = pytesseract.image_to_string(image, lang='eng').strip()
+                result = processor.extract_text_from_image(image_path, preprocess=False)
+
+                self.assertEqual(result['text'].split(), old_text.split())
+
+
+class OCRInMemoryInputTests(TestCase):
+    """Testes das entradas em memória do OCR (sem arquivos temporários)"""
+
+    def _image(self):
+        image = Image.new('RGB', (30, 20), 'white')
+        image.paste((0, 0, 0), (5, 5, 15, 15))
+        return image
+
+    def test_mesma_imagem_em_todos_os_formatos_de_entrada(self):
+        """Caminho, bytes, upload, PIL e numpy geram a mesma imagem em cinza"""
+        import numpy as np
+        from documentos.ocr_utils import load_grayscale
+
+        image = self._image()
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG')
+        content = buffer.getvalue()
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'ficha.png')
+            image.save(path)
+            expected = load_grayscale(path)
+
+        for source in [content, io.BytesIO(content), image, np.asarray(image)[:, :, ::-1].copy()]:
+            np.testing.assert_array_equal(load_grayscale(source), expected)
+
+    def test_quick_scan_processa_upload_sem_arquivo_temporario(self):
+        data = OCRTextReconstructionTests.DATA
+
+        with mock.patch('documentos.ocr_utils.pytesseract.image_to_data', return_value=data) as to_data, \
+                mock.patch('tempfile.NamedTemporaryFile') as named_temp:
+            response = self.client.post(reverse('quick-scan'), {'file': _png_upload()})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['text'], 'Dor lombar\ncrônica\n\nConduta: RPG')
+        named_temp.assert_not_called()
+        self.assertIsInstance(to_data.call_args.args[0], Image.Image)
+
+    def test_pdf_em_bytes_detectado_pelo_conteudo(self):
+        from documentos.ocr_utils import OCRProcessor
+
+        with mock.patch.object(OCRProcessor, 'extract_text_from_pdf', return_value={'success': True}) as extract:
+            OCRProcessor().process_document(b'%PDF-1.7 ...')
+
+        extract.assert_called_once()
+
+
+
+class OCRResultCacheTests(TestCase):
+    """Testes do cache de resultados de OCR por conteúdo do arquivo"""
+
+    RESULT = {'text': 'Laudo de ressonância', 'confidence': 88.0, 'pages': 1, 'success': True}
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.clinica = Clinica.objects.create(
+            nome="Rede Cache OCR",
+            cnpj="00.000.000/0009-00",
+            razao_social="Cache OCR LTDA",
+            email="cache@fisiovida.com",
+            telefone="(81) 99999-9999",
+            endereco="Rua Teste",
+            numero="123",
+            bairro="Centro",
+            cidade="Recife",
+            estado="PE",
+            cep="50000-000"
+        )
+        self.filial = Filial.objects.create(
+            clinica=self.clinica,
+            nome="Filial Cache",
+            endereco="Av. Boa Viagem",
+            numero="100",
+            bairro="Boa Viagem",
+            cidade="Recife",
+            estado="PE",
+            cep="51020-000",
+            telefone="(81) 3333-1001"
+        )
+        self.patient = Patient.objects.create(
+            clinica=self.clinica,
+            filial=self.filial,
+            full_name="Paciente Cache",
+            cpf="309.000.000-01",
+            birth_date=date(1990, 1, 1),
+            phone="(81) 98888-0009"
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _processor(self, language='por+eng'):
+        from documentos.ocr_utils import OCRProcessor
+        return OCRProcessor(language=language)
+
+    def test_arquivo_repetido_nao_passa_pela_fila(self):
+        """Reenvio do mesmo arquivo preenche o texto na hora (201, sem OCRJob)"""
+        upload = _png_upload()
+        OCRResultCache().set(upload.read(), self._processor(), self.RESULT)
+        upload.seek(0)
+
+        response = self.client.post(
+            reverse('digitalize-document'),
+            {'file': upload, 'patient_id': self.patient.id, 'title': 'Laudo'}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.json()['ocr_processing']['cached'])
+        self.assertFalse(OCRJob.objects.exists())
+        document = Document.objects.get(id=response.json()['id'])
+        self.assertEqual(document.ocr_text, 'Laudo de ressonância')
+        self.assertTrue(document.ocr_processed)
+
+    def test_worker_grava_no_cache_e_quick_scan_reaproveita(self):
+        response = self.client.post(
+            reverse('digitalize-document'),
+            {'file': _png_upload(), 'patient_id': self.patient.id, 'title': 'Laudo'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        with mock.patch('documentos.ocr_utils.OCRProcessor.process_document', return_value=self.RESULT):
+            call_command('process_ocr_jobs', once=True, workers=0, stdout=io.StringIO())
+        self.assertEqual(OCRCacheEntry.objects.count(), 1)
+
+        with mock.patch('documentos.ocr_utils.pytesseract.image_to_data') as to_data:
+            response = self.client.post(reverse('quick-scan'), {'file': _png_upload()})
+
+        to_data.assert_not_called()
+        self.assertEqual(response.json()['text'], 'Laudo de ressonância')
+        self.assertTrue(response.json()['cached'])
+
+    def test_chave_depende_do_idioma_e_do_conteudo(self):
+        ocr_cache = OCRResultCache()
+        ocr_cache.set(b'arquivo-1', self._processor('por'), self.RESULT)
+
+        self.assertIsNotNone(ocr_cache.get(b'arquivo-1', self._processor('por')))
+        self.assertIsNone(ocr_cache.get(b'arquivo-1', self._processor('eng')))
+        self.assertIsNone(ocr_cache.get(b'arquivo-2', self._processor('por')))
+
+        # Falhas não são guardadas
+        ocr_cache.set(b'arquivo-3', self._processor('por'), {'text': '', 'success': False})
+        self.assertIsNone(ocr_cache.get(b'arquivo-3', self._processor('por')))
+
+        stats = ocr_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 3, 1))
+
+    def test_remove_entradas_usadas_ha_mais_tempo(self):
+        ocr_cache = OCRResultCache(max_entries=2)
+        processor = self._processor()
+        ocr_cache.set(b'a', processor, self.RESULT)
+        ocr_cache.set(b'b', processor, self.RESULT)
+        OCRCacheEntry.objects.update(last_used_at=timezone.now() - timedelta(hours=1))
+
+        ocr_cache.get(b'a', processor)  # 'a' passa a ser a mais recente
+        ocr_cache.set(b'c', processor, self.RESULT)
+
+        self.assertIsNotNone(ocr_cache.get(b'a', processor))
+        self.assertIsNotNone(ocr_cache.get(b'c', processor))
+        self.assertIsNone(ocr_cache.get(b'b', processor))
+
+        # Limite em bytes de texto
+        OCRResultCache(max_bytes=len(self.RESULT['text'].encode())).evict()
+        self.assertEqual(OCRCacheEntry.objects.count(), 1)
+
+
+class DocumentListSummaryTests(TestCase):
+    """Listagens de documentos sem ocr_text (Document.objects.summary())"""
+
+    OCR_SQL = r'(?<!SUBSTR\()"documentos_document"\."ocr_text"'
+
+    def setUp(self):
+        self.clinica = Clinica.objects.create(
+            nome="Rede FisioVida Teste", cnpj="00.000.000/0001-00", razao_social="FisioVida Teste LTDA",
+            email="teste@fisiovida.com", telefone="(81) 99999-9999", endereco="Rua Teste", numero="123",
+            bairro="Centro", cidade="Recife", estado="PE", cep="50000-000"
+        )
+        self.filial = Filial.objects.create(
+            clinica=self.clinica, nome="FisioVida Recife", endereco="Av. Boa Viagem", numero="100",
+            bairro="Boa Viagem", cidade="Recife", estado="PE", cep="51020-000", telefone="(81) 3333-1001"
+        )
+        self.patient = Patient.objects.create(
+            clinica=self.clinica, filial=self.filial, full_name="Paciente OCR", cpf="301.000.000-01",
+            birth_date=date(1990, 1, 1), phone="(81) 98888-0001"
+        )
+        self.gestor = User.objects.create(
+            username='gestor_docs', cpf='302.000.000-01', clinica=self.clinica, user_type='GESTOR_GERAL'
+        )
+        self.ocr_text = 'Laudo de ressonância magnética da coluna lombar. ' * 400
+        # bulk_create: o save() do Document lê o tamanho do arquivo
+        self.document = Document.objects.bulk_create([Document(
+            patient=self.patient, title='Ressonância', document_type='EXAME',
+            file='documents/ressonancia.pdf', ocr_text=self.ocr_text, ocr_processed=True
+        )])[0]
+        call_command('rebuild_search_index', '--index', 'documents', stdout=io.StringIO())
+
+    def _get(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, HTTP_X_USER_ID=self.gestor.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json(), ' '.join(q['sql'] for q in ctx.captured_queries)
+
+    def test_listagem_e_busca_trazem_apenas_o_inicio_do_ocr(self):
+        from documentos.models import OCR_SNIPPET_LENGTH
+
+        for url in ['/api/documentos/documents/', '/api/documentos/documents/search/?q=lombar']:
+            with self.subTest(url=url):
+                data, sql = self._get(url)
+                row = data['results'][0]
+                self.assertEqual(row['ocr_snippet'], self.ocr_text[:OCR_SNIPPET_LENGTH])
+                self.assertNotIn('ocr_text', row)
+                self.assertNotRegex(sql, self.OCR_SQL)
+
+    def test_detalhe_traz_o_texto_completo(self):
+        data, sql = self._get(f'/api/documentos/documents/{self.document.id}/')
+        self.assertEqual(data['ocr_text'], self.ocr_text)
+        self.assertRegex(sql, self.OCR_SQL)
+
+    def test_benchmark_da_listagem(self):
+        import json
+
+        out = io.StringIO()
+        call_command(
+            'benchmark_document_list', '--documents', '30', '--ocr-chars', '3000', '--runs', '2', '--json',
+            stdout=out
+        )
+        report = json.loads(out.getvalue())
+        self.assertLess(report['page_summary']['bytes'] * 5, report['page_select_all']['bytes'])
+        self.assertGreater(report['endpoint']['bytes'], 0)
+        # Dados do benchmark desfeitos ao final
+        self.assertEqual(Document.objects.count(), 1)
@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import DocumentCategoryViewSet, DocumentViewSet
-from .views_ocr import digitalize_document, reprocess_ocr, quick_scan
+from .views_ocr import digitalize_document, reprocess_ocr, quick_scan, ocr_job_status, ocr_cache_stats
 
 router = DefaultRouter()
 router.register(r'categories', DocumentCategoryViewSet, basename='document-category')
@@ -13,4 +13,6 @@ urlpatterns = [
     path('digitalize/', digitalize_document, name='digitalize-document'),
     path('documents/<int:document_id>/reprocess-ocr/', reprocess_ocr, name='reprocess-ocr'),
     path('quick-scan/', quick_scan, name='quick-scan'),
+    path('ocr-jobs/<int:job_id>/', ocr_job_status, name='ocr-job-status'),
+    path('ocr-cache/stats/', ocr_cache_stats, name='ocr-cache-stats'),
 ]
@@ -3,8 +3,8 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.db.models import Q
 from django.http import FileResponse, Http404
+from django.db.models import Q
 from .models import DocumentCategory, Document, DocumentAccessLog
 from .serializers import (
     DocumentCategorySerializer,
@@ -12,10 +12,14 @@ from .serializers import (
     DocumentCreateSerializer, DocumentUpdateSerializer,
     DocumentAccessLogSerializer
 )
+from .search import DOCUMENT_INDEX
+from authentication.current_user import get_current_user
+from prontuario.pagination import KeysetCursorPagination
+from prontuario.fieldsets import SparseFieldsetViewMixin
 import os
 
 
-class DocumentCategoryViewSet(viewsets.ModelViewSet):
+class DocumentCategoryViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para gerenciar categorias de documentos
     Endpoints:
@@ -44,7 +48,7 @@ class DocumentCategoryViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class DocumentViewSet(viewsets.ModelViewSet):
+class DocumentViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para gerenciar documentos
     Endpoints:
@@ -74,30 +78,15 @@ class DocumentViewSet(viewsets.ModelViewSet):
         return DocumentSerializer
     
     def get_queryset(self):
-        queryset = super().get_queryset()
-        
-        # Identificar usuário: prioridade para sessão, depois header X-User-Id
-        user = None
-        if self.request.user.is_authenticated:
-            user = self.request.user
-        else:
-            user_id = self.request.headers.get('X-User-Id')
-            if user_id:
-                from authentication.models import User
-                try:
-                    user = User.objects.get(id=int(user_id), is_active_user=True)
-                except (User.DoesNotExist, ValueError):
-                    pass
+        # paciente e categoria entram no SELECT (nomes usados pelos serializers)
+        queryset = super().get_queryset().select_related('patient', 'category')
+        # Listagens e buscas: sem ocr_text/description, com ocr_snippet
+        if self.action in ['list', 'search', 'by_patient']:
+            queryset = queryset.summary()
         
-        # RBAC: Filtrar por clínica e papel do usuário
-        if user and hasattr(user, 'clinica') and user.clinica:
-            # Filtrar pela clínica do usuário através do relacionamento patient
-            queryset = queryset.filter(patient__clinica=user.clinica)
-            
-            # Se for fisioterapeuta, mostrar apenas documentos dos seus pacientes
-            if user.user_type == 'FISIOTERAPEUTA':
-                queryset = queryset.filter(patient__fisioterapeuta=user)
-            # Se for gestor, mostra todos os documentos da clínica (já filtrado acima)
+        # RBAC: documentos da clínica do usuário (via paciente);
+        # fisioterapeuta vê apenas documentos dos seus pacientes
+        queryset = queryset.for_user(get_current_user(self.request))
         
         # Filtrar por paciente
         patient_id = self.request.query_params.get('patient', None)
@@ -165,17 +154,7 @@ class DocumentViewSet(viewsets.ModelViewSet):
         Remove um documento e registra no log
         """
         # Identificar usuário: prioridade para sessão, depois header X-User-Id
-        user = None
-        if self.request.user.is_authenticated:
-            user = self.request.user
-        else:
-            user_id = self.request.headers.get('X-User-Id')
-            if user_id:
-                from authentication.models import User
-                try:
-                    user = User.objects.get(id=int(user_id), is_active_user=True)
-                except (User.DoesNotExist, ValueError):
-                    pass
+        user = get_current_user(self.request)
         
         # Registrar exclusão no log (apenas se houver usuário identificado)
         if user:
@@ -245,9 +224,17 @@ class DocumentViewSet(viewsets.ModelViewSet):
     def access_logs(self, request, pk=None):
         """
         Retorna os logs de acesso de um documento
+        Com ?cursor=, paginado por cursor (next/results)
         """
         document = self.get_object()
-        logs = document.access_logs.all()
+        logs = document.access_logs.select_related('user')
+        
+        paginator = KeysetCursorPagination()
+        page = paginator.paginate_queryset(logs, request, view=self)
+        if page is not None:
+            serializer = DocumentAccessLogSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+        
         serializer = DocumentAccessLogSerializer(logs, many=True)
         return Response(serializer.data)
     
@@ -270,18 +257,14 @@ class DocumentViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def search(self, request):
         """
-        Busca avançada de documentos
+        Busca avançada de documentos (título, tags, descrição e texto do OCR,
+        ou o nome do paciente), ordenada por relevância
         """
         query = request.query_params.get('q', '')
         queryset = self.get_queryset()
         
         if query:
-            queryset = queryset.filter(
-                Q(title__icontains=query) |
-                Q(description__icontains=query) |
-                Q(patient__full_name__icontains=query) |
-                Q(tags__icontains=query)
-            )
+            queryset = DOCUMENT_INDEX.search(queryset, query, extra=Q(patient__full_name__icontains=query))
         
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -5,14 +5,12 @@ from rest_framework import status
 from rest_framework.decorators import api_view, parser_classes
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
-from django.core.files.base import ContentFile
-from django.conf import settings
-import os
-import tempfile
 
-from .models import Document
-from .serializers import DocumentSerializer
-from .ocr_utils import OCRProcessor, create_thumbnail
+from .models import Document, OCRJob
+from .serializers import DocumentSerializer, OCRJobSerializer
+from .ocr_utils import OCRProcessor
+from .ocr_jobs import enqueue_ocr
+from .ocr_cache import OCRResultCache
 from prontuario.models import Patient
 
 
@@ -34,7 +32,10 @@ def digitalize_document(request):
         - process_ocr: Boolean para processar OCR (padrão: True)
     
     Retorna:
-        - Documento criado com texto OCR extraído
+        - 202 com o documento criado e a tarefa de OCR (ocr_job); acompanhe
+          o progresso em GET /api/documentos/ocr-jobs/<id>/
+        - 201 com o documento criado quando process_ocr=false, ou já com o
+          texto quando o mesmo arquivo está no cache de OCR
     """
     try:
         # Validar dados
@@ -67,6 +68,13 @@ def digitalize_document(request):
                 status=status.HTTP_404_NOT_FOUND
             )
         
+        # Arquivo já processado antes: o resultado vem do cache, sem fila
+        cached = None
+        if process_ocr:
+            content = file.read()
+            file.seek(0)
+            cached = OCRResultCache().get(content, OCRProcessor())
+        
         # Criar documento
         document = Document.objects.create(
             patient=patient,
@@ -78,64 +86,27 @@ def digitalize_document(request):
             category_id=category_id if category_id else None
         )
         
-        # Processar OCR se solicitado
-        ocr_result = None
-        if process_ocr:
-            try:
-                # Salvar arquivo temporariamente para processamento
-                temp_path = document.file.path
-                
-                # Inicializar processador OCR
-                ocr_processor = OCRProcessor()
-                
-                # Processar documento
-                ocr_result = ocr_processor.process_document(temp_path)
-                
-                if ocr_result['success']:
-                    # Salvar resultados do OCR
-                    document.ocr_text = ocr_result['text']
-                    document.ocr_confidence = ocr_result['confidence']
-                    document.ocr_processed = True
-                    
-                    # Criar thumbnail se for imagem
-                    if document.file_extension in ['.jpg', '.jpeg', '.png', '.gif', '.bmp']:
-                        thumbnail_name = f"thumb_{document.id}.jpg"
-                        thumbnail_path = os.path.join(settings.MEDIA_ROOT, 'documents', 'thumbnails', thumbnail_name)
-                        
-                        os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
-                        
-                        if create_thumbnail(temp_path, thumbnail_path):
-                            # Salvar thumbnail no modelo
-                            with open(thumbnail_path, 'rb') as thumb_file:
-                                document.thumbnail.save(
-                                    thumbnail_name,
-                                    ContentFile(thumb_file.read()),
-                                    save=False
-                                )
-                    
-                    document.save()
-                else:
-                    # OCR falhou, mas documento foi salvo
-                    document.ocr_processed = False
-                    document.save()
-                    
-            except Exception as e:
-                # Log do erro, mas não falha a requisição
-                print(f"Erro ao processar OCR: {str(e)}")
-                document.ocr_processed = False
-                document.save()
-        
-        # Serializar resposta
-        serializer = DocumentSerializer(document, context={'request': request})
+        if cached:
+            document.ocr_text = cached['text']
+            document.ocr_confidence = cached['confidence']
+            document.ocr_processed = True
+            document.save(update_fields=['ocr_text', 'ocr_confidence', 'ocr_processed'])
+            
+            response_data = DocumentSerializer(document, context={'request': request}).data
+            response_data['ocr_processing'] = {'success': True, 'cached': True}
+            return Response(response_data, status=status.HTTP_201_CREATED)
         
+        # OCR em segundo plano: o worker (manage.py process_ocr_jobs) processa a fila
+        serializer = DocumentSerializer(document, context={'request': request})
         response_data = serializer.data
-        if ocr_result:
-            response_data['ocr_processing'] = {
-                'success': ocr_result['success'],
-                'error': ocr_result.get('error', None)
-            }
         
-        return Response(response_data, status=status.HTTP_201_CREATED)
+        if not process_ocr:
+            return Response(response_data, status=status.HTTP_201_CREATED)
+        
+        job = enqueue_ocr(document, requested_by=document.uploaded_by)
+        response_data['ocr_job'] = OCRJobSerializer(job, context={'request': request}).data
+        
+        return Response(response_data, status=status.HTTP_202_ACCEPTED)
         
     except Exception as e:
         return Response(
@@ -147,9 +118,12 @@ def digitalize_document(request):
 @api_view(['POST'])
 def reprocess_ocr(request, document_id):
     """
-    Reprocessa OCR de um documento existente
+    Reprocessa OCR de um documento existente (em segundo plano)
     
     POST /api/documentos/<id>/reprocess-ocr/
+    
+    Retorna 202 com a tarefa de OCR criada, ou 200 com o documento
+    atualizado quando o resultado está no cache de OCR
     """
     try:
         document = Document.objects.get(id=document_id)
@@ -161,24 +135,21 @@ def reprocess_ocr(request, document_id):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Processar OCR
-        ocr_processor = OCRProcessor()
-        ocr_result = ocr_processor.process_document(document.file.path)
+        with document.file.open('rb') as f:
+            cached = OCRResultCache().get(f.read(), OCRProcessor())
         
-        if ocr_result['success']:
-            document.ocr_text = ocr_result['text']
-            document.ocr_confidence = ocr_result['confidence']
+        if cached:
+            document.ocr_text = cached['text']
+            document.ocr_confidence = cached['confidence']
             document.ocr_processed = True
-            document.save()
-            
+            document.save(update_fields=['ocr_text', 'ocr_confidence', 'ocr_processed'])
             serializer = DocumentSerializer(document, context={'request': request})
             return Response(serializer.data, status=status.HTTP_200_OK)
-        else:
-            return Response(
-                {'error': ocr_result.get('error', 'Falha no processamento OCR')},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-            
+        
+        job = enqueue_ocr(document, requested_by=request.user if request.user.is_authenticated else None)
+        serializer = OCRJobSerializer(job, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+        
     except Document.DoesNotExist:
         return Response(
             {'error': 'Documento não encontrado'},
@@ -216,39 +187,66 @@ def quick_scan(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Salvar temporariamente
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.name)[1]) as tmp:
-            for chunk in file.chunks():
-                tmp.write(chunk)
-            tmp_path = tmp.name
+        # Processar OCR direto do buffer do upload, sem arquivo temporário
+        content = file.read()
+        ocr_processor = OCRProcessor()
+        ocr_cache = OCRResultCache()
+        ocr_result = ocr_cache.get(content, ocr_processor)
+        if ocr_result is None:
+            ocr_result = ocr_processor.process_document(content, filename=file.name)
+            ocr_cache.set(content, ocr_processor, ocr_result)
         
-        try:
-            # Processar OCR
-            ocr_processor = OCRProcessor()
-            ocr_result = ocr_processor.process_document(tmp_path)
-            
-            # Remover arquivo temporário
-            os.unlink(tmp_path)
-            
-            if ocr_result['success']:
-                return Response({
-                    'text': ocr_result['text'],
-                    'confidence': ocr_result['confidence'],
-                    'success': True
-                }, status=status.HTTP_200_OK)
-            else:
-                return Response({
-                    'error': ocr_result.get('error', 'Falha no processamento'),
-                    'success': False
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-                
-        finally:
-            # Garantir que o arquivo temporário seja removido
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+        if ocr_result['success']:
+            return Response({
+                'text': ocr_result['text'],
+                'confidence': ocr_result['confidence'],
+                'cached': ocr_result.get('cached', False),
+                'success': True
+            }, status=status.HTTP_200_OK)
+        else:
+            return Response({
+                'error': ocr_result.get('error', 'Falha no processamento'),
+                'success': False
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
     except Exception as e:
         return Response(
             {'error': f'Erro ao processar: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+
+
+@api_view(['GET'])
+def ocr_job_status(request, job_id):
+    """
+    Status e progresso de uma tarefa de OCR
+    
+    GET /api/documentos/ocr-jobs/<id>/
+    
+    Retorna:
+        - status: QUEUED, RUNNING, DONE ou FAILED
+        - processed_pages / total_pages / progress
+        - result: texto e confiança do OCR (quando DONE)
+    """
+    try:
+        job = OCRJob.objects.select_related('document').get(id=job_id)
+    except OCRJob.DoesNotExist:
+        return Response(
+            {'error': 'Tarefa de OCR não encontrada'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    serializer = OCRJobSerializer(job, context={'request': request})
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def ocr_cache_stats(request):
+    """
+    Estatísticas do cache de resultados de OCR
+    
+    GET /api/documentos/ocr-cache/stats/
+    
+    Retorna acertos, erros, taxa de acerto e ocupação (entradas e bytes)
+    """
+    return Response(OCRResultCache().stats(), status=status.HTTP_200_OK)
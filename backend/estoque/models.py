@@ -1,6 +1,8 @@
 from django.db import models
 from django.conf import settings
 
+from authentication.tenancy import TenantScopedManager
+
 
 class InventoryCategory(models.Model):
     """
@@ -130,10 +132,15 @@ class InventoryItem(models.Model):
         verbose_name="Criado por"
     )
     
+    objects = TenantScopedManager(clinica='clinica')
+    
     class Meta:
         ordering = ['name']
         verbose_name = "Item de Estoque"
         verbose_name_plural = "Itens de Estoque"
+        indexes = [
+            models.Index(fields=['clinica', 'is_active', 'name'], name='inventory_clinica_active_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.quantity} {self.get_unit_display()})"
@@ -216,6 +223,11 @@ class InventoryTransaction(models.Model):
         ordering = ['-created_at']
         verbose_name = "Movimentação de Estoque"
         verbose_name_plural = "Movimentações de Estoque"
+        indexes = [
+            # Paginação por cursor: (created_at, id), geral e por item
+            models.Index(fields=['created_at', 'id'], name='inventory_tx_cursor_idx'),
+            models.Index(fields=['item', 'created_at', 'id'], name='inventory_tx_item_cursor_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_transaction_type_display()} - {self.item.name} ({self.quantity})"
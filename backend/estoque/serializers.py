@@ -4,12 +4,15 @@ Serializers para Gestão de Estoque
 
 from rest_framework import serializers
 from .models import InventoryCategory, InventoryItem, InventoryTransaction
+from prontuario.fieldsets import SparseFieldsetMixin
 
 
-class InventoryCategorySerializer(serializers.ModelSerializer):
+class InventoryCategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para Categoria de Estoque"""
     items_count = serializers.SerializerMethodField()
     
+    field_dependencies = {'items_count': []}
+    
     class Meta:
         model = InventoryCategory
         fields = ['id', 'name', 'description', 'icon', 'color', 'is_active', 'items_count', 'created_at']
@@ -19,7 +22,7 @@ class InventoryCategorySerializer(serializers.ModelSerializer):
         return obj.items.filter(is_active=True).count()
 
 
-class InventoryItemSerializer(serializers.ModelSerializer):
+class InventoryItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer completo para Item de Estoque"""
     category_name = serializers.CharField(source='category.name', read_only=True, allow_null=True)
     item_type_display = serializers.CharField(source='get_item_type_display', read_only=True)
@@ -27,6 +30,8 @@ class InventoryItemSerializer(serializers.ModelSerializer):
     stock_status = serializers.CharField(read_only=True)
     is_low_stock = serializers.BooleanField(read_only=True)
     
+    field_dependencies = {'stock_status': ['quantity', 'min_quantity'], 'is_low_stock': ['quantity', 'min_quantity']}
+    
     class Meta:
         model = InventoryItem
         fields = [
@@ -39,12 +44,14 @@ class InventoryItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'clinica', 'created_at', 'updated_at', 'created_by']
 
 
-class InventoryItemListSerializer(serializers.ModelSerializer):
+class InventoryItemListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para listagem de Itens"""
     category_name = serializers.CharField(source='category.name', read_only=True, allow_null=True)
     unit_display = serializers.CharField(source='get_unit_display', read_only=True)
     stock_status = serializers.CharField(read_only=True)
     
+    field_dependencies = {'stock_status': ['quantity', 'min_quantity']}
+    
     class Meta:
         model = InventoryItem
         fields = [
@@ -53,12 +60,17 @@ class InventoryItemListSerializer(serializers.ModelSerializer):
         ]
 
 
-class InventoryTransactionSerializer(serializers.ModelSerializer):
+class InventoryTransactionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para Transações de Estoque"""
     item_name = serializers.CharField(source='item.name', read_only=True)
     transaction_type_display = serializers.CharField(source='get_transaction_type_display', read_only=True)
     created_by_name = serializers.SerializerMethodField()
     
+    field_dependencies = {'created_by_name': ['created_by']}
+    expandable_fields = {
+        'item': ('estoque.serializers.InventoryItemListSerializer', ['item__category']),
+    }
+    
     class Meta:
         model = InventoryTransaction
         fields = [
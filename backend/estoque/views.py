@@ -9,6 +9,9 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from django.db.models import Sum
 from .models import InventoryCategory, InventoryItem, InventoryTransaction
+from authentication.current_user import get_current_user
+from prontuario.pagination import CursorOrPageNumberPagination
+from prontuario.fieldsets import SparseFieldsetViewMixin
 from .serializers import (
     InventoryCategorySerializer,
     InventoryItemSerializer, InventoryItemListSerializer,
@@ -16,7 +19,7 @@ from .serializers import (
 )
 
 
-class InventoryCategoryViewSet(viewsets.ModelViewSet):
+class InventoryCategoryViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para Categorias de Estoque
     Apenas Gestor pode gerenciar
@@ -52,7 +55,7 @@ class InventoryCategoryViewSet(viewsets.ModelViewSet):
                 serializer.save(clinica=gestor.clinica)
 
 
-class InventoryItemViewSet(viewsets.ModelViewSet):
+class InventoryItemViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para Itens de Estoque
     Apenas Gestor pode gerenciar
@@ -70,15 +73,8 @@ class InventoryItemViewSet(viewsets.ModelViewSet):
         return InventoryItemSerializer
     
     def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
-        
-        if not user.is_authenticated or not hasattr(user, 'clinica'):
-            from authentication.models import User
-            user = User.objects.filter(user_type='GESTOR', is_active_user=True).first()
-        
-        if user and hasattr(user, 'clinica'):
-            queryset = queryset.filter(clinica=user.clinica)
+        # Itens da clínica do usuário, com a categoria no mesmo SELECT
+        queryset = super().get_queryset().for_user(get_current_user(self.request)).select_related('category')
         
         # Filtros
         category = self.request.query_params.get('category', None)
@@ -144,14 +140,16 @@ class InventoryItemViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class InventoryTransactionViewSet(viewsets.ModelViewSet):
+class InventoryTransactionViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para Transações de Estoque
+    Paginação por cursor com ?cursor= (histórico completo, rolagem infinita)
     """
     queryset = InventoryTransaction.objects.all()
     permission_classes = [AllowAny]  # Temporário para dev
     filter_backends = [filters.OrderingFilter]
     ordering = ['-created_at']
+    pagination_class = CursorOrPageNumberPagination
     
     def get_serializer_class(self):
         if self.action in ['create']:
@@ -159,7 +157,7 @@ class InventoryTransactionViewSet(viewsets.ModelViewSet):
         return InventoryTransactionSerializer
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related('item', 'created_by')
         
         item_id = self.request.query_params.get('item', None)
         if item_id:
@@ -169,7 +167,14 @@ class InventoryTransactionViewSet(viewsets.ModelViewSet):
         if transaction_type:
             queryset = queryset.filter(transaction_type=transaction_type)
         
-        return queryset[:100]  # Limitar a 100 últimas transações
+        return queryset
+    
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        # Sem cursor: limitar às 100 últimas transações (após a ordenação)
+        if self.action == 'list' and not self.paginator.wants_cursor(self.request):
+            return queryset[:100]
+        return queryset
     
     def perform_create(self, serializer):
         user = self.request.user if self.request.user.is_authenticated else None
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     Patient, MedicalRecord, MedicalRecordHistory, 
-    PatientTransferHistory, TreatmentPlan, PhysioSession, Discharge
+    PatientTransferHistory, TreatmentPlan, PhysioSession, Discharge,
+    DailyMetric
 )
 
 
@@ -110,3 +111,12 @@ class DischargeAdmin(admin.ModelAdmin):
     search_fields = ['patient__full_name', 'final_evaluation']
     readonly_fields = ['created_at', 'updated_at']
     date_hierarchy = 'discharge_date'
+
+
+@admin.register(DailyMetric)
+class DailyMetricAdmin(admin.ModelAdmin):
+    list_display = ['day', 'metric', 'value', 'clinica', 'filial', 'fisioterapeuta', 'updated_at']
+    list_filter = ['metric', 'clinica', 'filial', 'day']
+    readonly_fields = ['updated_at']
+    raw_id_fields = ['clinica', 'filial', 'fisioterapeuta']
+    date_hierarchy = 'day'
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ProntuarioConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'prontuario'
+
+    def ready(self):
+        from .signals import (
+            connect_metric_signals, connect_dashboard_cache_signals, connect_search_signals,
+            connect_plan_progress_signals
+        )
+        connect_metric_signals()
+        connect_dashboard_cache_signals()
+        connect_search_signals()
+        connect_plan_progress_signals()
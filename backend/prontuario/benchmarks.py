@@ -0,0 +1,357 @@
+"""
+Benchmark das APIs de leitura (dashboards e listagens)
+
+Mede, para cada endpoint de ENDPOINTS, o número de consultas SQL, a latência
+(p50/p95) e o tamanho da resposta, sobre uma rede sintética criada por
+seed_tenant (N filiais x M fisioterapeutas x K pacientes, com sessões,
+prontuários, planos e documentos espalhados por `years` anos).
+
+Usado pelo comando `benchmark_api`, que grava e confere a baseline em JSON,
+e pelos testes de orçamento de consultas (prontuario/tests.py). O comando
+`generate_load_dataset` usa seed_tenant para gerar massas de dados de
+carga (dezenas de clínicas, milhões de sessões).
+
+As medições são feitas a frio: antes de cada requisição o cache dos
+dashboards e o cache de usuários são invalidados.
+"""
+import random
+import time
+from datetime import date, time as clock, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from authentication.current_user import clear_user_cache
+from authentication.models import Clinica, Filial, User
+from . import dashboard_cache, metrics
+from .models import MedicalRecord, Patient, PatientTransferHistory, PhysioSession, TreatmentPlan
+from .search import MEDICAL_RECORD_INDEX, PATIENT_INDEX
+
+
+# (nome, url, papel do usuário que faz a requisição)
+ENDPOINTS = [
+    ('dashboard_geral', '/api/prontuario/dashboard-stats/', 'gestor_geral'),
+    ('dashboard_gestor', '/api/prontuario/dashboard-stats/gestor/', 'gestor_geral'),
+    ('dashboard_gestor_filial', '/api/prontuario/dashboard-stats/gestor-filial/', 'gestor_filial'),
+    ('dashboard_fisioterapeuta', '/api/prontuario/dashboard-stats/fisioterapeuta/', 'fisioterapeuta'),
+    ('patients', '/api/prontuario/patients/', 'gestor_geral'),
+    ('medical_records', '/api/prontuario/medical-records/', 'gestor_geral'),
+    ('treatment_plans', '/api/prontuario/treatment-plans/', 'gestor_geral'),
+    ('sessions', '/api/prontuario/sessions/', 'gestor_geral'),
+    ('sessions_cursor', '/api/prontuario/sessions/?cursor=', 'gestor_geral'),
+    ('documents', '/api/documentos/documents/', 'gestor_geral'),
+]
+
+RECORD_TYPES = ['CONSULTA', 'AVALIACAO', 'EVOLUCAO', 'PROCEDIMENTO', 'EXAME']
+
+
+# ==================== MEDIÇÃO ====================
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(percent / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def timings(values):
+    """p50/p95 em milissegundos de uma lista de durações em segundos"""
+    return {
+        'p50_ms': round(percentile(values, 50) * 1000, 2),
+        'p95_ms': round(percentile(values, 95) * 1000, 2),
+    }
+
+
+def benchmark_client():
+    """Client com um host aceito pelo ALLOWED_HOSTS (localhost quando vazio, em DEBUG)"""
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+    return Client(HTTP_HOST=hosts[0] if hosts else 'localhost')
+
+
+def measure_endpoint(client, url, user, runs):
+    """{status, queries, p50_ms, p95_ms, bytes} de `runs` requisições GET a frio"""
+    durations, queries, response = [], None, None
+    for _ in range(runs):
+        dashboard_cache.invalidate_dashboards()
+        clear_user_cache()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = client.get(url, HTTP_X_USER_ID=user.id)
+            durations.append(time.perf_counter() - start)
+        if queries is None:
+            queries = len(ctx.captured_queries)
+    return {
+        'status': response.status_code,
+        'queries': queries,
+        **timings(durations),
+        'bytes': len(response.content),
+    }
+
+
+def run_suite(users, runs, endpoints=None):
+    """Mede os endpoints com os usuários de seed_tenant. Retorna {nome: medição}."""
+    client = benchmark_client()
+    return {
+        name: measure_endpoint(client, url, users[role], runs)
+        for name, url, role in (endpoints or ENDPOINTS)
+    }
+
+
+def compare(report, baseline, latency_tolerance=None):
+    """
+    Regressões de `report` em relação à `baseline` (listas de mensagens).
+    Consultas não podem aumentar; a latência p95 só é conferida com
+    `latency_tolerance` (ex.: 0.5 = até 50% mais lenta).
+    """
+    problems = []
+    for name, current in report['endpoints'].items():
+        if current['status'] != 200:
+            problems.append(f"{name}: HTTP {current['status']}")
+        previous = baseline['endpoints'].get(name)
+        if previous is None:
+            continue
+        if current['queries'] > previous['queries']:
+            problems.append(f"{name}: {current['queries']} consultas (baseline: {previous['queries']})")
+        if latency_tolerance is not None and current['p95_ms'] > previous['p95_ms'] * (1 + latency_tolerance):
+            problems.append(f"{name}: p95 {current['p95_ms']} ms (baseline: {previous['p95_ms']} ms)")
+    return problems
+
+
+# ==================== DADOS SINTÉTICOS ====================
+
+OCR_WORDS = [
+    'paciente', 'dor', 'lombar', 'cervical', 'joelho', 'ombro', 'fisioterapia', 'avaliação',
+    'cinesioterapia', 'eletroterapia', 'amplitude', 'movimento', 'força', 'muscular', 'exame',
+    'ressonância', 'laudo', 'conduta', 'evolução', 'sessão', 'alongamento', 'postura',
+]
+INVENTORY_ITEMS = [
+    ('Bandagem elástica', 'MATERIAL', 'rolo'), ('Eletrodo autoadesivo', 'DESCARTAVEL', 'pacote'),
+    ('Gel condutor', 'INSUMO', 'litro'), ('Gelo instantâneo', 'DESCARTAVEL', 'unidade'),
+    ('Fita kinesio', 'MATERIAL', 'rolo'), ('Luva de procedimento', 'DESCARTAVEL', 'caixa'),
+    ('Álcool 70%', 'INSUMO', 'litro'), ('Faixa elástica', 'EQUIPAMENTO', 'unidade'),
+]
+
+
+def ocr_texts(rng, chars, count=50):
+    """
+    `count` textos de OCR com `chars` caracteres. Os documentos reaproveitam
+    o conjunto: o custo medido é do banco, não do gerador.
+    """
+    texts = []
+    for _ in range(count if chars else 0):
+        words, size = [], 0
+        while size < chars:
+            word = rng.choice(OCR_WORDS)
+            words.append(word)
+            size += len(word) + 1
+        texts.append(' '.join(words)[:chars])
+    return texts
+
+
+def _bulk_create(model, objects, batch_size):
+    """bulk_create de um gerador, em lotes de `batch_size` (sem montar tudo na memória)"""
+    batch, created = [], []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            created += model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        created += model.objects.bulk_create(batch)
+    return created
+
+
+def _stream_create(model, objects, batch_size, index=None):
+    """Como _bulk_create, sem guardar os objetos; cada lote vai também para o índice de busca. Retorna o total."""
+    total, batch = 0, []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            total += len(model.objects.bulk_create(batch))
+            if index:
+                index.add_many(batch)
+            batch = []
+    if batch:
+        total += len(model.objects.bulk_create(batch))
+        if index:
+            index.add_many(batch)
+    return total
+
+
+def seed_tenant(filiais=3, fisioterapeutas=4, patients=20, years=1, sessions=24, records=3, seed=42,
+                batch_size=2000, documents=1, ocr_chars=0, items=0, movements=0, suffix=None):
+    """
+    Cria uma rede sintética com bulk_create e atualiza o que os signals
+    manteriam (rollup de métricas, índices de busca, contador dos planos).
+
+    Args:
+        filiais: filiais da rede
+        fisioterapeutas: fisioterapeutas por filial (cada filial tem ainda um gestor e um atendente)
+        patients: pacientes por fisioterapeuta
+        years: anos de histórico das sessões e prontuários
+        sessions: sessões por paciente (passadas realizadas, futuras agendadas)
+        records: prontuários por paciente
+        documents: documentos por paciente, com `ocr_chars` caracteres de OCR
+        items: itens de estoque da clínica, com `movements` movimentações cada
+        suffix: 8 dígitos que identificam a rede (CNPJ, usernames, CPFs);
+            padrão: derivado do relógio
+
+    Os dados são os mesmos para o mesmo `seed`. Sessões, prontuários,
+    documentos e movimentações são gravados em lotes de `batch_size`.
+
+    Retorna os usuários por papel: gestor_geral, gestor_filial, atendente, fisioterapeuta.
+    """
+    from documentos.models import Document
+    from documentos.search import DOCUMENT_INDEX
+
+    rng = random.Random(seed)
+    suffix = suffix or f'{time.time_ns()}'[-8:]
+    today = date.today()
+    history_days = max(int(365 * years), 1)
+
+    clinica = Clinica.objects.create(
+        nome=f'Benchmark {suffix}', cnpj=f'97.{suffix[:3]}.{suffix[3:6]}/0001-{suffix[6:]}',
+        razao_social='Benchmark LTDA', email='benchmark@example.com', telefone='(00) 0000-0000',
+        endereco='Rua Benchmark', numero='1', bairro='Centro', cidade='Recife', estado='PE', cep='50000-000'
+    )
+    filial_objs = Filial.objects.bulk_create([
+        Filial(
+            clinica=clinica, nome=f'Filial {numero + 1}', endereco='Rua Benchmark', numero=str(numero + 1),
+            bairro='Centro', cidade='Recife', estado='PE', cep='50000-000', telefone='(00) 0000-0000'
+        )
+        for numero in range(filiais)
+    ])
+
+    def user(username, user_type, filial=None):
+        return User(
+            username=f'bench_{suffix}_{username}', cpf=f'{suffix}{len(staff):06d}',
+            first_name=user_type.title(), last_name=username, clinica=clinica, filial=filial, user_type=user_type
+        )
+
+    staff = []
+    staff.append(user('geral', 'GESTOR_GERAL'))
+    for f, filial in enumerate(filial_objs):
+        staff.append(user(f'g{f}', 'GESTOR_FILIAL', filial))
+        staff.append(user(f'a{f}', 'ATENDENTE', filial))
+        for m in range(fisioterapeutas):
+            staff.append(user(f'f{f}_{m}', 'FISIOTERAPEUTA', filial))
+    User.objects.bulk_create(staff)
+    fisios = [member for member in staff if member.user_type == 'FISIOTERAPEUTA']
+
+    patient_objs = _bulk_create(Patient, (
+        Patient(
+            clinica=clinica, filial=fisio.filial, fisioterapeuta=fisio,
+            full_name=f'Paciente {f}-{p}', cpf=f'{suffix[-5:]}{f:04d}{p:04d}'[:14],
+            birth_date=date(1950 + rng.randrange(55), rng.randint(1, 12), rng.randint(1, 28)),
+            phone='(81) 90000-0000', chief_complaint=rng.choice(['Dor lombar', 'Dor cervical', 'Pós-operatório'])
+        )
+        for f, fisio in enumerate(fisios) for p in range(patients)
+    ), batch_size)
+    PATIENT_INDEX.add_many(patient_objs)
+
+    plans = _bulk_create(TreatmentPlan, (
+        TreatmentPlan(
+            patient=patient, fisioterapeuta=patient.fisioterapeuta, clinica=clinica, title='Plano',
+            objectives='Reduzir dor', total_sessions=sessions,
+            start_date=today - timedelta(days=rng.randrange(history_days))
+        )
+        for patient in patient_objs
+    ), batch_size)
+
+    def session_objs():
+        for patient, plan in zip(patient_objs, plans):
+            for number in range(sessions):
+                day = today + timedelta(days=rng.randint(-history_days, 30))
+                yield PhysioSession(
+                    patient=patient, fisioterapeuta=patient.fisioterapeuta, clinica=clinica, treatment_plan=plan,
+                    scheduled_date=day, scheduled_time=clock(rng.randint(7, 18), 0),
+                    status='REALIZADA' if day < today else 'AGENDADA', session_number=number + 1,
+                )
+    _stream_create(PhysioSession, session_objs(), batch_size)
+
+    now = timezone.now()
+    _stream_create(MedicalRecord, (
+        MedicalRecord(
+            patient=patient, record_type=rng.choice(RECORD_TYPES), title='Registro',
+            chief_complaint=patient.chief_complaint, created_by=patient.fisioterapeuta,
+            record_date=now - timedelta(days=rng.randrange(history_days)),
+        )
+        for patient in patient_objs for _ in range(records)
+    ), batch_size, MEDICAL_RECORD_INDEX)
+
+    texts = ocr_texts(rng, ocr_chars)
+    _stream_create(Document, (
+        Document(
+            patient=patient, title=f'Exame {number + 1}', document_type='PDF', file_size=250000,
+            file=f'documents/patient_{patient.id}/exame_{number + 1}.pdf',
+            ocr_text=rng.choice(texts) if texts else None, ocr_processed=bool(texts),
+            ocr_confidence=90.0 if texts else None,
+        )
+        for patient in patient_objs for number in range(documents)
+    ), batch_size, DOCUMENT_INDEX)
+
+    # Uma transferência a cada dez pacientes
+    _bulk_create(PatientTransferHistory, (
+        PatientTransferHistory(
+            patient=patient, from_fisioterapeuta=patient.fisioterapeuta, from_filial=patient.filial,
+            to_fisioterapeuta=patient.fisioterapeuta, to_filial=patient.filial, reason='Benchmark'
+        )
+        for patient in patient_objs[::10]
+    ), batch_size)
+
+    if items:
+        seed_inventory(clinica, staff[0], items, movements, rng, batch_size)
+
+    # bulk_create não dispara signals
+    metrics.rebuild_metrics(clinica=clinica)
+    TreatmentPlan.refresh_completed_sessions([plan.pk for plan in plans])
+
+    first_filial = filial_objs[0]
+    return {
+        'gestor_geral': staff[0],
+        'gestor_filial': next(m for m in staff if m.user_type == 'GESTOR_FILIAL' and m.filial == first_filial),
+        'atendente': next(m for m in staff if m.user_type == 'ATENDENTE' and m.filial == first_filial),
+        'fisioterapeuta': fisios[0],
+    }
+
+
+def seed_inventory(clinica, user, items, movements, rng, batch_size=2000):
+    """
+    Itens de estoque com um livro de movimentações coerente: quantity_before
+    e quantity_after encadeados e o saldo final gravado no item (o que
+    InventoryTransaction.save faria, uma movimentação por vez)
+    """
+    from estoque.models import InventoryCategory, InventoryItem, InventoryTransaction
+
+    category = InventoryCategory.objects.create(clinica=clinica, name='Materiais de consumo')
+    ledgers, item_objs = [], []
+    for number in range(items):
+        name, item_type, unit = INVENTORY_ITEMS[number % len(INVENTORY_ITEMS)]
+        balance, ledger = Decimal(0), []
+        for position in range(movements):
+            if position == 0 or balance < 5:
+                kind, quantity = 'ENTRADA', Decimal(rng.randint(20, 100))
+            else:
+                kind = rng.choices(['SAIDA', 'ENTRADA', 'AJUSTE_MENOS', 'PERDA'], weights=[80, 12, 5, 3])[0]
+                quantity = Decimal(rng.randint(1, int(min(balance, 10)))) if kind != 'ENTRADA' else Decimal(rng.randint(20, 100))
+            after = balance + quantity if kind == 'ENTRADA' else balance - quantity
+            ledger.append((kind, quantity, balance, after))
+            balance = after
+        ledgers.append(ledger)
+        item_objs.append(InventoryItem(
+            clinica=clinica, category=category, name=f'{name} {number + 1}', sku=f'SKU-{number + 1:05d}',
+            item_type=item_type, unit=unit, quantity=balance, min_quantity=Decimal(10),
+            unit_cost=Decimal(rng.randint(100, 5000)) / 100, created_by=user,
+        ))
+    item_objs = _bulk_create(InventoryItem, item_objs, batch_size)
+
+    _stream_create(InventoryTransaction, (
+        InventoryTransaction(
+            item=item, transaction_type=kind, quantity=quantity,
+            quantity_before=before, quantity_after=after, created_by=user,
+        )
+        for item, ledger in zip(item_objs, ledgers) for kind, quantity, before, after in ledger
+    ), batch_size)
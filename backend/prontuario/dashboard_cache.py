@@ -0,0 +1,166 @@
+"""
+Cache das respostas dos dashboards
+
+As respostas são guardadas no cache do Django (settings.CACHES) com chave
+(endpoint, clínica, filial, perfil, usuário, versão). Cada clínica tem um
+número de versão no próprio cache; gravações e exclusões nos modelos que
+alimentam os dashboards incrementam a versão (ver prontuario/signals.py),
+o que invalida de uma vez todas as respostas daquela clínica.
+
+Cada resposta leva um ETag. Se o navegador reenviar o mesmo valor em
+If-None-Match, a resposta é 304 sem corpo e sem nenhuma consulta SQL.
+"""
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from authentication.current_user import get_current_user, requested_user_id
+
+
+CACHE_PREFIX = 'dashboard'
+
+# Modelos cujas gravações invalidam os dashboards e o caminho até a clínica
+DASHBOARD_SOURCES = {
+    'prontuario.Patient': 'clinica',
+    'prontuario.MedicalRecord': 'patient__clinica',
+    'prontuario.PatientTransferHistory': 'patient__clinica',
+    'prontuario.TransferRequest': 'patient__clinica',
+    'prontuario.TreatmentPlan': 'clinica',
+    'prontuario.PhysioSession': 'clinica',
+    'prontuario.Discharge': 'clinica',
+    'documentos.Document': 'patient__clinica',
+}
+
+# Escopo do dashboard geral, que não é filtrado por clínica
+ESCOPO_REDE = 'rede'
+
+# Escopo incluído em todas as chaves; invalida tudo quando a clínica não é conhecida
+ESCOPO_GLOBAL = 'global'
+
+
+def _timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+
+
+def _version_key(escopo):
+    return f'{CACHE_PREFIX}:versao:{escopo}'
+
+
+def _versions(escopo):
+    """Versões do escopo e global em uma leitura do cache"""
+    keys = [_version_key(escopo), _version_key(ESCOPO_GLOBAL)]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            # Valor inicial baseado no relógio: se a versão for despejada do
+            # cache, a nova não coincide com a de respostas ainda guardadas
+            cache.add(key, int(time.time() * 1000), timeout=None)
+            found[key] = cache.get(key)
+        versions.append(found[key])
+    return versions
+
+
+def _bump(escopo):
+    key = _version_key(escopo)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+
+
+def invalidate_dashboards(clinica_id=None):
+    """
+    Invalida os dashboards de uma clínica (e o dashboard geral).
+    Sem clínica, invalida os dashboards de todas as clínicas.
+    """
+    escopos = [clinica_id, ESCOPO_REDE] if clinica_id is not None else [ESCOPO_GLOBAL]
+
+    def bump_all():
+        for escopo in escopos:
+            _bump(escopo)
+
+    # Invalida já (leituras dentro da mesma transação) e de novo após o commit,
+    # para descartar respostas montadas por outra requisição antes do commit
+    bump_all()
+    transaction.on_commit(bump_all)
+
+
+def _identity(request):
+    """
+    Identifica quem pede o dashboard (sessão, header X-User-Id ou parâmetro
+    user_id) pelo resolvedor do usuário atual, que a view reaproveita.
+    Retorna (user_id, clinica_id, filial_id, user_type).
+    """
+    user = get_current_user(request)
+    if user is None:
+        # Sem usuário (a view usa o usuário padrão) ou id inválido
+        return requested_user_id(request) or 'padrao', None, None, None
+    return user.id, user.clinica_id, user.filial_id, user.user_type
+
+
+def _etag(data):
+    payload = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return '"%s"' % hashlib.md5(payload.encode()).hexdigest()
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get('If-None-Match', '')
+    return etag in [value.strip() for value in header.split(',')] or header.strip() == '*'
+
+
+def _respond(request, entry, hit):
+    if _etag_matches(request, entry['etag']):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(entry['data'])
+    response['ETag'] = entry['etag']
+    response['Cache-Control'] = 'private, no-cache'
+    response['X-Dashboard-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+def cached_dashboard(endpoint, rede=False):
+    """
+    Decorator para as function views dos dashboards (abaixo de @api_view).
+
+    Args:
+        endpoint: nome curto do dashboard, usado na chave
+        rede: True para dashboards não filtrados por clínica, invalidados
+              por qualquer gravação
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _timeout():
+                return view(request, *args, **kwargs)
+
+            user_id, clinica_id, filial_id, user_type = _identity(request)
+            escopo = ESCOPO_REDE if rede or clinica_id is None else clinica_id
+            versao, versao_global = _versions(escopo)
+            key = (
+                f'{CACHE_PREFIX}:{endpoint}:c{clinica_id}:f{filial_id}:{user_type}:u{user_id}'
+                f':v{versao}.{versao_global}'
+            )
+
+            entry = cache.get(key)
+            if entry is not None:
+                return _respond(request, entry, hit=True)
+
+            response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+            entry = {'data': response.data, 'etag': _etag(response.data)}
+            cache.set(key, entry, _timeout())
+            return _respond(request, entry, hit=False)
+        return wrapper
+    return decorator
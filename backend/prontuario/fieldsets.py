@@ -0,0 +1,132 @@
+"""
+Campos sob demanda (sparse fieldsets) para as APIs de leitura
+
+Os serializers com SparseFieldsetMixin aceitam, em requisições GET:
+
+    ?fields=id,full_name,phone     apenas esses campos
+    ?omit=transfer_history         todos, menos esses
+    ?expand=patient                troca o id do relacionamento pelo objeto resumido
+
+e as ViewSets com SparseFieldsetViewMixin ajustam o SQL ao que será
+serializado: colunas do modelo que nenhum campo restante usa ficam fora do
+SELECT (.defer()), ex.: ocr_text, medical_history, previous_data, e os
+relacionamentos expandidos entram no select_related.
+
+Para saber as colunas de cada campo, o mixin usa o `source` do campo; campos
+calculados (SerializerMethodField, properties) declaram as colunas em
+`field_dependencies`. Se algum campo restante não puder ser resolvido, o
+queryset não é reduzido (nunca troca uma coluna por uma consulta por linha).
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+EXPAND_PARAM = 'expand'
+
+
+def _param_set(request, name):
+    raw = request.query_params.get(name, '')
+    return {value.strip() for value in raw.split(',') if value.strip()}
+
+
+class SparseFieldsetMixin:
+    """
+    Mixin de ModelSerializer para ?fields=, ?omit= e ?expand=
+
+    Atributos:
+        expandable_fields: campo -> (caminho do serializer, caminhos de select_related)
+        field_dependencies: campo calculado -> colunas do modelo que ele lê
+    """
+    expandable_fields = {}
+    field_dependencies = {}
+
+    def _sparse_params(self):
+        """(fields, omit, expand) da requisição; só vale no nível raiz e em leituras"""
+        request = self.context.get('request')
+        root = self.root
+        is_root = root is self or (isinstance(root, serializers.ListSerializer) and self.parent is root)
+        if request is None or not is_root or request.method not in SAFE_METHODS:
+            return None, set(), set()
+        return _param_set(request, FIELDS_PARAM) or None, _param_set(request, OMIT_PARAM), _param_set(request, EXPAND_PARAM)
+
+    def expanded_fields(self):
+        return sorted(self._sparse_params()[2] & set(self.expandable_fields))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        only, omit, _ = self._sparse_params()
+
+        for name in self.expanded_fields():
+            serializer_path, _ = self.expandable_fields[name]
+            fields[name] = import_string(serializer_path)(read_only=True)
+
+        return {
+            name: field for name, field in fields.items()
+            if (only is None or name in only) and name not in omit
+        }
+
+    def _columns_of(self, name, field):
+        """Colunas do modelo lidas pelo campo, ou None se desconhecido"""
+        if name in self.field_dependencies:
+            return set(self.field_dependencies[name])
+        if field.source == '*':
+            return None
+
+        attr = field.source.split('.')[0]
+        # get_<campo>_display
+        if attr.startswith('get_') and attr.endswith('_display'):
+            attr = attr[len('get_'):-len('_display')]
+        try:
+            model_field = self.Meta.model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        # Relacionamentos reversos e M2M não têm coluna nesta tabela
+        return {model_field.name} if model_field.concrete and not model_field.many_to_many else set()
+
+    def required_columns(self):
+        """Nomes dos campos do modelo usados pelos campos selecionados, ou None"""
+        columns = set()
+        for name, field in self.fields.items():
+            field_columns = self._columns_of(name, field)
+            if field_columns is None:
+                return None
+            columns |= field_columns
+        return columns
+
+
+def narrow_queryset(queryset, serializer):
+    """Aplica ao queryset o select_related das expansões e o defer das colunas não usadas"""
+    if not isinstance(serializer, SparseFieldsetMixin):
+        return queryset
+
+    for name in serializer.expanded_fields():
+        _, select_related = serializer.expandable_fields[name]
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+
+    columns = serializer.required_columns()
+    if columns is None:
+        return queryset
+
+    # Relacionamentos carregados por select_related não podem ser adiados
+    traversed = queryset.query.select_related
+    traversed = set(traversed) if isinstance(traversed, dict) else set()
+    deferred = [
+        field.name for field in queryset.model._meta.concrete_fields
+        if not field.primary_key and field.name not in columns and field.name not in traversed
+    ]
+    return queryset.defer(*deferred) if deferred else queryset
+
+
+class SparseFieldsetViewMixin:
+    """Mixin de ViewSet: reduz o SELECT conforme ?fields=/?omit=/?expand= (só em GET)"""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS or queryset.query.is_sliced:
+            return queryset
+        return narrow_queryset(queryset, self.get_serializer())
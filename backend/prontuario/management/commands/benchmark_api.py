@@ -0,0 +1,98 @@
+"""
+Benchmark dos dashboards e das listagens com baseline de consultas
+
+Cria uma rede sintética (--filiais x --fisioterapeutas x --patients, com
+--sessions sessões e --records prontuários por paciente ao longo de --years
+anos), chama os quatro dashboards e as listagens principais (veja
+prontuario/benchmarks.py) e registra, por endpoint, o número de consultas
+SQL, a latência p50/p95 e o tamanho da resposta.
+
+Com --save o relatório vira a baseline; com --check o comando falha
+(código de saída 1) se algum endpoint fizer mais consultas que a baseline,
+não responder 200 ou, com --latency-tolerance, ficar mais lento que o
+permitido. A latência depende da máquina, por isso só é conferida quando
+pedido.
+
+Os dados são criados dentro de uma transação desfeita ao final (use
+--keep para mantê-los).
+
+Uso:
+    python manage.py benchmark_api --save benchmarks/api.json
+    python manage.py benchmark_api --check benchmarks/api.json
+    python manage.py benchmark_api --filiais 5 --patients 100 --years 3 --json
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from prontuario.benchmarks import compare, run_suite, seed_tenant
+
+
+SEED_OPTIONS = ['filiais', 'fisioterapeutas', 'patients', 'years', 'sessions', 'records', 'seed']
+
+
+class Command(BaseCommand):
+    help = 'Mede consultas, latência e tamanho das respostas dos dashboards e listagens'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filiais', type=int, default=3)
+        parser.add_argument('--fisioterapeutas', type=int, default=4, help='Fisioterapeutas por filial')
+        parser.add_argument('--patients', type=int, default=20, help='Pacientes por fisioterapeuta')
+        parser.add_argument('--years', type=int, default=1, help='Anos de histórico')
+        parser.add_argument('--sessions', type=int, default=24, help='Sessões por paciente')
+        parser.add_argument('--records', type=int, default=3, help='Prontuários por paciente')
+        parser.add_argument('--runs', type=int, default=10, help='Requisições por endpoint')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help='Mantém os dados criados')
+        parser.add_argument('--json', action='store_true', help='Imprime o relatório em JSON')
+        parser.add_argument('--save', metavar='PATH', help='Grava o relatório como baseline')
+        parser.add_argument('--check', metavar='PATH', help='Compara com a baseline e falha em regressões')
+        parser.add_argument(
+            '--latency-tolerance', type=float, default=None,
+            help='Confere também o p95 (ex.: 0.5 = até 50%% acima da baseline)'
+        )
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1 or min(options['filiais'], options['fisioterapeutas'], options['patients']) < 1:
+            raise CommandError('--runs, --filiais, --fisioterapeutas e --patients devem ser maiores que zero')
+
+        baseline = None
+        if options['check']:
+            try:
+                with open(options['check'], encoding='utf-8') as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Não foi possível ler a baseline: {exc}')
+
+        config = {name: options[name] for name in SEED_OPTIONS}
+        with transaction.atomic():
+            users = seed_tenant(**config)
+            report = {'config': {**config, 'runs': options['runs']}, 'endpoints': run_suite(users, options['runs'])}
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as baseline_file:
+                json.dump(report, baseline_file, indent=2)
+                baseline_file.write('\n')
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(f"{'endpoint':<28}{'status':>7}{'consultas':>11}{'p50 ms':>10}{'p95 ms':>10}{'bytes':>10}")
+            for name, result in report['endpoints'].items():
+                self.stdout.write(
+                    f"{name:<28}{result['status']:>7}{result['queries']:>11}"
+                    f"{result['p50_ms']:>10}{result['p95_ms']:>10}{result['bytes']:>10}"
+                )
+
+        if baseline is not None:
+            problems = []
+            baseline_config = {name: baseline.get('config', {}).get(name) for name in SEED_OPTIONS}
+            if baseline_config != config:
+                problems.append(f'Configuração diferente da baseline: {baseline_config}')
+            problems += compare(report, baseline, options['latency_tolerance'])
+            if problems:
+                raise CommandError('Regressões em relação à baseline:\n' + '\n'.join(problems))
+            self.stdout.write(self.style.SUCCESS('Sem regressões em relação à baseline'))
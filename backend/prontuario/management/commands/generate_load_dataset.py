@@ -0,0 +1,124 @@
+"""
+Gera uma massa de dados de carga, multi-clínica, para reproduzir localmente
+problemas de desempenho com volume de produção
+
+Cada clínica é criada por prontuario.benchmarks.seed_tenant (bulk_create em
+lotes de --batch-size, com índices de busca, rollup de métricas e contador
+dos planos atualizados), com filiais, gestores, atendentes,
+fisioterapeutas, pacientes, planos, sessões, prontuários, documentos com
+texto de OCR e estoque com livro de movimentações.
+
+Os dados são determinísticos: a clínica `n` usa o RNG `--seed` + n e os
+identificadores (CNPJ, usernames, CPFs) são derivados de --seed e de `n`;
+gerar de novo com o mesmo --seed falha (use outro --seed ou outro banco).
+
+Com --workers > 1 as clínicas são distribuídas entre processos (spawn: cada
+worker inicia o Django e abre a própria conexão), uma transação por
+clínica. No SQLite as escritas são serializadas, então o comando usa um
+único processo.
+
+O padrão (100 clínicas x 2 filiais x 5 fisioterapeutas x 20 pacientes)
+gera 20 mil pacientes, 1 milhão de sessões, 200 mil documentos e 300 mil
+movimentações de estoque.
+
+Uso:
+    python manage.py generate_load_dataset
+    python manage.py generate_load_dataset --clinics 5 --sessions 20 --documents 2
+    python manage.py generate_load_dataset --workers 8 --seed 7     # PostgreSQL
+"""
+import multiprocessing
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from authentication.models import Clinica
+from prontuario.benchmarks import seed_tenant
+from prontuario.workers import init_django_worker
+
+
+TENANT_OPTIONS = [
+    'filiais', 'fisioterapeutas', 'patients', 'years', 'sessions', 'records',
+    'documents', 'ocr_chars', 'items', 'movements', 'batch_size',
+]
+
+
+def _suffix(seed, number):
+    return f'{seed % 1000:03d}{number:05d}'
+
+
+def _cnpj(suffix):
+    return f'97.{suffix[:3]}.{suffix[3:6]}/0001-{suffix[6:]}'
+
+
+def generate_clinic(args):
+    """Cria a clínica `number` (executada no processo principal ou em um worker)"""
+    number, seed, options = args
+    start = time.perf_counter()
+    with transaction.atomic():
+        seed_tenant(seed=seed + number, suffix=_suffix(seed, number), **options)
+    return number, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = 'Gera dados sintéticos multi-clínica em volume de produção'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clinics', type=int, default=100)
+        parser.add_argument('--filiais', type=int, default=2, help='Filiais por clínica')
+        parser.add_argument('--fisioterapeutas', type=int, default=5, help='Fisioterapeutas por filial')
+        parser.add_argument('--patients', type=int, default=20, help='Pacientes por fisioterapeuta')
+        parser.add_argument('--years', type=int, default=2, help='Anos de histórico')
+        parser.add_argument('--sessions', type=int, default=50, help='Sessões por paciente')
+        parser.add_argument('--records', type=int, default=3, help='Prontuários por paciente')
+        parser.add_argument('--documents', type=int, default=10, help='Documentos por paciente')
+        parser.add_argument('--ocr-chars', type=int, default=1500, help='Caracteres de OCR por documento')
+        parser.add_argument('--items', type=int, default=30, help='Itens de estoque por clínica')
+        parser.add_argument('--movements', type=int, default=100, help='Movimentações por item')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Linhas por bulk_create')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--workers', type=int, default=1, help='Processos (ignorado no SQLite)')
+
+    def handle(self, *args, **options):
+        if min(options['clinics'], options['filiais'], options['fisioterapeutas'], options['batch_size']) < 1:
+            raise CommandError('--clinics, --filiais, --fisioterapeutas e --batch-size devem ser maiores que zero')
+        if options['clinics'] > 99999:
+            raise CommandError('--clinics deve ser no máximo 99999')
+
+        seed = options['seed']
+        existing = Clinica.objects.filter(
+            cnpj__in=[_cnpj(_suffix(seed, number)) for number in range(options['clinics'])]
+        ).count()
+        if existing:
+            raise CommandError(f'{existing} clínicas deste --seed já existem; use outro --seed')
+
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite serializa as escritas: usando um único processo'))
+            workers = 1
+
+        tenant_options = {name: options[name] for name in TENANT_OPTIONS}
+        tasks = [(number, seed, tenant_options) for number in range(options['clinics'])]
+        start = time.perf_counter()
+        if workers > 1:
+            connections.close_all()
+            context = multiprocessing.get_context('spawn')
+            settings_module = os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings')
+            with context.Pool(workers, initializer=init_django_worker, initargs=(settings_module,)) as pool:
+                results = pool.imap_unordered(generate_clinic, tasks)
+                self._report(results, options['clinics'])
+        else:
+            self._report(map(generate_clinic, tasks), options['clinics'])
+
+        patients = options['clinics'] * options['filiais'] * options['fisioterapeutas'] * options['patients']
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['clinics']} clínicas, {patients} pacientes, {patients * options['sessions']} sessões, "
+            f"{patients * options['documents']} documentos e "
+            f"{options['clinics'] * options['items'] * options['movements']} movimentações de estoque "
+            f"em {time.perf_counter() - start:.1f}s"
+        ))
+
+    def _report(self, results, total):
+        for done, (number, elapsed) in enumerate(results, start=1):
+            self.stdout.write(f'[{done}/{total}] clínica {number + 1} em {elapsed:.1f}s')
@@ -0,0 +1,70 @@
+"""
+Importa pacientes em massa de um arquivo CSV ou XLSX para uma filial
+
+Colunas: os campos do paciente (full_name, cpf, birth_date, phone, ...) ou
+os nomes em português (nome, data_nascimento, telefone, ...), e opcionalmente
+`fisioterapeuta` (id, username ou CPF). Veja prontuario/patient_import.py.
+
+Uso:
+    python manage.py import_patients pacientes.csv --filial 1
+    python manage.py import_patients pacientes.xlsx --filial 1 --dry-run
+    python manage.py import_patients pacientes.csv --filial 1 --chunk-size 2000 --json
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.models import Filial
+from prontuario.patient_import import DEFAULT_CHUNK_SIZE, PatientImportError, import_patients, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Importa pacientes de um arquivo CSV/XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Arquivo .csv ou .xlsx')
+        parser.add_argument('--filial', type=int, required=True, help='ID da filial dos pacientes')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Linhas por lote/transação')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas valida, sem gravar')
+        parser.add_argument('--json', action='store_true', help='Relatório completo em JSON')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size deve ser maior que zero')
+        filial = Filial.objects.filter(id=options['filial']).first()
+        if filial is None:
+            raise CommandError(f"Filial {options['filial']} não encontrada")
+
+        start = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as binary_file:
+                result = import_patients(
+                    read_rows(binary_file, options['path']), filial,
+                    chunk_size=options['chunk_size'], dry_run=options['dry_run']
+                )
+        except OSError as exc:
+            raise CommandError(f'Não foi possível abrir o arquivo: {exc}')
+        except PatientImportError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - start
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False, default=str))
+        else:
+            self._summary(result, options['dry_run'], elapsed)
+        if result['error']:
+            raise CommandError(f"{result['error']} ({result['created']} pacientes gravados antes do erro)")
+
+    def _summary(self, result, dry_run, elapsed):
+        for error in result['errors'][:20]:
+            self.stdout.write(f"Linha {error['line']} (CPF {error['cpf'] or '-'}): {json.dumps(error['errors'], ensure_ascii=False)}")
+        if len(result['errors']) > 20:
+            self.stdout.write(f"... e mais {len(result['errors']) - 20} linhas com erro (use --json)")
+
+        verbo = 'válidos' if dry_run else 'importados'
+        valid = result['total'] - len(result['errors'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{valid if dry_run else result['created']} de {result['total']} pacientes {verbo} "
+            f"em {elapsed:.1f}s ({len(result['errors'])} com erro)"
+        ))
@@ -0,0 +1,43 @@
+"""
+Reconstrói o rollup de métricas diárias (DailyMetric) dos dashboards
+
+Uso:
+    python manage.py rebuild_metrics
+    python manage.py rebuild_metrics --clinica 1
+    python manage.py rebuild_metrics --since 2025-01-01
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.models import Clinica
+from prontuario.metrics import rebuild_metrics
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói as métricas diárias dos dashboards a partir dos dados brutos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clinica', type=int, help='ID da clínica (padrão: todas)')
+        parser.add_argument('--since', help='Data inicial no formato AAAA-MM-DD (padrão: todo o histórico)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tamanho dos lotes de inserção')
+
+    def handle(self, *args, **options):
+        clinica = None
+        if options['clinica']:
+            try:
+                clinica = Clinica.objects.get(id=options['clinica'])
+            except Clinica.DoesNotExist:
+                raise CommandError(f"Clínica {options['clinica']} não encontrada")
+
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('Data inválida, use o formato AAAA-MM-DD')
+
+        total = rebuild_metrics(clinica=clinica, since=since, batch_size=options['batch_size'])
+
+        escopo = clinica.nome if clinica else 'todas as clínicas'
+        self.stdout.write(self.style.SUCCESS(f'{total} métricas diárias reconstruídas ({escopo})'))
@@ -0,0 +1,32 @@
+"""
+Reconstrói os índices de busca textual (pacientes, prontuários e documentos)
+
+Necessário após cargas em massa (bulk_create, queryset.update), que não
+disparam os signals que mantêm os índices.
+
+Uso:
+    python manage.py rebuild_search_index
+    python manage.py rebuild_search_index --index documents
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from prontuario.search import INDEXES
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói os índices de busca textual (FTS5 no SQLite, GIN no PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--index', action='append', help='Nome do índice (padrão: todos); pode repetir')
+
+    def handle(self, *args, **options):
+        names = options['index'] or list(INDEXES)
+        unknown = set(names) - set(INDEXES)
+        if unknown:
+            raise CommandError(f"Índice desconhecido: {', '.join(sorted(unknown))} (disponíveis: {', '.join(INDEXES)})")
+
+        for name in names:
+            with transaction.atomic():
+                total = INDEXES[name].rebuild()
+            self.stdout.write(self.style.SUCCESS(f'{name}: {total} registros indexados ({connection.vendor})'))
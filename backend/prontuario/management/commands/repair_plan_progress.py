@@ -0,0 +1,50 @@
+"""
+Confere e corrige o contador de sessões realizadas dos planos de tratamento
+(TreatmentPlan.completed_sessions)
+
+O contador é mantido pelos signals de PhysioSession; cargas em massa
+(bulk_create, queryset.update) não disparam signals e deixam o contador
+desatualizado.
+
+Uso:
+    python manage.py repair_plan_progress
+    python manage.py repair_plan_progress --clinica 1
+    python manage.py repair_plan_progress --check
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from authentication.models import Clinica
+from prontuario.models import TreatmentPlan
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o contador de sessões realizadas dos planos de tratamento'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clinica', type=int, help='ID da clínica (padrão: todas)')
+        parser.add_argument('--check', action='store_true', help='Apenas lista os planos divergentes, sem corrigir')
+
+    def handle(self, *args, **options):
+        plans = TreatmentPlan.objects.all()
+        if options['clinica']:
+            if not Clinica.objects.filter(id=options['clinica']).exists():
+                raise CommandError(f"Clínica {options['clinica']} não encontrada")
+            plans = plans.filter(clinica_id=options['clinica'])
+
+        divergentes = list(
+            plans.annotate(realizadas=Count('sessions', filter=Q(sessions__status='REALIZADA')))
+            .exclude(completed_sessions=F('realizadas'))
+            .values_list('id', 'completed_sessions', 'realizadas')
+        )
+        for plan_id, contador, realizadas in divergentes:
+            self.stdout.write(f'Plano {plan_id}: contador {contador}, sessões realizadas {realizadas}')
+
+        if options['check']:
+            self.stdout.write(f'{len(divergentes)} planos divergentes')
+            return
+
+        with transaction.atomic():
+            TreatmentPlan.refresh_completed_sessions([plan_id for plan_id, _, _ in divergentes])
+        self.stdout.write(self.style.SUCCESS(f'{len(divergentes)} planos corrigidos'))
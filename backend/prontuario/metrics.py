@@ -0,0 +1,362 @@
+"""
+Métricas consolidadas dos dashboards (rollup diário)
+
+Cada métrica do modelo DailyMetric é definida a partir de um modelo "bruto"
+(Patient, MedicalRecord, PhysioSession, Document, PatientTransferHistory):
+qual campo de data define o dia e de onde vêm clínica, filial e fisioterapeuta.
+
+- metric_keys() / refresh_buckets(): recalculam os buckets afetados por um
+  registro (usados pelos signals em prontuario/signals.py)
+- rebuild_metrics(): reconstrói tudo a partir dos dados brutos
+  (usado pelo comando `python manage.py rebuild_metrics`)
+- metric_queryset(), daily_totals(): leitura do rollup pelos dashboards
+- monthly_series(): séries mensais dos gráficos de tendência (rollup ou dados brutos)
+"""
+from collections import defaultdict
+from datetime import date, datetime, time
+
+from django.apps import apps
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+
+# Definição das métricas: modelo de origem, campo de data e caminhos das dimensões.
+# 'patient' indica o caminho até o paciente quando filial/fisioterapeuta
+# são herdados dele (transferências do paciente movem esses registros).
+METRIC_SOURCES = {
+    'PACIENTES_NOVOS': {
+        'model': 'prontuario.Patient',
+        'date_field': 'created_at',
+        'clinica': 'clinica',
+        'filial': 'filial',
+        'fisioterapeuta': 'fisioterapeuta',
+        'filters': {'is_active': True},
+        'patient': None,
+    },
+    'PRONTUARIOS': {
+        'model': 'prontuario.MedicalRecord',
+        'date_field': 'record_date',
+        'clinica': 'patient__clinica',
+        'filial': 'patient__filial',
+        'fisioterapeuta': 'patient__fisioterapeuta',
+        'filters': {},
+        'patient': 'patient',
+    },
+    'CONSULTAS': {
+        'model': 'prontuario.MedicalRecord',
+        'date_field': 'record_date',
+        'clinica': 'patient__clinica',
+        'filial': 'patient__filial',
+        'fisioterapeuta': 'patient__fisioterapeuta',
+        'filters': {'record_type': 'CONSULTA'},
+        'patient': 'patient',
+    },
+    'SESSOES_REALIZADAS': {
+        'model': 'prontuario.PhysioSession',
+        'date_field': 'scheduled_date',
+        'clinica': 'clinica',
+        'filial': 'patient__filial',
+        'fisioterapeuta': 'fisioterapeuta',
+        'filters': {'status': 'REALIZADA'},
+        'patient': 'patient',
+    },
+    'DOCUMENTOS': {
+        'model': 'documentos.Document',
+        'date_field': 'created_at',
+        'clinica': 'patient__clinica',
+        'filial': 'patient__filial',
+        'fisioterapeuta': 'patient__fisioterapeuta',
+        'filters': {},
+        'patient': 'patient',
+    },
+    'TRANSFERENCIAS': {
+        'model': 'prontuario.PatientTransferHistory',
+        'date_field': 'transfer_date',
+        'clinica': 'patient__clinica',
+        'filial': 'to_filial',
+        'fisioterapeuta': 'to_fisioterapeuta',
+        'filters': {},
+        'patient': None,
+    },
+}
+
+
+def _source_model(source):
+    return apps.get_model(source['model'])
+
+
+def _is_datetime(source):
+    field = _source_model(source)._meta.get_field(source['date_field'])
+    return isinstance(field, models.DateTimeField)
+
+
+def tracked_models():
+    """Modelos brutos que alimentam o rollup"""
+    return {_source_model(source) for source in METRIC_SOURCES.values()}
+
+
+def _resolve_id(instance, path):
+    """Segue um caminho 'patient__filial' e retorna o id do último relacionamento"""
+    *parents, last = path.split('__')
+    obj = instance
+    for name in parents:
+        obj = getattr(obj, name, None)
+        if obj is None:
+            return None
+    return getattr(obj, f'{last}_id', None)
+
+
+def _to_day(value):
+    if value is None:
+        return None
+    if hasattr(value, 'tzinfo') and hasattr(value, 'date'):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date()
+    return value
+
+
+def metric_keys(instance):
+    """
+    Retorna os buckets (metric, clinica_id, filial_id, fisioterapeuta_id, day)
+    aos quais o registro pode contribuir, independente dos filtros da métrica.
+    """
+    keys = set()
+    for metric, source in METRIC_SOURCES.items():
+        if not isinstance(instance, _source_model(source)):
+            continue
+        clinica_id = _resolve_id(instance, source['clinica'])
+        day = _to_day(getattr(instance, source['date_field'], None))
+        if clinica_id is None or day is None:
+            continue
+        keys.add((
+            metric,
+            clinica_id,
+            _resolve_id(instance, source['filial']),
+            _resolve_id(instance, source['fisioterapeuta']),
+            day,
+        ))
+    return keys
+
+
+def refresh_bucket(metric, clinica_id, filial_id, fisioterapeuta_id, day):
+    """Recalcula um único bucket a partir dos dados brutos"""
+    from .models import DailyMetric
+
+    source = METRIC_SOURCES[metric]
+    date_lookup = f"{source['date_field']}__date" if _is_datetime(source) else source['date_field']
+
+    value = _source_model(source).objects.filter(
+        **source['filters'],
+        **{
+            source['clinica']: clinica_id,
+            source['filial']: filial_id,
+            source['fisioterapeuta']: fisioterapeuta_id,
+            date_lookup: day,
+        }
+    ).count()
+
+    lookup = {
+        'metric': metric,
+        'clinica_id': clinica_id,
+        'filial_id': filial_id,
+        'fisioterapeuta_id': fisioterapeuta_id,
+        'day': day,
+    }
+    buckets = DailyMetric.objects.filter(**lookup)
+    if not value:
+        buckets.delete()
+        return
+
+    ids = list(buckets.order_by('pk').values_list('pk', flat=True))
+    if not ids:
+        try:
+            with transaction.atomic():
+                DailyMetric.objects.create(**lookup, value=value)
+            return
+        except IntegrityError:
+            # Bucket criado por outra transação entre a leitura e a gravação
+            ids = list(buckets.order_by('pk').values_list('pk', flat=True))
+    DailyMetric.objects.filter(pk=ids[0]).update(value=value, updated_at=timezone.now())
+    # Duplicatas de antes da restrição dailymetric_unique_bucket
+    if len(ids) > 1:
+        DailyMetric.objects.filter(pk__in=ids[1:]).delete()
+
+
+def refresh_buckets(keys):
+    for key in keys:
+        refresh_bucket(*key)
+
+
+def patient_dependent_keys(patient):
+    """
+    Buckets atuais dos registros cujas dimensões vêm (total ou parcialmente)
+    do paciente, lidos das próprias linhas: a sessão, por exemplo, herda a
+    filial do paciente mas tem o próprio fisioterapeuta.
+    Chamado antes e depois da transferência do paciente, para mover os registros dele.
+    """
+    keys = set()
+    for metric, source in METRIC_SOURCES.items():
+        if not source['patient']:
+            continue
+        day_expr = TruncDate(source['date_field']) if _is_datetime(source) else F(source['date_field'])
+        rows = _source_model(source).objects.filter(
+            **{source['patient']: patient}
+        ).annotate(metric_day=day_expr).values_list(
+            source['clinica'], source['filial'], source['fisioterapeuta'], 'metric_day'
+        ).distinct()
+        for clinica_id, filial_id, fisioterapeuta_id, day in rows:
+            keys.add((metric, clinica_id, filial_id, fisioterapeuta_id, day))
+    return keys
+
+
+def rebuild_metrics(clinica=None, since=None, batch_size=1000):
+    """
+    Reconstrói o rollup a partir dos dados brutos com uma consulta agrupada
+    por métrica. Retorna a quantidade de linhas geradas.
+
+    Args:
+        clinica: restringe a reconstrução a uma clínica
+        since: data inicial (inclusive); sem ela todo o histórico é refeito
+        batch_size: tamanho dos lotes do bulk_create
+    """
+    from .models import DailyMetric
+
+    total = 0
+    with transaction.atomic():
+        existing = DailyMetric.objects.all()
+        if clinica is not None:
+            existing = existing.filter(clinica=clinica)
+        if since is not None:
+            existing = existing.filter(day__gte=since)
+        existing.delete()
+
+        for metric, source in METRIC_SOURCES.items():
+            is_datetime = _is_datetime(source)
+            day_expr = TruncDate(source['date_field']) if is_datetime else F(source['date_field'])
+
+            queryset = _source_model(source).objects.filter(**source['filters'])
+            if clinica is not None:
+                queryset = queryset.filter(**{source['clinica']: clinica})
+            if since is not None:
+                date_lookup = f"{source['date_field']}__date__gte" if is_datetime else f"{source['date_field']}__gte"
+                queryset = queryset.filter(**{date_lookup: since})
+
+            rows = queryset.annotate(metric_day=day_expr).values(
+                source['clinica'], source['filial'], source['fisioterapeuta'], 'metric_day'
+            ).annotate(value=Count('pk')).order_by()
+
+            batch = []
+            for row in rows.iterator():
+                batch.append(DailyMetric(
+                    metric=metric,
+                    clinica_id=row[source['clinica']],
+                    filial_id=row[source['filial']],
+                    fisioterapeuta_id=row[source['fisioterapeuta']],
+                    day=row['metric_day'],
+                    value=row['value'],
+                ))
+                if len(batch) >= batch_size:
+                    DailyMetric.objects.bulk_create(batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                DailyMetric.objects.bulk_create(batch)
+                total += len(batch)
+
+    return total
+
+
+def metric_queryset(clinica=None, filial=None, fisioterapeuta=None):
+    """
+    Rollup filtrado pelo escopo do dashboard.
+    Sem clínica, retorna as métricas de todas as clínicas (dashboard geral).
+    """
+    from .models import DailyMetric
+
+    queryset = DailyMetric.objects.all()
+    if clinica is not None:
+        queryset = queryset.filter(clinica=clinica)
+    if filial is not None:
+        queryset = queryset.filter(filial=filial)
+    if fisioterapeuta is not None:
+        queryset = queryset.filter(fisioterapeuta=fisioterapeuta)
+    return queryset
+
+
+def daily_totals(queryset, metric_names, start, end=None):
+    """
+    Soma diária de várias métricas em uma consulta.
+    Retorna {(metric, day): valor}.
+    """
+    queryset = queryset.filter(metric__in=metric_names, day__gte=start)
+    if end is not None:
+        queryset = queryset.filter(day__lte=end)
+    return {
+        (row['metric'], row['day']): row['total']
+        for row in queryset.values('metric', 'day').annotate(total=Sum('value')).order_by()
+    }
+
+
+def month_starts(months, today):
+    """Primeiro dia dos últimos `months` meses do calendário, terminando no mês de `today`"""
+    year, month = today.year, today.month
+    starts = []
+    for _ in range(months):
+        starts.append(date(year, month, 1))
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return starts[::-1]
+
+
+def monthly_series(queryset, date_field, months, tz=None, aggregate=None, by=None):
+    """
+    Série mensal dos últimos `months` meses do calendário em uma única consulta
+    (TruncMonth + agregação), com zeros nos meses sem registros.
+
+    Args:
+        queryset: registros já filtrados pelo escopo do gráfico
+        date_field: campo de data/data-hora que define o mês
+        months: quantidade de meses, incluindo o mês atual
+        tz: fuso usado para definir o mês (padrão: fuso atual do Django)
+        aggregate: expressão agregada (padrão: Count('pk'); use Sum('value') no rollup)
+        by: campo para séries separadas (ex.: 'filial')
+
+    Retorna [(primeiro_dia_do_mês, valor), ...] em ordem cronológica. Com `by`,
+    retorna um dicionário {valor_de_by: série}; valores sem registros
+    recebem uma série zerada.
+    """
+    tz = tz or timezone.get_current_timezone()
+    starts = month_starts(months, timezone.localdate(timezone=tz))
+
+    field = queryset.model._meta.get_field(date_field)
+    if isinstance(field, models.DateTimeField):
+        start = timezone.make_aware(datetime.combine(starts[0], time.min), tz)
+        month_expr = TruncMonth(date_field, tzinfo=tz)
+    else:
+        start = starts[0]
+        month_expr = TruncMonth(date_field)
+
+    fields = [by, 'series_month'] if by else ['series_month']
+    rows = queryset.filter(**{f'{date_field}__gte': start}).annotate(
+        series_month=month_expr
+    ).values(*fields).annotate(series_total=aggregate or Count('pk')).order_by()
+
+    totals = {}
+    for row in rows:
+        month = row['series_month']
+        if isinstance(month, datetime):
+            month = month.date()
+        key = (row[by], month) if by else month
+        totals[key] = totals.get(key, 0) + (row['series_total'] or 0)
+
+    if not by:
+        return [(month, totals.get(month, 0)) for month in starts]
+
+    series = defaultdict(lambda: [(month, 0) for month in starts])
+    for value in {key[0] for key in totals}:
+        series[value] = [(month, totals.get((value, month), 0)) for month in starts]
+    return series
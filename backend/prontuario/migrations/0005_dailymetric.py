@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 00:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('prontuario', '0004_patient_gender_optional'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Dia')),
+                ('metric', models.CharField(choices=[('PACIENTES_NOVOS', 'Novos Pacientes'), ('PRONTUARIOS', 'Prontuários'), ('CONSULTAS', 'Consultas'), ('SESSOES_REALIZADAS', 'Sessões Realizadas'), ('DOCUMENTOS', 'Documentos'), ('TRANSFERENCIAS', 'Transferências')], max_length=30, verbose_name='Métrica')),
+                ('value', models.PositiveIntegerField(default=0, verbose_name='Valor')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('clinica', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_metrics', to='authentication.clinica', verbose_name='Clínica')),
+                ('filial', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_metrics', to='authentication.filial', verbose_name='Filial')),
+                ('fisioterapeuta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_metrics', to=settings.AUTH_USER_MODEL, verbose_name='Fisioterapeuta')),
+            ],
+            options={
+                'verbose_name': 'Métrica Diária',
+                'verbose_name_plural': 'Métricas Diárias',
+                'ordering': ['-day', 'metric'],
+                'indexes': [models.Index(fields=['clinica', 'metric', 'day'], name='dailymetric_clinica_idx'), models.Index(fields=['fisioterapeuta', 'metric', 'day'], name='dailymetric_fisio_idx')],
+                'unique_together': {('clinica', 'filial', 'fisioterapeuta', 'day', 'metric')},
+            },
+        ),
+    ]
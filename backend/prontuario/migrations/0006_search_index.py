@@ -0,0 +1,66 @@
+# Índices de busca textual (FTS5 no SQLite, GIN no PostgreSQL)
+#
+# Tabelas e colunas congeladas aqui, com os modelos históricos: o índice
+# criado por esta migration não muda se prontuario/search.py ou os campos dos
+# modelos mudarem depois (`python manage.py rebuild_search_index` recria os
+# índices conforme o código atual).
+
+from django.db import migrations
+
+
+INDEXES = [
+    ('Patient', ['full_name', 'cpf', 'email', 'phone']),
+    ('MedicalRecord', [
+        'title', 'diagnosis', 'chief_complaint', 'history', 'physical_exam', 'treatment_plan', 'observations',
+    ]),
+]
+
+
+def _pg_vector(fields):
+    weights = ['A', 'B', 'C', 'D']
+    return ' || '.join(
+        f"setweight(to_tsvector('portuguese', coalesce(\"{field}\", '')), '{weights[min(position, 3)]}')"
+        for position, field in enumerate(fields)
+    )
+
+
+def create_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for model_name, fields in INDEXES:
+        model = apps.get_model('prontuario', model_name)
+        table = model._meta.db_table
+        if vendor == 'sqlite':
+            columns = ', '.join(fields)
+            values = ', '.join(f"coalesce({field}, '')" for field in fields)
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts "
+                f"USING fts5({columns}, tokenize='unicode61 remove_diacritics 2')"
+            )
+            schema_editor.execute(
+                f'INSERT INTO {table}_fts (rowid, {columns}) SELECT {model._meta.pk.column}, {values} FROM {table}'
+            )
+        elif vendor == 'postgresql':
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_search_gin ON {table} USING gin (({_pg_vector(fields)}))'
+            )
+
+
+def drop_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for model_name, _ in INDEXES:
+        table = apps.get_model('prontuario', model_name)._meta.db_table
+        if vendor == 'sqlite':
+            schema_editor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+        elif vendor == 'postgresql':
+            schema_editor.execute(f'DROP INDEX IF EXISTS {table}_search_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prontuario', '0005_dailymetric'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 00:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('prontuario', '0006_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='discharge',
+            index=models.Index(fields=['clinica', 'discharge_date'], name='discharge_clinica_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='discharge',
+            index=models.Index(fields=['fisioterapeuta', 'discharge_date'], name='discharge_fisio_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['clinica', 'filial', 'is_active'], name='patient_clinica_filial_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['fisioterapeuta', 'is_active'], name='patient_fisio_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='physiosession',
+            index=models.Index(fields=['clinica', 'scheduled_date', 'status'], name='session_clinica_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='physiosession',
+            index=models.Index(fields=['fisioterapeuta', 'scheduled_date', 'status'], name='session_fisio_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treatmentplan',
+            index=models.Index(fields=['clinica', 'status', 'created_at'], name='plan_clinica_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treatmentplan',
+            index=models.Index(fields=['fisioterapeuta', 'status', 'created_at'], name='plan_fisio_status_idx'),
+        ),
+    ]
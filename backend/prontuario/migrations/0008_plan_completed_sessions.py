@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 00:50
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_completed_sessions(apps, schema_editor):
+    TreatmentPlan = apps.get_model('prontuario', 'TreatmentPlan')
+    PhysioSession = apps.get_model('prontuario', 'PhysioSession')
+
+    realizadas = PhysioSession.objects.filter(
+        treatment_plan=models.OuterRef('pk'), status='REALIZADA'
+    ).order_by().values('treatment_plan').annotate(total=models.Count('pk')).values('total')
+    TreatmentPlan.objects.update(completed_sessions=Coalesce(models.Subquery(realizadas), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prontuario', '0007_tenant_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='treatmentplan',
+            name='completed_sessions',
+            field=models.PositiveIntegerField(default=0, verbose_name='Sessões Realizadas'),
+        ),
+        migrations.RunPython(fill_completed_sessions, migrations.RunPython.noop),
+    ]
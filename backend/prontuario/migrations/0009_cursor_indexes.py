@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 00:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('prontuario', '0008_plan_completed_sessions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicalrecord',
+            index=models.Index(fields=['record_date', 'id'], name='record_date_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalrecord',
+            index=models.Index(fields=['patient', 'record_date', 'id'], name='record_patient_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalrecordhistory',
+            index=models.Index(fields=['medical_record', 'timestamp', 'id'], name='record_history_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='physiosession',
+            index=models.Index(fields=['clinica', 'scheduled_date', 'scheduled_time', 'id'], name='session_clinica_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='physiosession',
+            index=models.Index(fields=['fisioterapeuta', 'scheduled_date', 'scheduled_time', 'id'], name='session_fisio_cursor_idx'),
+        ),
+    ]
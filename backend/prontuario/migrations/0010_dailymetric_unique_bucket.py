@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:49
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remove_duplicate_buckets(apps, schema_editor):
+    """
+    Buckets com filial/fisioterapeuta nulos podiam ser duplicados (NULLs são
+    distintos no unique_together). Cada linha guarda o valor completo do
+    bucket, então basta manter a mais recente.
+    """
+    DailyMetric = apps.get_model('prontuario', 'DailyMetric')
+    dimensions = ['clinica', 'filial', 'fisioterapeuta', 'day', 'metric']
+    duplicated = DailyMetric.objects.values(*dimensions).annotate(
+        total=models.Count('pk'), keep=models.Max('pk')
+    ).filter(total__gt=1).order_by()
+    for bucket in duplicated:
+        keep = bucket.pop('keep')
+        bucket.pop('total')
+        DailyMetric.objects.filter(**bucket).exclude(pk=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('prontuario', '0009_cursor_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='dailymetric',
+            unique_together=set(),
+        ),
+        migrations.RunPython(remove_duplicate_buckets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailymetric',
+            constraint=models.UniqueConstraint(models.F('clinica'), django.db.models.functions.comparison.Coalesce('filial', 0), django.db.models.functions.comparison.Coalesce('fisioterapeuta', 0), models.F('day'), models.F('metric'), name='dailymetric_unique_bucket'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:42
+
+import django.db.models.deletion
+import prontuario.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prontuario', '0010_dailymetric_unique_bucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicalRecordSearchEntry',
+            fields=[
+                ('medical_record', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='prontuario.medicalrecord')),
+                ('fts', prontuario.models.SearchColumn(db_column='prontuario_medicalrecord_fts')),
+            ],
+            options={
+                'db_table': 'prontuario_medicalrecord_fts',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PatientSearchEntry',
+            fields=[
+                ('patient', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='prontuario.patient')),
+                ('fts', prontuario.models.SearchColumn(db_column='prontuario_patient_fts')),
+            ],
+            options={
+                'db_table': 'prontuario_patient_fts',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+    ]
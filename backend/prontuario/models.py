@@ -1,7 +1,11 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.utils import timezone
 
+from authentication.tenancy import TenantScopedManager
+from .search import SearchMatch
+
 
 def patient_photo_upload_path(instance, filename):
     """Define o caminho de upload das fotos dos pacientes"""
@@ -102,12 +106,18 @@ class Patient(models.Model):
     last_visit = models.DateTimeField(blank=True, null=True, verbose_name="Última Visita")
     notes = models.TextField(blank=True, null=True, verbose_name="Observações Gerais")
 
+    objects = TenantScopedManager(clinica='clinica', filial='filial', fisioterapeuta='fisioterapeuta')
+
     class Meta:
         ordering = ['full_name']
         verbose_name = "Paciente"
         verbose_name_plural = "Pacientes"
         # CPF único por clínica (um paciente não pode estar duplicado na mesma clínica)
         unique_together = [['clinica', 'cpf']]
+        indexes = [
+            models.Index(fields=['clinica', 'filial', 'is_active'], name='patient_clinica_filial_idx'),
+            models.Index(fields=['fisioterapeuta', 'is_active'], name='patient_fisio_active_idx'),
+        ]
 
     def __str__(self):
         fisio_name = self.fisioterapeuta.get_full_name() if self.fisioterapeuta else 'Sem fisioterapeuta'
@@ -363,6 +373,16 @@ class TransferRequest(models.Model):
         return self
 
 
+class MedicalRecordQuerySet(models.QuerySet):
+
+    # Colunas de texto que a listagem não devolve (lidas só no detalhe)
+    HEAVY_FIELDS = ['history']
+
+    def summary(self):
+        """Listagens e buscas de prontuários"""
+        return self.defer(*self.HEAVY_FIELDS)
+
+
 class MedicalRecord(models.Model):
     """
     Modelo para prontuários médicos dos pacientes
@@ -396,10 +416,17 @@ class MedicalRecord(models.Model):
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='records_created', verbose_name="Criado por")
     last_modified_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='records_modified', verbose_name="Última modificação por")
 
+    objects = MedicalRecordQuerySet.as_manager()
+
     class Meta:
         ordering = ['-record_date']
         verbose_name = "Prontuário Médico"
         verbose_name_plural = "Prontuários Médicos"
+        indexes = [
+            # Paginação por cursor: (record_date, id)
+            models.Index(fields=['record_date', 'id'], name='record_date_cursor_idx'),
+            models.Index(fields=['patient', 'record_date', 'id'], name='record_patient_cursor_idx'),
+        ]
 
     def __str__(self):
         return f"{self.patient.full_name} - {self.title} ({self.record_date.strftime('%d/%m/%Y')})"
@@ -434,6 +461,9 @@ class MedicalRecordHistory(models.Model):
         ordering = ['-timestamp']
         verbose_name = "Histórico de Prontuário"
         verbose_name_plural = "Históricos de Prontuários"
+        indexes = [
+            models.Index(fields=['medical_record', 'timestamp', 'id'], name='record_history_cursor_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_action_display()} - {self.medical_record.patient.full_name} - {self.timestamp.strftime('%d/%m/%Y %H:%M')}"
@@ -516,29 +546,59 @@ class TreatmentPlan(models.Model):
     # Observações
     observations = models.TextField(blank=True, verbose_name="Observações Gerais")
     
+    # Contador de sessões realizadas (mantido pelos signals de PhysioSession;
+    # conferido por `python manage.py repair_plan_progress`)
+    completed_sessions = models.PositiveIntegerField(default=0, verbose_name="Sessões Realizadas")
+    
     # Controle
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
     
+    objects = TenantScopedManager(clinica='clinica', fisioterapeuta='fisioterapeuta')
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Plano de Tratamento"
         verbose_name_plural = "Planos de Tratamento"
+        indexes = [
+            models.Index(fields=['clinica', 'status', 'created_at'], name='plan_clinica_status_idx'),
+            models.Index(fields=['fisioterapeuta', 'status', 'created_at'], name='plan_fisio_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.patient.full_name} ({self.get_status_display()})"
     
     @property
     def completed_sessions_count(self):
-        """Conta quantas sessões foram realizadas"""
-        return self.sessions.filter(status='REALIZADA').count()
+        """Quantas sessões foram realizadas (contador, sem consulta)"""
+        return self.completed_sessions
     
     @property
     def progress_percentage(self):
         """Retorna a porcentagem de progresso do tratamento"""
         if self.total_sessions == 0:
             return 0
-        return int((self.completed_sessions_count / self.total_sessions) * 100)
+        return int((self.completed_sessions / self.total_sessions) * 100)
+    
+    @classmethod
+    def refresh_completed_sessions(cls, plan_ids=None):
+        """
+        Recalcula o contador `completed_sessions` a partir das sessões.
+        
+        Um único UPDATE com subconsulta por plano, sem ler e regravar o valor,
+        então gravações concorrentes de sessões do mesmo plano não perdem
+        atualizações. Retorna o número de planos atualizados.
+        """
+        realizadas = PhysioSession.objects.filter(
+            treatment_plan=models.OuterRef('pk'), status='REALIZADA'
+        ).order_by().values('treatment_plan').annotate(total=models.Count('pk')).values('total')
+        
+        queryset = cls.objects.all()
+        if plan_ids is not None:
+            queryset = queryset.filter(pk__in=[pk for pk in plan_ids if pk])
+        return queryset.update(
+            completed_sessions=Coalesce(models.Subquery(realizadas), 0)
+        )
 
 
 class PhysioSession(models.Model):
@@ -615,10 +675,19 @@ class PhysioSession(models.Model):
         verbose_name="Criado por"
     )
     
+    objects = TenantScopedManager(clinica='clinica', fisioterapeuta='fisioterapeuta')
+    
     class Meta:
         ordering = ['-scheduled_date', '-scheduled_time']
         verbose_name = "Sessão de Fisioterapia"
         verbose_name_plural = "Sessões de Fisioterapia"
+        indexes = [
+            models.Index(fields=['clinica', 'scheduled_date', 'status'], name='session_clinica_date_idx'),
+            models.Index(fields=['fisioterapeuta', 'scheduled_date', 'status'], name='session_fisio_date_idx'),
+            # Paginação por cursor da agenda: (scheduled_date, scheduled_time, id)
+            models.Index(fields=['clinica', 'scheduled_date', 'scheduled_time', 'id'], name='session_clinica_cursor_idx'),
+            models.Index(fields=['fisioterapeuta', 'scheduled_date', 'scheduled_time', 'id'], name='session_fisio_cursor_idx'),
+        ]
     
     def __str__(self):
         session_info = f"#{self.session_number}" if self.session_number else ""
@@ -698,10 +767,135 @@ class Discharge(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
     
+    objects = TenantScopedManager(clinica='clinica', fisioterapeuta='fisioterapeuta')
+    
     class Meta:
         ordering = ['-discharge_date']
         verbose_name = "Alta/Encerramento"
         verbose_name_plural = "Altas/Encerramentos"
+        indexes = [
+            models.Index(fields=['clinica', 'discharge_date'], name='discharge_clinica_date_idx'),
+            models.Index(fields=['fisioterapeuta', 'discharge_date'], name='discharge_fisio_date_idx'),
+        ]
     
     def __str__(self):
         return f"Alta - {self.patient.full_name} ({self.discharge_date.strftime('%d/%m/%Y')}) - {self.get_reason_display()}"
+
+
+# ==================== MÉTRICAS CONSOLIDADAS (DASHBOARDS) ====================
+
+class DailyMetric(models.Model):
+    """
+    MÉTRICA DIÁRIA CONSOLIDADA (ROLLUP)
+    
+    Contagem pré-agregada por clínica/filial/fisioterapeuta/dia/métrica,
+    usada pelos dashboards no lugar de contar as tabelas brutas a cada acesso.
+    
+    Mantida incrementalmente pelos signals de prontuario/signals.py e
+    reconstruída com o comando `python manage.py rebuild_metrics`.
+    As regras de cada métrica estão em prontuario/metrics.py.
+    """
+    METRIC_CHOICES = [
+        ('PACIENTES_NOVOS', 'Novos Pacientes'),
+        ('PRONTUARIOS', 'Prontuários'),
+        ('CONSULTAS', 'Consultas'),
+        ('SESSOES_REALIZADAS', 'Sessões Realizadas'),
+        ('DOCUMENTOS', 'Documentos'),
+        ('TRANSFERENCIAS', 'Transferências'),
+    ]
+    
+    clinica = models.ForeignKey(
+        'authentication.Clinica',
+        on_delete=models.CASCADE,
+        related_name='daily_metrics',
+        verbose_name='Clínica'
+    )
+    filial = models.ForeignKey(
+        'authentication.Filial',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='daily_metrics',
+        verbose_name='Filial'
+    )
+    fisioterapeuta = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='daily_metrics',
+        verbose_name='Fisioterapeuta'
+    )
+    
+    day = models.DateField(verbose_name='Dia')
+    metric = models.CharField(max_length=30, choices=METRIC_CHOICES, verbose_name='Métrica')
+    value = models.PositiveIntegerField(default=0, verbose_name='Valor')
+    
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
+    
+    class Meta:
+        ordering = ['-day', 'metric']
+        verbose_name = 'Métrica Diária'
+        verbose_name_plural = 'Métricas Diárias'
+        constraints = [
+            # filial/fisioterapeuta nulos entram como 0: em UNIQUE, NULLs são distintos
+            # e não impediriam buckets duplicados da clínica ou sem fisioterapeuta
+            models.UniqueConstraint(
+                'clinica', Coalesce('filial', 0), Coalesce('fisioterapeuta', 0), 'day', 'metric',
+                name='dailymetric_unique_bucket',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['clinica', 'metric', 'day'], name='dailymetric_clinica_idx'),
+            models.Index(fields=['fisioterapeuta', 'metric', 'day'], name='dailymetric_fisio_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_metric_display()} - {self.day.strftime('%d/%m/%Y')}: {self.value}"
+
+
+class SearchColumn(models.TextField):
+    """Coluna oculta de uma tabela FTS5 (mesmo nome da tabela), com o lookup `match`"""
+
+
+SearchColumn.register_lookup(SearchMatch)
+
+
+class SearchEntry(models.Model):
+    """
+    LINHA DE UM ÍNDICE DE BUSCA (tabela FTS5 do SQLite)
+
+    Modelos não gerenciados: as tabelas virtuais são criadas pelas migrations
+    de índice e mantidas pelo SearchIndex (prontuario/search.py). Servem para
+    juntar o índice às consultas do modelo indexado pelo relacionamento
+    `search_entry`, com o MATCH e o bm25 na coluna oculta `fts` (que tem o
+    nome da tabela). No PostgreSQL as tabelas não existem e não são usadas.
+    """
+
+    class Meta:
+        abstract = True
+        managed = False
+
+
+class PatientSearchEntry(SearchEntry):
+    """Linha do índice de busca de pacientes"""
+    patient = models.OneToOneField(
+        Patient, on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', db_constraint=False, related_name='search_entry'
+    )
+    fts = SearchColumn(db_column='prontuario_patient_fts')
+
+    class Meta(SearchEntry.Meta):
+        db_table = 'prontuario_patient_fts'
+
+
+class MedicalRecordSearchEntry(SearchEntry):
+    """Linha do índice de busca de prontuários"""
+    medical_record = models.OneToOneField(
+        MedicalRecord, on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', db_constraint=False, related_name='search_entry'
+    )
+    fts = SearchColumn(db_column='prontuario_medicalrecord_fts')
+
+    class Meta(SearchEntry.Meta):
+        db_table = 'prontuario_medicalrecord_fts'
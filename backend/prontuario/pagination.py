@@ -0,0 +1,146 @@
+"""
+Paginação por cursor (keyset) para listagens de alto volume
+
+A paginação padrão (PageNumberPagination) faz COUNT(*) e OFFSET, que ficam
+mais lentos a cada página conforme a tabela cresce. Com `?cursor=` a
+listagem passa a ser paginada por chave:
+
+    GET /api/prontuario/sessions/?cursor=          -> primeira página
+    GET /api/prontuario/sessions/?cursor=<next>    -> página seguinte
+
+O cursor guarda os valores da ordenação (ex.: scheduled_date,
+scheduled_time e id) do último item da página; a próxima página é um
+WHERE (data, hora, id) < (...) sobre o índice correspondente, com o mesmo
+custo em qualquer profundidade. A resposta traz apenas `next` e `results`
+(sem `count`, que exigiria o COUNT(*)).
+
+Os campos da ordenação não podem ser nulos; o id é sempre acrescentado
+como desempate.
+"""
+import base64
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+CURSOR_PARAM = 'cursor'
+
+
+def _encode_value(value):
+    # isoformat completo (o DjangoJSONEncoder descarta parte dos microssegundos)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _value_of(instance, path):
+    """Valor de um campo da ordenação, inclusive relacionados (patient__full_name)"""
+    value = instance
+    for attr in path.split('__'):
+        value = getattr(value, attr)
+    return getattr(value, 'pk', value)
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Paginação por chave, ativada apenas quando a requisição traz `?cursor=`.
+    Sem o parâmetro, paginate_queryset retorna None (listagem sem paginação),
+    o que permite usá-la em actions que hoje devolvem a lista completa.
+    """
+    page_size = api_settings.PAGE_SIZE or 20
+    cursor_query_param = CURSOR_PARAM
+
+    def wants_cursor(self, request):
+        return self.cursor_query_param in request.query_params
+
+    def get_ordering(self, queryset):
+        """Ordenação do queryset (OrderingFilter ou Meta.ordering) + id como desempate"""
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        if not all(isinstance(field, str) for field in ordering):
+            raise ValidationError({'cursor': 'Ordenação não suportada pela paginação por cursor.'})
+        names = [field.lstrip('-') for field in ordering]
+        if 'pk' not in names and 'id' not in names:
+            descending = bool(ordering) and ordering[0].startswith('-')
+            ordering.append('-pk' if descending else 'pk')
+        return ordering
+
+    def decode_cursor(self, raw, ordering):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(raw.encode()).decode())
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound('Cursor inválido.')
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound('Cursor inválido.')
+        return values
+
+    def encode_cursor(self, instance, ordering):
+        values = [_encode_value(_value_of(instance, field.lstrip('-'))) for field in ordering]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def keyset_filter(self, ordering, values):
+        """(a, b, id) depois de (x, y, z): a < x OR (a = x AND b < y) OR (...)"""
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.wants_cursor(request):
+            return None
+
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+
+        raw = request.query_params.get(self.cursor_query_param)
+        if raw:
+            queryset = queryset.filter(self.keyset_filter(self.ordering, self.decode_cursor(raw, self.ordering)))
+
+        # Um item a mais indica se existe próxima página
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.next_cursor = self.encode_cursor(page[-1], self.ordering) if self.has_next else None
+        return page
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+
+class CursorOrPageNumberPagination(KeysetCursorPagination):
+    """
+    Paginação das ViewSets de alto volume: por cursor com `?cursor=`,
+    por número de página (padrão do projeto) sem ele.
+    """
+
+    def __init__(self):
+        self.page_number = PageNumberPagination()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.wants_cursor(request)
+        if self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        return self.page_number.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.use_cursor:
+            return super().get_paginated_response(data)
+        return self.page_number.get_paginated_response(data)
@@ -0,0 +1,312 @@
+"""
+Importação em massa de pacientes (CSV/XLSX)
+
+Usada no onboarding de uma clínica, pelo endpoint
+POST /api/prontuario/patients/import/ e pelo comando `import_patients`.
+
+As linhas são lidas em streaming e processadas em lotes (`chunk_size`):
+
+- cada linha é validada com as regras do PatientSerializer
+  (PatientImportSerializer), sem consultas por linha;
+- os CPFs do lote são verificados contra a restrição (clinica, cpf) com uma
+  única consulta IN, e CPFs repetidos no próprio arquivo são recusados;
+- o fisioterapeuta (coluna opcional: id, username ou CPF) é resolvido com
+  uma consulta por lote;
+- as linhas válidas são gravadas com bulk_create, uma transação por lote.
+
+Como bulk_create não dispara signals, o índice de busca, o rollup de
+métricas e o cache dos dashboards são atualizados aqui. Linhas com erro não
+interrompem a importação: voltam no relatório com o número da linha.
+
+Um arquivo que deixa de poder ser lido no meio (CSV malformado) interrompe
+a importação: os lotes já gravados permanecem, o rollup e o cache são
+atualizados assim mesmo e o relatório traz a mensagem em `error`.
+"""
+import codecs
+import csv
+import io
+from datetime import date, datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from rest_framework import serializers
+
+from authentication.models import User
+from . import dashboard_cache, metrics
+from .models import Patient
+from .search import PATIENT_INDEX
+from .serializers import PatientImportSerializer
+
+
+DEFAULT_CHUNK_SIZE = 1000
+FORMATS = ('csv', 'xlsx')
+
+# CSV salvo pelo Excel em português costuma vir em cp1252; latin-1 aceita qualquer byte
+CSV_ENCODINGS = ('utf-8-sig', 'cp1252', 'latin-1')
+CSV_SAMPLE_BYTES = 64 * 1024
+# Bytes que não valem na codificação detectada pela amostra viram U+FFFD (linha recusada)
+INVALID_CHARACTER = '\ufffd'
+
+# Cabeçalhos em português aceitos além dos nomes dos campos
+COLUMN_ALIASES = {
+    'nome': 'full_name',
+    'nome_completo': 'full_name',
+    'data_nascimento': 'birth_date',
+    'nascimento': 'birth_date',
+    'sexo': 'gender',
+    'genero': 'gender',
+    'telefone': 'phone',
+    'celular': 'phone',
+    'endereco': 'address',
+    'cidade': 'city',
+    'estado': 'state',
+    'uf': 'state',
+    'cep': 'zip_code',
+    'queixa_principal': 'chief_complaint',
+    'tipo_sanguineo': 'blood_type',
+    'alergias': 'allergies',
+    'medicacoes': 'medications',
+    'historico_medico': 'medical_history',
+    'observacoes': 'notes',
+}
+FISIOTERAPEUTA_COLUMN = 'fisioterapeuta'
+
+
+class PatientImportError(Exception):
+    """Arquivo que não pode ser lido (formato, cabeçalho, dependência ausente)"""
+
+
+def file_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension not in FORMATS:
+        raise PatientImportError('Formato não suportado. Envie um arquivo .csv ou .xlsx.')
+    return extension
+
+
+def _column(header):
+    name = str(header or '').strip().lower().replace(' ', '_')
+    return COLUMN_ALIASES.get(name, name)
+
+
+def _cell(value):
+    """Valor da célula como o serializer espera (texto ou data); vazio -> None"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    # Números do Excel (CPF, telefone, CEP sem máscara)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def _rows(header, records, first_line):
+    columns = [_column(name) for name in header]
+    if 'cpf' not in columns:
+        raise PatientImportError('O arquivo precisa de uma coluna "cpf".')
+    for line, record in enumerate(records, start=first_line):
+        row = {}
+        for column, value in zip(columns, record):
+            value = _cell(value)
+            if column and value is not None:
+                row[column] = value
+        if row:
+            yield line, row
+
+
+def _csv_encoding(sample):
+    """Primeira codificação de CSV_ENCODINGS que decodifica o início do arquivo"""
+    for encoding in CSV_ENCODINGS:
+        try:
+            # Decodificador incremental: um caractere cortado no fim da amostra não é erro
+            codecs.getincrementaldecoder(encoding)().decode(sample)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return CSV_ENCODINGS[-1]
+
+
+def read_csv(binary_file):
+    """
+    (linha, dados) de um CSV separado por vírgula, ponto e vírgula ou tab,
+    em UTF-8 ou, se o início do arquivo não for UTF-8, cp1252/latin-1.
+    A codificação vem das primeiras CSV_SAMPLE_BYTES; bytes inválidos depois
+    delas não interrompem a leitura, só recusam a linha em que aparecem.
+    """
+    sample = binary_file.read(CSV_SAMPLE_BYTES)
+    binary_file.seek(0)
+    text = io.TextIOWrapper(binary_file, encoding=_csv_encoding(sample), errors='replace', newline='')
+    reader = None
+    try:
+        sample = text.read(8192)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+
+        reader = csv.reader(text, dialect)
+        header = next(reader, None)
+        if not header:
+            raise PatientImportError('Arquivo vazio.')
+        yield from _rows(header, reader, first_line=2)
+    except csv.Error as exc:
+        line = f' (linha {reader.line_num})' if reader is not None else ''
+        raise PatientImportError(f'CSV inválido{line}: {exc}')
+
+
+def read_xlsx(binary_file):
+    """(linha, dados) da primeira planilha de um XLSX (requer openpyxl)"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise PatientImportError('A importação de XLSX requer o pacote openpyxl (pip install openpyxl).')
+
+    try:
+        workbook = load_workbook(binary_file, read_only=True, data_only=True)
+    except Exception:
+        raise PatientImportError('Arquivo XLSX inválido.')
+    try:
+        records = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(records, None)
+        if not header:
+            raise PatientImportError('Arquivo vazio.')
+        yield from _rows(header, records, first_line=2)
+    finally:
+        workbook.close()
+
+
+def read_rows(binary_file, filename):
+    """Linhas do arquivo conforme a extensão"""
+    reader = read_xlsx if file_format(filename) == 'xlsx' else read_csv
+    return reader(binary_file)
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _fisioterapeutas(clinica_id, references):
+    """Fisioterapeutas da clínica por id, username ou CPF (uma consulta)"""
+    if not references:
+        return {}
+    ids = [int(reference) for reference in references if reference.isdigit()]
+    users = User.objects.filter(clinica_id=clinica_id, user_type='FISIOTERAPEUTA').filter(
+        Q(pk__in=ids) | Q(username__in=references) | Q(cpf__in=references)
+    )
+    found = {}
+    for user in users:
+        for key in (str(user.pk), user.username, user.cpf):
+            if key in references:
+                found[key] = user
+    return found
+
+
+class PatientImporter:
+    """
+    Importa linhas (linha, dados) para uma filial
+
+    Args:
+        filial: filial (e clínica) dos pacientes importados
+        chunk_size: linhas validadas e gravadas por lote/transação
+        dry_run: apenas valida, sem gravar
+    """
+
+    def __init__(self, filial, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+        self.filial = filial
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.serializer = PatientImportSerializer()
+        self.seen_cpfs = set()
+        self.metric_keys = set()
+        self.result = {'total': 0, 'created': 0, 'dry_run': dry_run, 'errors': [], 'error': None}
+
+    def _error(self, line, row, errors):
+        self.result['errors'].append({'line': line, 'cpf': row.get('cpf'), 'errors': errors})
+
+    def _validate(self, chunk):
+        """Patients válidos do lote: (linha, dados, Patient)"""
+        valid = []
+        for line, row in chunk:
+            if any(INVALID_CHARACTER in value for value in row.values()):
+                self._error(line, row, {'non_field_errors': [
+                    'Caracteres inválidos na linha: salve o CSV inteiro em UTF-8.'
+                ]})
+                continue
+            try:
+                valid.append((line, row, self.serializer.run_validation(row)))
+            except serializers.ValidationError as exc:
+                self._error(line, row, exc.detail)
+
+        clinica_id = self.filial.clinica_id
+        existing = set(Patient.objects.filter(
+            clinica_id=clinica_id, cpf__in={data['cpf'] for _, _, data in valid}
+        ).values_list('cpf', flat=True))
+        fisioterapeutas = _fisioterapeutas(clinica_id, {
+            row[FISIOTERAPEUTA_COLUMN] for _, row, _ in valid if FISIOTERAPEUTA_COLUMN in row
+        })
+
+        patients = []
+        for line, row, data in valid:
+            cpf = data['cpf']
+            reference = row.get(FISIOTERAPEUTA_COLUMN)
+            if cpf in existing:
+                self._error(line, row, {'cpf': ['Já existe um paciente com este CPF nesta clínica.']})
+            elif cpf in self.seen_cpfs:
+                self._error(line, row, {'cpf': ['CPF repetido no arquivo.']})
+            elif reference and reference not in fisioterapeutas:
+                self._error(line, row, {FISIOTERAPEUTA_COLUMN: ['Fisioterapeuta não encontrado nesta clínica.']})
+            else:
+                self.seen_cpfs.add(cpf)
+                patients.append((line, row, Patient(
+                    clinica_id=clinica_id, filial=self.filial,
+                    fisioterapeuta=fisioterapeutas.get(reference), is_active=True, **data
+                )))
+        return patients
+
+    def _save(self, patients):
+        objects = [patient for _, _, patient in patients]
+        try:
+            with transaction.atomic():
+                Patient.objects.bulk_create(objects)
+                PATIENT_INDEX.add_many(objects)
+        except IntegrityError:
+            # CPF gravado por outra requisição entre a verificação e a gravação
+            for line, row, _ in patients:
+                self._error(line, row, {'cpf': ['Conflito ao gravar o lote; importe a linha novamente.']})
+            return
+        self.result['created'] += len(objects)
+        for patient in objects:
+            self.metric_keys |= metrics.metric_keys(patient)
+
+    def run(self, rows):
+        try:
+            for chunk in _chunks(rows, self.chunk_size):
+                self.result['total'] += len(chunk)
+                patients = self._validate(chunk)
+                if patients and not self.dry_run:
+                    self._save(patients)
+        except PatientImportError as exc:
+            # Os lotes anteriores já foram gravados: o relatório diz quantos
+            self.result['error'] = str(exc)
+        finally:
+            if self.result['created']:
+                metrics.refresh_buckets(self.metric_keys)
+                dashboard_cache.invalidate_dashboards(self.filial.clinica_id)
+        self.result['errors'].sort(key=lambda error: error['line'])
+        return self.result
+
+
+def import_patients(rows, filial, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """Importa as linhas e retorna {total, created, dry_run, errors, error}"""
+    return PatientImporter(filial, chunk_size=chunk_size, dry_run=dry_run).run(rows)
@@ -0,0 +1,251 @@
+"""
+Agendamento recorrente das sessões de um plano de tratamento
+
+Expande a frequência do plano (ex.: '2x_semana') em datas e horários a
+partir de uma data inicial, até completar as sessões que faltam do plano:
+
+    POST /api/prontuario/treatment-plans/{id}/schedule/
+    {"time": "08:00", "start_date": "2025-03-03", "weekdays": [0, 3], "dry_run": true}
+
+- os dias da semana padrão de cada frequência estão em FREQUENCY_WEEKDAYS
+  (0 = segunda); `weekdays` substitui o padrão (obrigatório em 'sob_demanda');
+- horários que se sobrepõem a sessões do fisioterapeuta ou do paciente são
+  pulados (e listados em `skipped`); a agenda existente é lida com uma única
+  consulta para todo o período;
+- session_number continua a numeração do plano;
+- as sessões são gravadas com um único bulk_create, em uma transação.
+
+O mesmo módulo calcula a disponibilidade dos fisioterapeutas
+(GET /api/prontuario/sessions/availability/) e recusa agendamentos
+sobrepostos (check_booking, chamado pela PhysioSessionViewSet). A agenda de
+cada dia é um índice de intervalos (início, fim) em minutos, ordenado pelo
+início, montado a partir de scheduled_time e duration_minutes.
+
+Gravações que checam conflitos bloqueiam antes o registro do fisioterapeuta
+(lock_agenda), serializando os agendamentos dele (SELECT ... FOR UPDATE; no
+SQLite as transações de escrita já são serializadas).
+"""
+from bisect import bisect_left, insort
+from datetime import date, datetime, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from . import dashboard_cache
+from .models import PhysioSession
+
+
+# Dias da semana (0 = segunda) de cada frequência do plano
+FREQUENCY_WEEKDAYS = {
+    '1x_semana': [0],
+    '2x_semana': [0, 3],
+    '3x_semana': [0, 2, 4],
+    '4x_semana': [0, 1, 3, 4],
+    '5x_semana': [0, 1, 2, 3, 4],
+    'diario': [0, 1, 2, 3, 4, 5],
+}
+
+# Sessões que não ocupam mais o horário
+FREE_STATUSES = ['CANCELADA', 'REMARCADA']
+
+# Semanas além do necessário para compensar horários pulados
+EXTRA_WEEKS = 4
+
+# Expediente considerado na disponibilidade
+WORKDAY_START = time(7, 0)
+WORKDAY_END = time(19, 0)
+MAX_AVAILABILITY_DAYS = 31
+
+
+class ScheduleError(Exception):
+    """Plano ou parâmetros que não permitem gerar a agenda"""
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _format(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def _interval(start_time, duration):
+    begin = _minutes(start_time)
+    return begin, begin + duration
+
+
+def _overlaps(interval, busy):
+    """O intervalo [início, fim) cruza algum intervalo de `busy` (ordenado pelo início)?"""
+    start, end = interval
+    # Só os intervalos que começam antes do fim podem cruzar
+    return any(busy_end > start for _, busy_end in busy[:bisect_left(busy, (end,))])
+
+
+def _index(rows):
+    """{chave: {data: [(início, fim)]}} a partir de (chave, data, horário, duração)"""
+    index = {}
+    for key, day, start_time, duration in rows:
+        insort(index.setdefault(key, {}).setdefault(day, []), _interval(start_time, duration))
+    return index
+
+
+def free_intervals(busy, day_start=WORKDAY_START, day_end=WORKDAY_END):
+    """Intervalos livres do expediente, dado o índice ocupado do dia"""
+    free = []
+    cursor, limit = _minutes(day_start), _minutes(day_end)
+    for start, end in busy:
+        if start > cursor:
+            free.append((cursor, min(start, limit)))
+        cursor = max(cursor, end)
+        if cursor >= limit:
+            break
+    if cursor < limit:
+        free.append((cursor, limit))
+    return [(start, end) for start, end in free if end > start]
+
+
+def remaining_sessions(plan):
+    """(sessões que faltam agendar, último session_number do plano)"""
+    stats = PhysioSession.objects.filter(treatment_plan=plan).aggregate(
+        scheduled=Count('pk', filter=~Q(status__in=FREE_STATUSES)),
+        last_number=Max('session_number'),
+    )
+    return max(plan.total_sessions - stats['scheduled'], 0), stats['last_number'] or 0
+
+
+def busy_intervals(fisioterapeuta_id, patient_id, start, end):
+    """{data: [(início, fim) em minutos]} da agenda do fisioterapeuta e do paciente"""
+    rows = PhysioSession.objects.filter(
+        Q(fisioterapeuta_id=fisioterapeuta_id) | Q(patient_id=patient_id),
+        scheduled_date__range=(start, end),
+    ).exclude(status__in=FREE_STATUSES).values_list('scheduled_date', 'scheduled_time', 'duration_minutes')
+    return _index((None, *row) for row in rows).get(None, {})
+
+
+def lock_agenda(fisioterapeuta_id):
+    """Bloqueia a agenda do fisioterapeuta até o fim da transação"""
+    list(get_user_model().objects.select_for_update().filter(pk=fisioterapeuta_id).values_list('pk'))
+
+
+def check_booking(fisioterapeuta_id, patient_id, day, start_time, duration, exclude_pk=None):
+    """Levanta ScheduleError se o horário cruza outra sessão do fisioterapeuta ou do paciente"""
+    sessions = PhysioSession.objects.filter(
+        Q(fisioterapeuta_id=fisioterapeuta_id) | Q(patient_id=patient_id), scheduled_date=day
+    ).exclude(status__in=FREE_STATUSES)
+    if exclude_pk:
+        sessions = sessions.exclude(pk=exclude_pk)
+
+    interval = _interval(start_time, duration)
+    for other_fisioterapeuta, other_time, other_duration in sessions.values_list(
+        'fisioterapeuta_id', 'scheduled_time', 'duration_minutes'
+    ):
+        if _overlaps(interval, [_interval(other_time, other_duration)]):
+            quem = 'O fisioterapeuta' if other_fisioterapeuta == fisioterapeuta_id else 'O paciente'
+            fim = _format(_minutes(other_time) + other_duration)
+            raise ScheduleError(f'{quem} já tem uma sessão das {other_time:%H:%M} às {fim} neste dia.')
+
+
+def availability(fisioterapeutas, start, end, duration, day_start=WORKDAY_START, day_end=WORKDAY_END):
+    """
+    Agenda livre/ocupada de cada fisioterapeuta entre `start` e `end`
+    (uma consulta para todos), com os horários livres para sessões de `duration` minutos
+    """
+    index = _index(PhysioSession.objects.filter(
+        fisioterapeuta__in=[fisioterapeuta.pk for fisioterapeuta in fisioterapeutas],
+        scheduled_date__range=(start, end),
+    ).exclude(status__in=FREE_STATUSES).values_list(
+        'fisioterapeuta_id', 'scheduled_date', 'scheduled_time', 'duration_minutes'
+    ))
+
+    result = []
+    for fisioterapeuta in fisioterapeutas:
+        days = []
+        day = start
+        while day <= end:
+            busy = index.get(fisioterapeuta.pk, {}).get(day, [])
+            free = free_intervals(busy, day_start, day_end)
+            days.append({
+                'date': day,
+                'busy': [[_format(a), _format(b)] for a, b in busy],
+                'free': [[_format(a), _format(b)] for a, b in free],
+                'slots': [
+                    _format(slot) for a, b in free for slot in range(a, b - duration + 1, duration)
+                ],
+            })
+            day += timedelta(days=1)
+        result.append({'id': fisioterapeuta.pk, 'name': fisioterapeuta.get_full_name(), 'days': days})
+    return result
+
+
+def plan_schedule(plan, start_time, start_date=None, weekdays=None, duration=None):
+    """
+    Calcula a agenda do plano sem gravar
+
+    Returns:
+        (sessões, pulados): PhysioSession não salvas e [{'date', 'time', 'reason'}]
+    """
+    if plan.status != 'ATIVO':
+        raise ScheduleError('Apenas planos ativos podem ser agendados.')
+
+    weekdays = sorted(set(weekdays if weekdays else FREQUENCY_WEEKDAYS.get(plan.frequency, [])))
+    if not weekdays:
+        raise ScheduleError('Informe os dias da semana (weekdays) para a frequência "sob demanda".')
+    if any(day not in range(7) for day in weekdays):
+        raise ScheduleError('weekdays deve conter números de 0 (segunda) a 6 (domingo).')
+
+    duration = duration or plan.session_duration_minutes
+    start_date = max(start_date or plan.start_date, date.today())
+    missing, last_number = remaining_sessions(plan)
+    if not missing:
+        return [], []
+
+    weeks = -(-missing // len(weekdays)) + EXTRA_WEEKS
+    end_date = start_date + timedelta(weeks=weeks)
+    busy = busy_intervals(plan.fisioterapeuta_id, plan.patient_id, start_date, end_date)
+
+    interval = _interval(start_time, duration)
+    sessions, skipped = [], []
+    day = start_date
+    while len(sessions) < missing and day <= end_date:
+        if day.weekday() in weekdays:
+            if _overlaps(interval, busy.get(day, [])):
+                skipped.append({'date': day, 'time': start_time, 'reason': 'Horário ocupado'})
+            else:
+                sessions.append(PhysioSession(
+                    patient_id=plan.patient_id, fisioterapeuta_id=plan.fisioterapeuta_id,
+                    clinica_id=plan.clinica_id, treatment_plan=plan,
+                    scheduled_date=day, scheduled_time=start_time, duration_minutes=duration,
+                    session_number=last_number + len(sessions) + 1, status='AGENDADA',
+                ))
+        day += timedelta(days=1)
+    return sessions, skipped
+
+
+def schedule_plan(plan, start_time, start_date=None, weekdays=None, duration=None, created_by=None, dry_run=False):
+    """Gera e grava (a menos que dry_run) a agenda do plano. Retorna (sessões, pulados)."""
+    with transaction.atomic():
+        if not dry_run:
+            lock_agenda(plan.fisioterapeuta_id)
+        sessions, skipped = plan_schedule(plan, start_time, start_date, weekdays, duration)
+        if sessions and not dry_run:
+            for session in sessions:
+                session.created_by = created_by
+            PhysioSession.objects.bulk_create(sessions)
+            # bulk_create não dispara signals (cache dos dashboards)
+            dashboard_cache.invalidate_dashboards(plan.clinica_id)
+    return sessions, skipped
+
+
+def parse_time(value):
+    try:
+        return datetime.strptime(str(value), '%H:%M').time()
+    except ValueError:
+        raise ScheduleError('time deve estar no formato HH:MM.')
+
+
+def parse_date(value, name='start_date'):
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise ScheduleError(f'{name} deve estar no formato AAAA-MM-DD.')
@@ -0,0 +1,263 @@
+"""
+Busca textual (full-text) de pacientes, prontuários e documentos
+
+Cada índice (SearchIndex) cobre colunas de texto de um modelo:
+
+- SQLite: tabela virtual FTS5 `<tabela>_fts` (rowid = id do objeto), criada
+  nas migrations e mantida pelos signals de post_save/post_delete.
+- PostgreSQL: índice GIN sobre a expressão to_tsvector das colunas; o próprio
+  banco mantém o índice, não há tabela auxiliar.
+- Outros bancos: icontains nas colunas (sem ranking).
+
+`index.search(queryset, texto)` filtra o queryset recebido (que já vem com o
+filtro da clínica/fisioterapeuta de cada view), anota `search_rank` (maior =
+mais relevante) e ordena pela relevância. No SQLite a tabela FTS5 é juntada
+à do modelo pelo modelo não gerenciado SearchEntry (relacionamento
+`search_entry`): o MATCH roda uma vez e o bm25 vem da mesma linha (um bm25
+em subconsulta correlacionada repetiria o MATCH a cada linha).
+
+Operações em massa (queryset.update, bulk_create) não disparam signals;
+após cargas desse tipo, execute `python manage.py rebuild_search_index`.
+"""
+import re
+
+from django.apps import apps
+from django.db import connection
+from django.db.models import F, FloatField, Func, Lookup, Q, Value
+from django.db.models.expressions import RawSQL
+
+
+PG_CONFIG = 'portuguese'
+PG_WEIGHTS = ['A', 'B', 'C', 'D']
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Relacionamento dos modelos indexados com a tabela FTS5 (prontuario.models.SearchEntry)
+SEARCH_ENTRY = 'search_entry'
+
+# Índices registrados (nome -> SearchIndex)
+INDEXES = {}
+
+
+def search_tokens(text):
+    """Palavras da busca do usuário (sem operadores nem aspas)"""
+    return TOKEN_RE.findall(text or '')[:16]
+
+
+class BM25(Func):
+    """Relevância do FTS5 (o bm25 do SQLite é negativo: invertido para maior = mais relevante)"""
+    function = 'bm25'
+    template = '-%(function)s(%(expressions)s)'
+    output_field = FloatField()
+
+
+class SearchMatch(Lookup):
+    """`search_entry__fts__match`: MATCH do FTS5 na coluna oculta da tabela (prontuario.models.SearchEntry)"""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class SearchIndex:
+    """
+    Índice textual de um modelo
+
+    `fields` são colunas de texto do próprio modelo, da mais para a menos
+    relevante; `weights` são os pesos do bm25 (SQLite) na mesma ordem.
+    """
+
+    def __init__(self, name, model_label, fields, weights=None):
+        self.name = name
+        self.model_label = model_label
+        self.fields = fields
+        self.weights = weights or [1.0] * len(fields)
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    @property
+    def fts_table(self):
+        return f'{self.model._meta.db_table}_fts'
+
+    @property
+    def pg_index_name(self):
+        return f'{self.model._meta.db_table}_search_gin'[:63]
+
+    @staticmethod
+    def vendor(conn=None):
+        return (conn or connection).vendor
+
+    # ==================== ESTRUTURA ====================
+
+    def create(self, conn=None):
+        """Cria a tabela FTS5 (SQLite) ou o índice GIN (PostgreSQL)"""
+        conn = conn or connection
+        with conn.cursor() as cursor:
+            if self.vendor(conn) == 'sqlite':
+                columns = ', '.join(self.fields)
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.fts_table} "
+                    f"USING fts5({columns}, tokenize='unicode61 remove_diacritics 2')"
+                )
+            elif self.vendor(conn) == 'postgresql':
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {self.pg_index_name} '
+                    f'ON {self.model._meta.db_table} USING gin (({self._pg_vector()}))'
+                )
+
+    def drop(self, conn=None):
+        conn = conn or connection
+        with conn.cursor() as cursor:
+            if self.vendor(conn) == 'sqlite':
+                cursor.execute(f'DROP TABLE IF EXISTS {self.fts_table}')
+            elif self.vendor(conn) == 'postgresql':
+                cursor.execute(f'DROP INDEX IF EXISTS {self.pg_index_name}')
+
+    # ==================== SINCRONIZAÇÃO (SQLite) ====================
+
+    def _values(self, instance):
+        return [getattr(instance, field) or '' for field in self.fields]
+
+    def update(self, instance):
+        """Grava (ou regrava) o objeto no índice"""
+        if self.vendor() != 'sqlite':
+            return
+        columns = ', '.join(['rowid'] + self.fields)
+        placeholders = ', '.join(['%s'] * (len(self.fields) + 1))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.fts_table} WHERE rowid = %s', [instance.pk])
+            cursor.execute(
+                f'INSERT INTO {self.fts_table} ({columns}) VALUES ({placeholders})',
+                [instance.pk] + self._values(instance)
+            )
+
+    def add_many(self, instances):
+        """Grava no índice objetos recém-criados (ex.: após bulk_create)"""
+        if self.vendor() != 'sqlite' or not instances:
+            return
+        columns = ', '.join(['rowid'] + self.fields)
+        placeholders = ', '.join(['%s'] * (len(self.fields) + 1))
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.fts_table} ({columns}) VALUES ({placeholders})',
+                [[instance.pk] + self._values(instance) for instance in instances]
+            )
+
+    def remove(self, pk):
+        if self.vendor() != 'sqlite':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.fts_table} WHERE rowid = %s', [pk])
+
+    def populate(self, conn=None):
+        """Copia o conteúdo atual da tabela do modelo para a tabela FTS5"""
+        conn = conn or connection
+        if self.vendor(conn) != 'sqlite':
+            return
+        table = self.model._meta.db_table
+        columns = ', '.join(self.fields)
+        values = ', '.join(f"coalesce({field}, '')" for field in self.fields)
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.fts_table} (rowid, {columns}) '
+                f'SELECT {self.model._meta.pk.column}, {values} FROM {table}'
+            )
+
+    def rebuild(self, conn=None):
+        """Recria o índice a partir da tabela do modelo. Retorna o total de objetos."""
+        self.drop(conn)
+        self.create(conn)
+        self.populate(conn)
+        return self.model.objects.count()
+
+    # ==================== CONSULTA ====================
+
+    def _pg_vector(self, table=None):
+        """Expressão tsvector (a mesma do índice GIN, para que ele seja usado)"""
+        parts = []
+        for position, field in enumerate(self.fields):
+            column = f'"{table}"."{field}"' if table else f'"{field}"'
+            weight = PG_WEIGHTS[min(position, len(PG_WEIGHTS) - 1)]
+            parts.append(f"setweight(to_tsvector('{PG_CONFIG}', coalesce({column}, '')), '{weight}')")
+        return ' || '.join(parts)
+
+    def search(self, queryset, text, extra=None):
+        """
+        Filtra o queryset pelos termos e ordena pela relevância
+
+        `extra` (Q) inclui também as linhas que o satisfazem sem bater com o
+        índice (ex.: documentos pelo nome do paciente), com relevância 0. No
+        SQLite o resultado com `extra` é uma união: aceita ordenação, fatias
+        e count, mas não novos filtros.
+        """
+        tokens = search_tokens(text)
+        if not tokens:
+            return queryset.filter(extra) if extra is not None else queryset.none()
+
+        table = self.model._meta.db_table
+        vendor = self.vendor()
+
+        if vendor == 'sqlite':
+            # Todas as palavras, cada uma como prefixo: "dor" "lomb"*
+            match = ' '.join(f'"{token}"*' for token in tokens)
+            lookup = {f'{SEARCH_ENTRY}__fts__match': match}
+            hits = queryset.filter(**lookup).annotate(
+                search_rank=BM25(F(f'{SEARCH_ENTRY}__fts'), *[Value(weight) for weight in self.weights])
+            )
+            if extra is None:
+                return hits.order_by('-search_rank', '-pk')
+            # MATCH em um OR com outra tabela não usa o índice FTS5 (seria avaliado
+            # linha a linha): as linhas de `extra` entram por uma união
+            others = queryset.filter(extra).exclude(pk__in=queryset.filter(**lookup).values('pk')).annotate(
+                search_rank=Value(0.0, output_field=FloatField())
+            )
+            return hits.order_by().union(others.order_by(), all=True).order_by('-search_rank', '-pk')
+        elif vendor == 'postgresql':
+            tsquery = ' & '.join(f'{token}:*' for token in tokens)
+            matches = RawSQL(
+                f"SELECT {self.model._meta.pk.column} FROM {table} WHERE ({self._pg_vector()}) @@ to_tsquery('{PG_CONFIG}', %s)",
+                [tsquery]
+            )
+            rank = RawSQL(
+                f"ts_rank({self._pg_vector(table)}, to_tsquery('{PG_CONFIG}', %s))",
+                [tsquery], output_field=FloatField()
+            )
+            queryset = queryset.filter(Q(pk__in=matches) | extra if extra is not None else Q(pk__in=matches))
+        else:
+            condition = Q()
+            for token in tokens:
+                token_condition = Q()
+                for field in self.fields:
+                    token_condition |= Q(**{f'{field}__icontains': token})
+                condition &= token_condition
+            if extra is not None:
+                condition |= extra
+            return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+        return queryset.annotate(search_rank=rank).order_by('-search_rank', '-pk')
+
+
+def register(index):
+    INDEXES[index.name] = index
+    return index
+
+
+def indexes_for_model(model):
+    return [index for index in INDEXES.values() if index.model_label == model._meta.label]
+
+
+PATIENT_INDEX = register(SearchIndex(
+    'patients', 'prontuario.Patient',
+    ['full_name', 'cpf', 'email', 'phone'],
+    weights=[10.0, 5.0, 2.0, 2.0],
+))
+
+MEDICAL_RECORD_INDEX = register(SearchIndex(
+    'medical_records', 'prontuario.MedicalRecord',
+    ['title', 'diagnosis', 'chief_complaint', 'history', 'physical_exam', 'treatment_plan', 'observations'],
+    weights=[10.0, 5.0, 5.0, 1.0, 1.0, 1.0, 1.0],
+))
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import Patient, MedicalRecord, MedicalRecordHistory, PatientTransferHistory, TransferRequest
 from authentication.models import User
+from .fieldsets import SparseFieldsetMixin
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -44,7 +45,7 @@ class PatientTransferHistorySerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
-class PatientSerializer(serializers.ModelSerializer):
+class PatientSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para o modelo Patient com foto e informações de filial
     """
@@ -59,6 +60,8 @@ class PatientSerializer(serializers.ModelSerializer):
     clinica = serializers.PrimaryKeyRelatedField(read_only=True)
     filial = serializers.PrimaryKeyRelatedField(read_only=True)
     
+    field_dependencies = {'age': ['birth_date'], 'photo_url': ['photo']}
+    
     class Meta:
         model = Patient
         fields = [
@@ -91,7 +94,24 @@ class PatientSerializer(serializers.ModelSerializer):
         return None
 
 
-class PatientListSerializer(serializers.ModelSerializer):
+class PatientImportSerializer(PatientSerializer):
+    """
+    Linha da importação em massa (prontuario/patient_import.py): mesmas regras
+    do PatientSerializer, sem foto. O fisioterapeuta é resolvido por lote.
+    """
+    birth_date = serializers.DateField(input_formats=['iso-8601', '%d/%m/%Y'])
+
+    class Meta(PatientSerializer.Meta):
+        fields = [
+            'full_name', 'cpf', 'birth_date', 'gender',
+            'phone', 'email', 'address', 'city', 'state', 'zip_code',
+            'chief_complaint', 'blood_type', 'allergies', 'medications', 'medical_history',
+            'notes'
+        ]
+        read_only_fields = []
+
+
+class PatientListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer resumido para listagem de pacientes (otimizado para mobile)
     """
@@ -100,6 +120,8 @@ class PatientListSerializer(serializers.ModelSerializer):
     fisioterapeuta_name = serializers.CharField(source='fisioterapeuta.get_full_name', read_only=True)
     filial_nome = serializers.CharField(source='filial.nome', read_only=True)
     
+    field_dependencies = {'age': ['birth_date'], 'photo_url': ['photo']}
+    
     class Meta:
         model = Patient
         fields = [
@@ -136,7 +158,7 @@ class PatientTransferSerializer(serializers.Serializer):
         return value
 
 
-class MedicalRecordHistorySerializer(serializers.ModelSerializer):
+class MedicalRecordHistorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para histórico de alterações
     """
@@ -152,7 +174,7 @@ class MedicalRecordHistorySerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
-class MedicalRecordSerializer(serializers.ModelSerializer):
+class MedicalRecordSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer para o modelo MedicalRecord
     """
@@ -176,7 +198,7 @@ class MedicalRecordSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at', 'created_by']
 
 
-class MedicalRecordListSerializer(serializers.ModelSerializer):
+class MedicalRecordListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer resumido para listagem de prontuários
     """
@@ -184,6 +206,10 @@ class MedicalRecordListSerializer(serializers.ModelSerializer):
     record_type_display = serializers.CharField(source='get_record_type_display', read_only=True)
     created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     
+    expandable_fields = {
+        'patient': ('prontuario.serializers.PatientListSerializer', ['patient__fisioterapeuta', 'patient__filial']),
+    }
+    
     class Meta:
         model = MedicalRecord
         fields = [
@@ -4,17 +4,19 @@ Serializers para Sessões de Fisioterapia, Planos de Tratamento e Alta
 
 from rest_framework import serializers
 from .models import TreatmentPlan, PhysioSession, Discharge, Patient
+from .fieldsets import SparseFieldsetMixin
 
 
-class TreatmentPlanSerializer(serializers.ModelSerializer):
+class TreatmentPlanSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer completo para Plano de Tratamento"""
     patient_name = serializers.CharField(source='patient.full_name', read_only=True)
     fisioterapeuta_name = serializers.CharField(source='fisioterapeuta.get_full_name', read_only=True)
     frequency_display = serializers.CharField(source='get_frequency_display', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
-    completed_sessions = serializers.IntegerField(source='completed_sessions_count', read_only=True)
     progress = serializers.IntegerField(source='progress_percentage', read_only=True)
     
+    field_dependencies = {'progress': ['total_sessions', 'completed_sessions']}
+    
     class Meta:
         model = TreatmentPlan
         fields = [
@@ -25,16 +27,21 @@ class TreatmentPlanSerializer(serializers.ModelSerializer):
             'observations', 'completed_sessions', 'progress',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'clinica', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'clinica', 'completed_sessions', 'created_at', 'updated_at']
 
 
-class TreatmentPlanListSerializer(serializers.ModelSerializer):
+class TreatmentPlanListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para listagem de Planos de Tratamento"""
     patient_name = serializers.CharField(source='patient.full_name', read_only=True)
     fisioterapeuta_name = serializers.CharField(source='fisioterapeuta.get_full_name', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     progress = serializers.IntegerField(source='progress_percentage', read_only=True)
     
+    field_dependencies = {'progress': ['total_sessions', 'completed_sessions']}
+    expandable_fields = {
+        'patient': ('prontuario.serializers.PatientListSerializer', ['patient__fisioterapeuta', 'patient__filial']),
+    }
+    
     class Meta:
         model = TreatmentPlan
         fields = [
@@ -56,7 +63,7 @@ class TreatmentPlanCreateSerializer(serializers.ModelSerializer):
         ]
 
 
-class PhysioSessionSerializer(serializers.ModelSerializer):
+class PhysioSessionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer completo para Sessão de Fisioterapia"""
     patient_name = serializers.CharField(source='patient.full_name', read_only=True)
     patient_phone = serializers.CharField(source='patient.phone', read_only=True)
@@ -66,6 +73,8 @@ class PhysioSessionSerializer(serializers.ModelSerializer):
     is_today = serializers.BooleanField(read_only=True)
     can_be_edited = serializers.BooleanField(read_only=True)
     
+    field_dependencies = {'is_today': ['scheduled_date'], 'can_be_edited': ['status']}
+    
     class Meta:
         model = PhysioSession
         fields = [
@@ -82,13 +91,19 @@ class PhysioSessionSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'clinica', 'created_at', 'updated_at', 'created_by']
 
 
-class PhysioSessionListSerializer(serializers.ModelSerializer):
+class PhysioSessionListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para listagem de Sessões (agenda)"""
     patient_name = serializers.CharField(source='patient.full_name', read_only=True)
     fisioterapeuta_name = serializers.CharField(source='fisioterapeuta.get_full_name', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     is_today = serializers.BooleanField(read_only=True)
     
+    field_dependencies = {'is_today': ['scheduled_date']}
+    expandable_fields = {
+        'patient': ('prontuario.serializers.PatientListSerializer', ['patient__fisioterapeuta', 'patient__filial']),
+        'treatment_plan': ('prontuario.serializers_session.TreatmentPlanListSerializer', ['treatment_plan__patient', 'treatment_plan__fisioterapeuta']),
+    }
+    
     class Meta:
         model = PhysioSession
         fields = [
@@ -112,7 +127,7 @@ class PhysioSessionCreateSerializer(serializers.ModelSerializer):
         ]
 
 
-class DischargeSerializer(serializers.ModelSerializer):
+class DischargeSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer completo para Alta/Encerramento"""
     patient_name = serializers.CharField(source='patient.full_name', read_only=True)
     fisioterapeuta_name = serializers.CharField(source='fisioterapeuta.get_full_name', read_only=True)
@@ -132,7 +147,7 @@ class DischargeSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'clinica', 'created_at', 'updated_at']
 
 
-class DischargeListSerializer(serializers.ModelSerializer):
+class DischargeListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para listagem de Altas"""
     patient_name = serializers.CharField(source='patient.full_name', read_only=True)
     reason_display = serializers.CharField(source='get_reason_display', read_only=True)
@@ -0,0 +1,130 @@
+"""
+Signals do app prontuario
+
+Mantém o rollup de métricas (DailyMetric) atualizado a cada gravação ou
+exclusão dos modelos que alimentam os dashboards, e invalida o cache das
+respostas dos dashboards (prontuario/dashboard_cache.py) e mantém os índices
+de busca textual (prontuario/search.py) e o contador de sessões realizadas
+dos planos de tratamento (TreatmentPlan.completed_sessions) em dia.
+
+Operações em massa (queryset.update, bulk_create) não disparam signals;
+após cargas desse tipo, execute `python manage.py rebuild_metrics`,
+`python manage.py rebuild_search_index` e `python manage.py repair_plan_progress`.
+"""
+from django.apps import apps
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+
+from . import dashboard_cache, metrics, search
+from .models import Patient, PhysioSession, TreatmentPlan
+
+
+def _metric_pre_save(sender, instance, **kwargs):
+    """Guarda os buckets do estado anterior para recalculá-los após a gravação"""
+    instance._metric_keys_before = set()
+    instance._metric_patient_keys_before = None
+    if not instance.pk:
+        return
+    previous = sender.objects.filter(pk=instance.pk).first()
+    if previous is None:
+        return
+    instance._metric_keys_before = metrics.metric_keys(previous)
+    # Transferência de paciente: prontuários, sessões e documentos dele mudam de filial/fisioterapeuta
+    if isinstance(instance, Patient) and (
+        previous.filial_id != instance.filial_id
+        or previous.fisioterapeuta_id != instance.fisioterapeuta_id
+    ):
+        instance._metric_patient_keys_before = metrics.patient_dependent_keys(instance)
+
+
+def _metric_post_save(sender, instance, **kwargs):
+    keys = metrics.metric_keys(instance) | getattr(instance, '_metric_keys_before', set())
+
+    # Buckets dos registros do paciente transferido, antes e depois da gravação
+    patient_keys = getattr(instance, '_metric_patient_keys_before', None)
+    if patient_keys is not None:
+        keys |= patient_keys | metrics.patient_dependent_keys(instance)
+
+    metrics.refresh_buckets(keys)
+
+
+def _metric_pre_delete(sender, instance, **kwargs):
+    # Os relacionamentos ainda existem no banco neste momento
+    instance._metric_keys_before = metrics.metric_keys(instance)
+
+
+def _metric_post_delete(sender, instance, **kwargs):
+    metrics.refresh_buckets(getattr(instance, '_metric_keys_before', set()))
+
+
+def connect_metric_signals():
+    for model in metrics.tracked_models():
+        uid = f'daily_metric_{model._meta.label_lower}'
+        pre_save.connect(_metric_pre_save, sender=model, dispatch_uid=f'{uid}_pre_save')
+        post_save.connect(_metric_post_save, sender=model, dispatch_uid=f'{uid}_post_save')
+        pre_delete.connect(_metric_pre_delete, sender=model, dispatch_uid=f'{uid}_pre_delete')
+        post_delete.connect(_metric_post_delete, sender=model, dispatch_uid=f'{uid}_post_delete')
+
+
+def _dashboard_cache_invalidate(sender, instance, **kwargs):
+    path = dashboard_cache.DASHBOARD_SOURCES[sender._meta.label]
+    dashboard_cache.invalidate_dashboards(metrics._resolve_id(instance, path))
+
+
+def _dashboard_cache_user_changed(sender, instance, **kwargs):
+    # Equipe, nomes e filial do usuário aparecem nos dashboards da clínica
+    dashboard_cache.invalidate_dashboards(instance.clinica_id)
+
+
+def connect_dashboard_cache_signals():
+    for label in dashboard_cache.DASHBOARD_SOURCES:
+        model = apps.get_model(label)
+        uid = f'dashboard_cache_{model._meta.label_lower}'
+        post_save.connect(_dashboard_cache_invalidate, sender=model, dispatch_uid=f'{uid}_post_save')
+        post_delete.connect(_dashboard_cache_invalidate, sender=model, dispatch_uid=f'{uid}_post_delete')
+
+    user_model = apps.get_model('authentication.User')
+    post_save.connect(_dashboard_cache_user_changed, sender=user_model, dispatch_uid='dashboard_cache_user_post_save')
+    post_delete.connect(_dashboard_cache_user_changed, sender=user_model, dispatch_uid='dashboard_cache_user_post_delete')
+
+
+def _search_index_update(sender, instance, **kwargs):
+    for index in search.indexes_for_model(sender):
+        index.update(instance)
+
+
+def _search_index_remove(sender, instance, **kwargs):
+    for index in search.indexes_for_model(sender):
+        index.remove(instance.pk)
+
+
+def connect_search_signals():
+    """Conecta os signals de todos os índices registrados (idempotente)"""
+    for index in search.INDEXES.values():
+        uid = f'search_index_{index.name}'
+        post_save.connect(_search_index_update, sender=index.model, dispatch_uid=f'{uid}_post_save')
+        post_delete.connect(_search_index_remove, sender=index.model, dispatch_uid=f'{uid}_post_delete')
+
+
+def _plan_progress_pre_save(sender, instance, **kwargs):
+    """Guarda o plano anterior (a sessão pode ter trocado de plano)"""
+    instance._plan_before = None
+    if instance.pk:
+        instance._plan_before = sender.objects.filter(pk=instance.pk).values_list('treatment_plan_id', flat=True).first()
+
+
+def _plan_progress_post_save(sender, instance, **kwargs):
+    plan_ids = {instance.treatment_plan_id, getattr(instance, '_plan_before', None)} - {None}
+    if plan_ids:
+        TreatmentPlan.refresh_completed_sessions(plan_ids)
+
+
+def _plan_progress_post_delete(sender, instance, **kwargs):
+    if instance.treatment_plan_id:
+        TreatmentPlan.refresh_completed_sessions([instance.treatment_plan_id])
+
+
+def connect_plan_progress_signals():
+    uid = 'plan_progress_physiosession'
+    pre_save.connect(_plan_progress_pre_save, sender=PhysioSession, dispatch_uid=f'{uid}_pre_save')
+    post_save.connect(_plan_progress_post_save, sender=PhysioSession, dispatch_uid=f'{uid}_post_save')
+    post_delete.connect(_plan_progress_post_delete, sender=PhysioSession, dispatch_uid=f'{uid}_post_delete')
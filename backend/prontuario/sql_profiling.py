@@ -0,0 +1,188 @@
+"""
+Perfil SQL por requisição (opcional, não depende de DEBUG)
+
+Com settings.SQL_PROFILING = True, o SQLProfilingMiddleware registra as
+consultas de cada requisição com connection.execute_wrapper e acrescenta à
+resposta:
+
+- X-Query-Count: número de consultas;
+- Server-Timing: tempo total (`app`), tempo no banco (`db`) e a duração
+  das SQL_PROFILING_TOP_N consultas mais lentas (`sql1`, `sql2`, ...),
+  visíveis na aba Network/Timing do navegador.
+
+Os cabeçalhos só trazem tempos e contagens: o texto das consultas revela o
+esquema do banco a qualquer cliente (e origem liberada no CORS). O SQL vai
+para o Server-Timing apenas com SQL_PROFILING_EXPOSE_SQL = True (ambiente
+de desenvolvimento); o log sempre o registra, com os valores como
+parâmetros (%s), e guarda o caminho sem os valores da query string.
+
+Consultas com a mesma impressão digital (o SQL sem valores literais e com
+listas IN reduzidas) repetidas SQL_PROFILING_DUPLICATE_THRESHOLD vezes ou
+mais indicam um N+1 e são contadas em X-Query-Duplicates.
+
+Requisições lentas (SQL_PROFILING_SLOW_MS) ou com muitas consultas
+(SQL_PROFILING_SLOW_QUERIES) são gravadas em SQL_PROFILING_LOG, um JSON por
+linha, com rotação por tamanho (SQL_PROFILING_LOG_MAX_BYTES,
+SQL_PROFILING_LOG_BACKUPS).
+
+Desativado, o middleware é removido da pilha na inicialização
+(MiddlewareNotUsed) e não tem custo.
+"""
+import json
+import logging
+import re
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+
+LOGGER_NAME = 'physiocapture.sql_profiling'
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """SQL normalizado: consultas que só diferem nos valores têm a mesma impressão digital"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _slow_log():
+    """Logger do arquivo JSONL com rotação (um handler por processo, refeito se o caminho mudar)"""
+    logger = logging.getLogger(LOGGER_NAME)
+    path = Path(_setting('SQL_PROFILING_LOG', 'logs/sql_slow_requests.jsonl')).resolve()
+    if any(getattr(handler, 'baseFilename', None) == str(path) for handler in logger.handlers):
+        return logger
+
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handler = RotatingFileHandler(
+        path, encoding='utf-8',
+        maxBytes=_setting('SQL_PROFILING_LOG_MAX_BYTES', 10 * 1024 * 1024),
+        backupCount=_setting('SQL_PROFILING_LOG_BACKUPS', 5),
+    )
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+class QueryRecorder:
+    """execute_wrapper que mede cada consulta executada"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def db_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicates(self, threshold):
+        """[{fingerprint, count, total_ms}] das consultas repetidas, das mais frequentes para as menos"""
+        groups = defaultdict(list)
+        for sql, duration in self.queries:
+            groups[fingerprint(sql)].append(duration)
+        repeated = [
+            {'fingerprint': key, 'count': len(durations), 'total_ms': round(sum(durations) * 1000, 2)}
+            for key, durations in groups.items() if len(durations) >= threshold
+        ]
+        return sorted(repeated, key=lambda group: (-group['count'], -group['total_ms']))
+
+    def slowest(self, limit):
+        ordered = sorted(self.queries, key=lambda query: query[1], reverse=True)[:limit]
+        return [{'sql': sql, 'duration_ms': round(duration * 1000, 2)} for sql, duration in ordered]
+
+
+def _header_text(text, limit=100):
+    """Descrição segura para o Server-Timing (ASCII, sem aspas, curta)"""
+    text = _SPACES.sub(' ', text).encode('ascii', 'replace').decode().replace('\\', '/').replace('"', "'")
+    return text if len(text) <= limit else text[:limit - 3] + '...'
+
+
+def _logged_path(request):
+    """Caminho com os nomes dos parâmetros, sem os valores (buscas trazem nomes e CPFs de pacientes)"""
+    if not request.GET:
+        return request.path
+    return f"{request.path}?{'&'.join(request.GET)}"
+
+
+class SQLProfilingMiddleware:
+    """Ativado por settings.SQL_PROFILING; veja a descrição do módulo"""
+
+    def __init__(self, get_response):
+        if not _setting('SQL_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.top_n = _setting('SQL_PROFILING_TOP_N', 5)
+        self.duplicate_threshold = _setting('SQL_PROFILING_DUPLICATE_THRESHOLD', 3)
+        self.slow_ms = _setting('SQL_PROFILING_SLOW_MS', 500)
+        self.slow_queries = _setting('SQL_PROFILING_SLOW_QUERIES', 50)
+        self.expose_sql = _setting('SQL_PROFILING_EXPOSE_SQL', False)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        db_ms = recorder.db_time * 1000
+        slowest = recorder.slowest(self.top_n)
+        duplicates = recorder.duplicates(self.duplicate_threshold)
+
+        timings = [
+            f'app;dur={total_ms:.2f}',
+            f'db;dur={db_ms:.2f};desc="{len(recorder.queries)} consultas"',
+        ]
+        for position, query in enumerate(slowest, start=1):
+            timing = f'sql{position};dur={query["duration_ms"]}'
+            if self.expose_sql:
+                timing += f';desc="{_header_text(query["sql"])}"'
+            timings.append(timing)
+        response['X-Query-Count'] = str(len(recorder.queries))
+        response['X-Query-Duplicates'] = str(sum(group['count'] for group in duplicates))
+        response['Server-Timing'] = ', '.join(timings)
+
+        if total_ms >= self.slow_ms or len(recorder.queries) >= self.slow_queries:
+            _slow_log().info(json.dumps({
+                'timestamp': timezone.now().isoformat(),
+                'method': request.method,
+                'path': _logged_path(request),
+                'status': response.status_code,
+                'user_id': request.headers.get('X-User-Id'),
+                'duration_ms': round(total_ms, 2),
+                'db_ms': round(db_ms, 2),
+                'queries': len(recorder.queries),
+                'duplicates': duplicates,
+                'slowest': slowest,
+            }, ensure_ascii=False))
+        return response
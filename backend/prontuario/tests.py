@@ -3,13 +3,14 @@ Testes de Permissão e Fluxo para o PhysioCapture
 Rede de Clínicas com Multi-Filial e Transferência de Pacientes
 """
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from authentication.models import Clinica, Filial, User
 from prontuario.models import Patient, MedicalRecord, TreatmentPlan, PhysioSession, Discharge, PatientTransferHistory
 from documentos.models import Document, DocumentCategory
-from datetime import date, time
+from datetime import date, time, timedelta
+from io import StringIO
 
 
 class MultiFilialBaseTestCase(TestCase):
@@ -363,3 +364,1543 @@ class UserManagementPermissionTests(MultiFilialBaseTestCase):
         self.assertTrue(self.gestor_recife.can_manage_user(self.fisio_recife_1))
         self.assertTrue(self.gestor_recife.can_manage_user(self.fisio_recife_2))
         self.assertFalse(self.gestor_recife.can_manage_user(self.fisio_olinda))
+
+
+@override_settings(DASHBOARD_CACHE_TIMEOUT=0)
+class DashboardGestorQueryCountTests(MultiFilialBaseTestCase):
+    """Testes do dashboard do Gestor Geral: número de consultas SQL constante"""
+    
+    # Limite de consultas do endpoint, independente do tamanho da rede
+    MAX_QUERIES = 15
+    
+    def setUp(self):
+        super().setUp()
+        from django.urls import reverse
+        self.url = reverse('dashboard-statistics-gestor')
+        PhysioSession.objects.create(
+            patient=self.paciente_recife_1,
+            fisioterapeuta=self.fisio_recife_1,
+            clinica=self.clinica,
+            scheduled_date=date.today(),
+            scheduled_time=time(9, 0),
+            status='REALIZADA'
+        )
+    
+    def _criar_filial_com_equipe(self, indice, fisios=3, pacientes_por_fisio=2):
+        """Cria uma filial com fisioterapeutas, pacientes e sessões realizadas"""
+        filial = Filial.objects.create(
+            clinica=self.clinica,
+            nome=f"FisioVida Extra {indice}",
+            endereco="Rua Extra",
+            numero=str(indice),
+            bairro="Centro",
+            cidade="Recife",
+            estado="PE",
+            cep="50000-000",
+            telefone="(81) 3333-0000"
+        )
+        for f in range(fisios):
+            fisio = User.objects.create(
+                username=f"fisio_extra_{indice}_{f}",
+                email=f"fisio.extra.{indice}.{f}@teste.com",
+                first_name="Fisio",
+                last_name=f"Extra {indice}-{f}",
+                cpf=f"9{indice:02d}.{f:03d}.000-01",
+                clinica=self.clinica,
+                filial=filial,
+                user_type="FISIOTERAPEUTA"
+            )
+            for p in range(pacientes_por_fisio):
+                paciente = Patient.objects.create(
+                    clinica=self.clinica,
+                    filial=filial,
+                    fisioterapeuta=fisio,
+                    full_name=f"Paciente Extra {indice}-{f}-{p}",
+                    cpf=f"8{indice:02d}.{f:03d}.{p:03d}-01",
+                    birth_date=date(1990, 1, 1),
+                    phone="(81) 98888-0000"
+                )
+                PhysioSession.objects.create(
+                    patient=paciente,
+                    fisioterapeuta=fisio,
+                    clinica=self.clinica,
+                    scheduled_date=date.today(),
+                    scheduled_time=time(10, 0),
+                    status='REALIZADA'
+                )
+        return filial
+    
+    def _get_dashboard(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, headers={'X-User-Id': str(self.gestor_geral.id)})
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+    
+    def test_query_count_independe_do_tamanho_da_rede(self):
+        """O número de consultas não cresce com filiais, fisioterapeutas ou pacientes"""
+        queries_rede_pequena, _ = self._get_dashboard()
+        
+        for indice in range(4):
+            self._criar_filial_com_equipe(indice)
+        
+        queries_rede_grande, data = self._get_dashboard()
+        
+        self.assertEqual(queries_rede_pequena, queries_rede_grande)
+        self.assertLessEqual(queries_rede_grande, self.MAX_QUERIES)
+        self.assertEqual(data['totalFiliais'], 6)
+    
+    def test_metricas_agregadas_por_filial_e_fisioterapeuta(self):
+        """Os valores pivotados em memória batem com os dados cadastrados"""
+        filial_extra = self._criar_filial_com_equipe(0, fisios=2, pacientes_por_fisio=3)
+        _, data = self._get_dashboard()
+        
+        self.assertEqual(data['totalPacientes'], 9)
+        self.assertEqual(data['totalFisioterapeutas'], 5)
+        self.assertEqual(data['novosPacientesMes'], 9)
+        
+        stats = {f['id']: f for f in data['filiaisStats']}
+        self.assertEqual(stats[self.filial_recife.id]['totalPacientes'], 2)
+        self.assertEqual(stats[self.filial_recife.id]['fisioterapeutas'], 2)
+        self.assertEqual(stats[self.filial_recife.id]['sessoesRealizadas'], 1)
+        self.assertEqual(stats[filial_extra.id]['totalPacientes'], 6)
+        self.assertEqual(stats[filial_extra.id]['sessoesRealizadas'], 6)
+        
+        ranking = {f['id']: f for f in data['rankingFisioterapeutas']}
+        self.assertEqual(ranking[self.fisio_recife_1.id]['pacientes'], 1)
+        self.assertEqual(ranking[self.fisio_recife_1.id]['sessoes'], 1)
+        self.assertEqual(ranking[self.fisio_recife_1.id]['filial'], self.filial_recife.nome)
+        
+        comparativo = {c['filial']: c['dados'] for c in data['comparativoFiliais']}
+        self.assertEqual(comparativo[filial_extra.nome][-1]['valor'], 6)
+
+
+class DashboardGestorFilialQueryCountTests(MultiFilialBaseTestCase):
+    """Dashboard do Gestor de Filial: número de consultas independente da equipe"""
+    
+    def setUp(self):
+        super().setUp()
+        from django.urls import reverse
+        self.url = reverse('dashboard-statistics-gestor-filial')
+        hoje = date.today()
+        for horario, dia in [(time(8, 0), hoje), (time(14, 0), hoje), (time(19, 0), hoje - timedelta(days=2))]:
+            PhysioSession.objects.create(
+                patient=self.paciente_recife_1, fisioterapeuta=self.fisio_recife_1, clinica=self.clinica,
+                scheduled_date=dia, scheduled_time=horario, status='REALIZADA'
+            )
+        self.paciente_olinda.transfer_to(self.fisio_recife_2, transferred_by=self.gestor_geral)
+    
+    def _ampliar_equipe(self, indice):
+        """Fisioterapeuta e atendente novos na filial, com paciente, sessão e transferência interna"""
+        fisio = User.objects.create(
+            username=f'fisio_filial_{indice}', cpf=f'700.{indice:03d}.000-01', first_name='Fisio',
+            last_name=f'Filial {indice}', clinica=self.clinica, filial=self.filial_recife, user_type='FISIOTERAPEUTA'
+        )
+        User.objects.create(
+            username=f'atendente_filial_{indice}', cpf=f'701.{indice:03d}.000-01',
+            clinica=self.clinica, filial=self.filial_recife, user_type='ATENDENTE'
+        )
+        paciente = Patient.objects.create(
+            clinica=self.clinica, filial=self.filial_recife, fisioterapeuta=self.fisio_recife_1,
+            full_name=f'Paciente Filial {indice}', cpf=f'702.{indice:03d}.000-01',
+            birth_date=date(1990, 1, 1), phone='(81) 98888-0000'
+        )
+        PhysioSession.objects.create(
+            patient=paciente, fisioterapeuta=fisio, clinica=self.clinica,
+            scheduled_date=date.today(), scheduled_time=time(10, 0), status='REALIZADA'
+        )
+        paciente.transfer_to(fisio, transferred_by=self.gestor_recife)
+    
+    def _get_dashboard(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        from authentication.current_user import clear_user_cache
+        
+        clear_user_cache()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, HTTP_X_USER_ID=self.gestor_recife.id)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+    
+    def test_query_count_independe_da_equipe(self):
+        queries_equipe_pequena, _ = self._get_dashboard()
+        for indice in range(5):
+            self._ampliar_equipe(indice)
+        queries_equipe_grande, data = self._get_dashboard()
+        
+        self.assertEqual(queries_equipe_pequena, queries_equipe_grande)
+        self.assertEqual(data['totalFisioterapeutas'], 7)
+        self.assertEqual(len(data['equipeAtendentes']), 5)
+    
+    def test_metricas_da_filial(self):
+        self._ampliar_equipe(0)
+        _, data = self._get_dashboard()
+        
+        self.assertEqual(data['sessoesHoje'], 3)
+        self.assertEqual(data['distribuicaoSessoes'], {'manha': 2, 'tarde': 1, 'noite': 1})
+        # Uma transferência inter-filial (Olinda -> Recife) e uma interna
+        self.assertEqual(data['totalTransferenciasMes'], 2)
+        self.assertEqual(
+            sorted((t['tipo'], t['inter_filial']) for t in data['transferenciasRecentes']),
+            [('entrada', False), ('entrada', True)]
+        )
+        equipe = {fisio['id']: fisio for fisio in data['equipeFisioterapeutas']}
+        self.assertEqual(equipe[self.fisio_recife_1.id]['sessoes_mes'], 3)
+        self.assertEqual(equipe[self.fisio_recife_2.id]['pacientes'], 2)
+        top = {paciente['nome']: paciente['sessoes'] for paciente in data['topPacientes']}
+        self.assertEqual(top['Paciente Recife 1'], 3)
+
+
+class DashboardFisioterapeutaQueryCountTests(MultiFilialBaseTestCase):
+    """Dashboard do Fisioterapeuta: número de consultas independente da carteira de pacientes"""
+    
+    def setUp(self):
+        super().setUp()
+        from django.urls import reverse
+        self.url = reverse('dashboard-statistics-fisioterapeuta')
+    
+    def _novo_paciente(self, indice):
+        paciente = Patient.objects.create(
+            clinica=self.clinica, filial=self.filial_recife, fisioterapeuta=self.fisio_recife_1,
+            full_name=f'Paciente Agenda {indice}', cpf=f'710.{indice:03d}.000-01',
+            birth_date=date(1990, 1, 1), phone='(81) 98888-0000'
+        )
+        PhysioSession.objects.create(
+            patient=paciente, fisioterapeuta=self.fisio_recife_1, clinica=self.clinica,
+            scheduled_date=date.today(), scheduled_time=time(8 + indice, 0)
+        )
+        for record_type in ['AVALIACAO', 'EVOLUCAO', 'EVOLUCAO']:
+            MedicalRecord.objects.create(patient=paciente, record_type=record_type, title=record_type)
+    
+    def _get_dashboard(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from authentication.current_user import clear_user_cache
+        
+        clear_user_cache()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, HTTP_X_USER_ID=self.fisio_recife_1.id)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+    
+    def test_query_count_independe_dos_pacientes(self):
+        self._novo_paciente(0)
+        queries_poucos, _ = self._get_dashboard()
+        for indice in range(1, 5):
+            self._novo_paciente(indice)
+        queries_muitos, data = self._get_dashboard()
+        
+        self.assertEqual(queries_poucos, queries_muitos)
+        self.assertEqual(
+            [sessao['patient_name'] for sessao in data['upcomingSessions']],
+            [f'Paciente Agenda {indice}' for indice in range(5)]
+        )
+        distribuicao = {item['name']: item['value'] for item in data['serviceDistribution']}
+        self.assertEqual(distribuicao, {'Evoluções': 66.7, 'Avaliações': 33.3})
+
+
+class DailyMetricRollupTests(MultiFilialBaseTestCase):
+    """Testes do rollup diário (DailyMetric) mantido por signals"""
+    
+    def _valor(self, metric, **filtros):
+        from django.db.models import Sum
+        from prontuario.models import DailyMetric
+        return DailyMetric.objects.filter(metric=metric, **filtros).aggregate(
+            total=Sum('value', default=0)
+        )['total']
+    
+    def _snapshot(self):
+        from prontuario.models import DailyMetric
+        return sorted(DailyMetric.objects.values_list(
+            'metric', 'clinica_id', 'filial_id', 'fisioterapeuta_id', 'day', 'value'
+        ))
+    
+    def test_cadastro_de_pacientes_alimenta_rollup(self):
+        """Pacientes criados no setUp aparecem no bucket de hoje por filial"""
+        self.assertEqual(self._valor('PACIENTES_NOVOS', clinica=self.clinica), 3)
+        self.assertEqual(self._valor('PACIENTES_NOVOS', filial=self.filial_recife), 2)
+        self.assertEqual(self._valor('PACIENTES_NOVOS', fisioterapeuta=self.fisio_olinda), 1)
+    
+    def test_sessao_conta_somente_quando_realizada(self):
+        """Mudança de status recalcula o bucket de sessões realizadas"""
+        sessao = PhysioSession.objects.create(
+            patient=self.paciente_recife_1,
+            fisioterapeuta=self.fisio_recife_1,
+            clinica=self.clinica,
+            scheduled_date=date.today(),
+            scheduled_time=time(9, 0),
+            status='AGENDADA'
+        )
+        self.assertEqual(self._valor('SESSOES_REALIZADAS'), 0)
+        
+        sessao.status = 'REALIZADA'
+        sessao.save()
+        self.assertEqual(self._valor('SESSOES_REALIZADAS', fisioterapeuta=self.fisio_recife_1), 1)
+        
+        sessao.delete()
+        self.assertEqual(self._valor('SESSOES_REALIZADAS'), 0)
+    
+    def test_transferencia_move_metricas_do_paciente(self):
+        """Transferência entre filiais move pacientes e prontuários para a nova filial"""
+        MedicalRecord.objects.create(
+            patient=self.paciente_recife_1,
+            record_type='CONSULTA',
+            title='Avaliação inicial',
+            created_by=self.fisio_recife_1
+        )
+        self.assertEqual(self._valor('PRONTUARIOS', filial=self.filial_recife), 1)
+        
+        self.paciente_recife_1.transfer_to(
+            new_fisioterapeuta=self.fisio_olinda,
+            transferred_by=self.gestor_geral
+        )
+        
+        self.assertEqual(self._valor('PRONTUARIOS', filial=self.filial_recife), 0)
+        self.assertEqual(self._valor('PRONTUARIOS', filial=self.filial_olinda), 1)
+        self.assertEqual(self._valor('CONSULTAS', fisioterapeuta=self.fisio_olinda), 1)
+        self.assertEqual(self._valor('PACIENTES_NOVOS', filial=self.filial_olinda), 2)
+        self.assertEqual(self._valor('TRANSFERENCIAS', filial=self.filial_olinda), 1)
+
+    def test_troca_de_filial_move_sessao_de_outro_fisioterapeuta(self):
+        """A sessão feita por outro fisioterapeuta acompanha a filial do paciente"""
+        from django.core.management import call_command
+
+        PhysioSession.objects.create(
+            patient=self.paciente_recife_1,
+            fisioterapeuta=self.fisio_recife_2,
+            clinica=self.clinica,
+            scheduled_date=date.today(),
+            scheduled_time=time(10, 0),
+            status='REALIZADA'
+        )
+        self.assertNotEqual(self.paciente_recife_1.fisioterapeuta, self.fisio_recife_2)
+
+        self.paciente_recife_1.filial = self.filial_olinda
+        self.paciente_recife_1.save()
+
+        self.assertEqual(self._valor('SESSOES_REALIZADAS', filial=self.filial_recife), 0)
+        self.assertEqual(
+            self._valor('SESSOES_REALIZADAS', filial=self.filial_olinda, fisioterapeuta=self.fisio_recife_2), 1
+        )
+        incremental = self._snapshot()
+        call_command('rebuild_metrics', stdout=StringIO())
+        self.assertEqual(self._snapshot(), incremental)
+    
+    def test_rebuild_metrics_reproduz_rollup_incremental(self):
+        """O comando rebuild_metrics gera as mesmas linhas mantidas pelos signals"""
+        from django.core.management import call_command
+        from prontuario.models import DailyMetric
+        
+        PhysioSession.objects.create(
+            patient=self.paciente_olinda,
+            fisioterapeuta=self.fisio_olinda,
+            clinica=self.clinica,
+            scheduled_date=date.today(),
+            scheduled_time=time(14, 0),
+            status='REALIZADA'
+        )
+        incremental = self._snapshot()
+        
+        DailyMetric.objects.all().delete()
+        call_command('rebuild_metrics', stdout=StringIO())
+        
+        self.assertEqual(self._snapshot(), incremental)
+
+    def test_bucket_sem_filial_nem_fisioterapeuta_e_unico(self):
+        """Filial/fisioterapeuta nulos não permitem dois buckets iguais"""
+        from django.db import IntegrityError, transaction
+        from prontuario.models import DailyMetric
+
+        DailyMetric.objects.create(clinica=self.clinica, day=date.today(), metric='DOCUMENTOS', value=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DailyMetric.objects.create(clinica=self.clinica, day=date.today(), metric='DOCUMENTOS', value=1)
+
+    def test_refresh_bucket_tolera_insercao_concorrente(self):
+        """Se outra transação cria o bucket antes, o recálculo atualiza a linha existente"""
+        from unittest import mock
+        from django.db import transaction
+        from prontuario.metrics import refresh_bucket
+        from prontuario.models import DailyMetric
+
+        key = ('PACIENTES_NOVOS', self.clinica.id, self.filial_recife.id, self.fisio_recife_1.id, date.today())
+        lookup = dict(zip(['metric', 'clinica_id', 'filial_id', 'fisioterapeuta_id', 'day'], key))
+        DailyMetric.objects.filter(**lookup).delete()
+        atomic = transaction.atomic
+        gravado = []
+
+        def concorrente(*args, **kwargs):
+            # A outra transação grava o bucket logo antes do INSERT deste recálculo
+            if not gravado:
+                gravado.append(True)
+                DailyMetric.objects.bulk_create([DailyMetric(**lookup, value=99)])
+            return atomic(*args, **kwargs)
+
+        with mock.patch('prontuario.metrics.transaction.atomic', side_effect=concorrente):
+            refresh_bucket(*key)
+
+        self.assertTrue(gravado)
+        self.assertEqual(list(DailyMetric.objects.filter(**lookup).values_list('value', flat=True)), [1])
+
+
+class DashboardCacheTests(MultiFilialBaseTestCase):
+    """Testes do cache das respostas dos dashboards"""
+    
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        from django.urls import reverse
+        cache.clear()
+        self.url_gestor = reverse('dashboard-statistics-gestor')
+        self.url_filial = reverse('dashboard-statistics-gestor-filial')
+    
+    def _get(self, url, user, **headers):
+        return self.client.get(url, headers={'X-User-Id': str(user.id), **headers})
+    
+    def test_segunda_requisicao_vem_do_cache_sem_sql(self):
+        """Com o cache preenchido, o dashboard não faz nenhuma consulta SQL"""
+        primeira = self._get(self.url_gestor, self.gestor_geral)
+        self.assertEqual(primeira['X-Dashboard-Cache'], 'MISS')
+        
+        with self.assertNumQueries(0):
+            segunda = self._get(self.url_gestor, self.gestor_geral)
+        
+        self.assertEqual(segunda['X-Dashboard-Cache'], 'HIT')
+        self.assertEqual(segunda.json(), primeira.json())
+        self.assertEqual(segunda['ETag'], primeira['ETag'])
+    
+    def test_etag_igual_retorna_304(self):
+        """If-None-Match com o ETag atual responde 304 sem corpo"""
+        etag = self._get(self.url_gestor, self.gestor_geral)['ETag']
+        
+        response = self._get(self.url_gestor, self.gestor_geral, **{'If-None-Match': etag})
+        
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+    
+    def test_gravacao_invalida_dashboards_da_clinica(self):
+        """Um novo paciente invalida o cache e muda o ETag"""
+        antes = self._get(self.url_gestor, self.gestor_geral)
+        
+        Patient.objects.create(
+            clinica=self.clinica,
+            filial=self.filial_olinda,
+            fisioterapeuta=self.fisio_olinda,
+            full_name="Paciente Novo",
+            cpf="402.000.000-01",
+            birth_date=date(1995, 3, 3),
+            phone="(81) 98888-0004"
+        )
+        depois = self._get(self.url_gestor, self.gestor_geral, **{'If-None-Match': antes['ETag']})
+        
+        self.assertEqual(depois.status_code, status.HTTP_200_OK)
+        self.assertEqual(depois['X-Dashboard-Cache'], 'MISS')
+        self.assertEqual(depois.json()['totalPacientes'], antes.json()['totalPacientes'] + 1)
+        self.assertNotEqual(depois['ETag'], antes['ETag'])
+    
+    def test_chave_separa_filial_e_usuario(self):
+        """Gestores de filiais diferentes não compartilham a mesma resposta"""
+        recife = self._get(self.url_filial, self.gestor_recife)
+        olinda = self._get(self.url_filial, self.gestor_olinda)
+        
+        self.assertEqual(olinda['X-Dashboard-Cache'], 'MISS')
+        self.assertEqual(recife.json()['filial']['id'], self.filial_recife.id)
+        self.assertEqual(olinda.json()['filial']['id'], self.filial_olinda.id)
+
+
+class MonthlySeriesTests(MultiFilialBaseTestCase):
+    """Testes das séries mensais dos gráficos de tendência"""
+    
+    def test_meses_do_calendario_no_fim_do_mes(self):
+        """31/03 não repete março nem pula fevereiro; a virada do ano é respeitada"""
+        from prontuario.metrics import month_starts
+        
+        self.assertEqual(month_starts(2, date(2025, 3, 31)), [date(2025, 2, 1), date(2025, 3, 1)])
+        self.assertEqual(
+            month_starts(3, date(2025, 1, 15)),
+            [date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1)]
+        )
+    
+    def test_serie_em_uma_consulta_com_meses_zerados(self):
+        """Uma consulta agrupada; meses sem registros aparecem com zero"""
+        from datetime import datetime, timedelta
+        from django.utils import timezone
+        from prontuario.metrics import monthly_series
+        
+        inicio_mes = timezone.localdate().replace(day=1)
+        mes_passado = timezone.make_aware(datetime.combine(inicio_mes - timedelta(days=1), time(23, 0)))
+        Patient.objects.filter(pk=self.paciente_olinda.pk).update(created_at=mes_passado)
+        
+        with self.assertNumQueries(1):
+            serie = monthly_series(Patient.objects.all(), 'created_at', 4)
+        
+        self.assertEqual(len(serie), 4)
+        self.assertEqual(serie[-1], (inicio_mes, 2))
+        self.assertEqual(serie[-2], ((inicio_mes - timedelta(days=1)).replace(day=1), 1))
+        self.assertEqual([valor for _, valor in serie[:2]], [0, 0])
+    
+    def test_serie_por_filial(self):
+        """Com `by`, cada filial tem sua série; filiais sem registros vêm zeradas"""
+        from prontuario.metrics import monthly_series
+        
+        series = monthly_series(Patient.objects.all(), 'created_at', 3, by='filial')
+        
+        self.assertEqual(series[self.filial_recife.id][-1][1], 2)
+        self.assertEqual(series[self.filial_olinda.id][-1][1], 1)
+        self.assertEqual([valor for _, valor in series[-1]], [0, 0, 0])
+
+
+class FullTextSearchTests(MultiFilialBaseTestCase):
+    """Testes da busca textual (FTS5) de pacientes e prontuários"""
+    
+    def setUp(self):
+        super().setUp()
+        self.prontuario_recife = MedicalRecord.objects.create(
+            patient=self.paciente_recife_1,
+            record_type='AVALIACAO',
+            title='Avaliação de lombalgia',
+            diagnosis='Lombalgia crônica com irradiação',
+            chief_complaint='Dor nas costas'
+        )
+        self.prontuario_olinda = MedicalRecord.objects.create(
+            patient=self.paciente_olinda,
+            record_type='EVOLUCAO',
+            title='Evolução semanal',
+            observations='Paciente relata lombalgia menor'
+        )
+    
+    def _buscar_prontuarios(self, termo, usuario):
+        response = self.client.get(
+            '/api/prontuario/medical-records/search/', {'q': termo}, HTTP_X_USER_ID=str(usuario.id)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        return [item['id'] for item in data.get('results', data)]
+    
+    def test_prontuarios_ordenados_por_relevancia_sem_acentos(self):
+        """Título e diagnóstico pesam mais que observações; 'cronica' encontra 'crônica'"""
+        self.assertEqual(
+            self._buscar_prontuarios('lombalgia', self.gestor_geral),
+            [self.prontuario_recife.id, self.prontuario_olinda.id]
+        )
+        self.assertEqual(self._buscar_prontuarios('cronica irradia', self.gestor_geral), [self.prontuario_recife.id])
+    
+    def test_prontuarios_filtrados_pelo_usuario(self):
+        self.assertEqual(self._buscar_prontuarios('lombalgia', self.fisio_olinda), [self.prontuario_olinda.id])
+        self.assertEqual(self._buscar_prontuarios('lombalgia', self.fisio_recife_2), [])
+    
+    def test_signals_mantem_indice_atualizado(self):
+        self.prontuario_recife.diagnosis = 'Cervicalgia'
+        self.prontuario_recife.title = 'Avaliação cervical'
+        self.prontuario_recife.save()
+        self.assertEqual(self._buscar_prontuarios('lombalgia', self.gestor_geral), [self.prontuario_olinda.id])
+        self.assertEqual(self._buscar_prontuarios('cervical', self.gestor_geral), [self.prontuario_recife.id])
+        
+        self.prontuario_olinda.delete()
+        self.assertEqual(self._buscar_prontuarios('lombalgia', self.gestor_geral), [])
+    
+    def test_busca_de_pacientes_por_prefixo(self):
+        response = self.client.get(
+            '/api/prontuario/patients/search/', {'q': 'pac olin'}, HTTP_X_USER_ID=str(self.gestor_geral.id)
+        )
+        self.assertEqual([p['id'] for p in response.json()['results']], [self.paciente_olinda.id])
+        
+        # Gestor da filial Recife não enxerga pacientes de Olinda
+        response = self.client.get(
+            '/api/prontuario/patients/search/', {'q': 'olinda'}, HTTP_X_USER_ID=str(self.gestor_recife.id)
+        )
+        self.assertEqual(response.json()['results'], [])
+    
+    def test_rebuild_search_index_apos_carga_em_massa(self):
+        """bulk_create não dispara signals; o comando reconstrói o índice"""
+        from django.core.management import call_command
+        
+        MedicalRecord.objects.bulk_create([
+            MedicalRecord(patient=self.paciente_recife_2, record_type='EXAME', title='Tendinite patelar')
+        ])
+        self.assertEqual(self._buscar_prontuarios('tendinite', self.gestor_geral), [])
+        
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('medical_records: 3 registros indexados', out.getvalue())
+        self.assertEqual(len(self._buscar_prontuarios('tendinite', self.gestor_geral)), 1)
+
+
+class CurrentUserResolverTests(MultiFilialBaseTestCase):
+    """Testes do resolvedor do usuário atual (authentication/current_user.py)"""
+    
+    def setUp(self):
+        from authentication.current_user import clear_user_cache
+        super().setUp()
+        clear_user_cache()
+    
+    def _consultas_de_usuario(self, url, usuario):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, HTTP_X_USER_ID=str(usuario.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Consultas do usuário atual: users com clínica e filial (select_related)
+        return [q['sql'] for q in ctx.captured_queries
+                if 'FROM "authentication_user" INNER JOIN "authentication_clinica"' in q['sql']]
+    
+    def test_usuario_resolvido_uma_vez_com_clinica_e_filial(self):
+        from django.contrib.auth.models import AnonymousUser
+        from django.test.client import RequestFactory
+        from authentication.current_user import get_current_user
+        
+        request = RequestFactory().get('/', HTTP_X_USER_ID=str(self.fisio_recife_1.id))
+        request.user = AnonymousUser()
+        
+        with self.assertNumQueries(1):
+            user = get_current_user(request)
+            self.assertIs(get_current_user(request), user)
+            self.assertEqual(user.clinica.nome, self.clinica.nome)
+            self.assertEqual(user.filial.nome, self.filial_recife.nome)
+    
+    def test_no_maximo_uma_consulta_de_autenticacao_por_requisicao(self):
+        url = '/api/prontuario/sessions/'
+        self.assertEqual(len(self._consultas_de_usuario(url, self.fisio_recife_1)), 1)
+        # Requisições seguintes usam o cache do processo
+        self.assertEqual(self._consultas_de_usuario(url, self.fisio_recife_1), [])
+        self.assertEqual(self._consultas_de_usuario('/api/prontuario/patients/', self.fisio_recife_1), [])
+    
+    def test_alteracao_do_usuario_invalida_o_cache(self):
+        url = '/api/prontuario/patients/'
+        response = self.client.get(url, HTTP_X_USER_ID=str(self.gestor_recife.id))
+        self.assertEqual(response.json()['count'], 2)
+        
+        self.gestor_recife.filial = self.filial_olinda
+        self.gestor_recife.save()
+        response = self.client.get(url, HTTP_X_USER_ID=str(self.gestor_recife.id))
+        self.assertEqual(response.json()['count'], 1)
+        
+        self.gestor_recife.is_active_user = False
+        self.gestor_recife.save()
+        response = self.client.get('/api/prontuario/transfer-requests/', HTTP_X_USER_ID=str(self.gestor_recife.id))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TenantScopedManagerTests(MultiFilialBaseTestCase):
+    """Testes do for_user (authentication/tenancy.py) e dos índices compostos"""
+    
+    def setUp(self):
+        super().setUp()
+        hoje = date.today()
+        for paciente, fisio in [
+            (self.paciente_recife_1, self.fisio_recife_1),
+            (self.paciente_recife_2, self.fisio_recife_2),
+            (self.paciente_olinda, self.fisio_olinda),
+        ]:
+            PhysioSession.objects.create(
+                patient=paciente, fisioterapeuta=fisio, clinica=self.clinica,
+                scheduled_date=hoje, scheduled_time=time(9, 0), status='AGENDADA'
+            )
+            TreatmentPlan.objects.create(
+                patient=paciente, fisioterapeuta=fisio, clinica=self.clinica,
+                title='Plano', objectives='Reduzir dor', total_sessions=10,
+                start_date=hoje
+            )
+    
+    def test_regras_de_papel(self):
+        self.assertEqual(Patient.objects.for_user(self.gestor_geral).count(), 3)
+        self.assertEqual(Patient.objects.for_user(self.gestor_recife).count(), 2)
+        self.assertEqual(list(Patient.objects.for_user(self.fisio_olinda)), [self.paciente_olinda])
+        self.assertEqual(Patient.objects.for_user(None).count(), 0)
+        
+        # Modelos sem filial: gestor de filial vê a clínica; fisioterapeuta, os próprios registros
+        self.assertEqual(PhysioSession.objects.for_user(self.gestor_recife).count(), 3)
+        self.assertEqual(PhysioSession.objects.for_user(self.fisio_recife_2).get().patient, self.paciente_recife_2)
+        self.assertEqual(TreatmentPlan.objects.filter(status='ATIVO').for_user(self.fisio_olinda).count(), 1)
+    
+    def _plano(self, queryset):
+        from django.db import connection
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plano de execução verificado apenas no SQLite')
+        return queryset.explain()
+    
+    def test_consultas_frequentes_usam_indices_compostos(self):
+        hoje = date.today()
+        casos = [
+            (Patient.objects.for_user(self.gestor_recife).filter(is_active=True), 'patient_clinica_filial_idx'),
+            (Patient.objects.for_user(self.fisio_recife_1).filter(is_active=True), 'patient_fisio_active_idx'),
+            # Contagens sem ordenação (a listagem ordenada usa os índices do cursor)
+            (PhysioSession.objects.for_user(self.fisio_recife_1).filter(scheduled_date=hoje, status='AGENDADA').order_by(),
+             'session_fisio_date_idx'),
+            (PhysioSession.objects.for_user(self.gestor_geral).filter(scheduled_date=hoje, status='AGENDADA').order_by(),
+             'session_clinica_date_idx'),
+            (TreatmentPlan.objects.for_user(self.fisio_olinda).filter(status='ATIVO'), 'plan_fisio_status_idx'),
+            (TreatmentPlan.objects.for_user(self.gestor_geral).filter(status='ATIVO'), 'plan_clinica_status_idx'),
+        ]
+        for queryset, indice in casos:
+            with self.subTest(indice=indice):
+                self.assertIn(indice, self._plano(queryset))
+
+
+class ListQueryCountTests(MultiFilialBaseTestCase):
+    """Listagens: número de consultas constante (1 vs 500 registros)"""
+    
+    MANY = 500
+    
+    def setUp(self):
+        super().setUp()
+        from estoque.models import InventoryCategory
+        self.category = DocumentCategory.objects.create(name='Exames')
+        self.inventory_category = InventoryCategory.objects.create(clinica=self.clinica, name='Materiais')
+        self.plan = TreatmentPlan.objects.create(
+            patient=self.paciente_recife_1, fisioterapeuta=self.fisio_recife_1, clinica=self.clinica,
+            title='Plano', objectives='Reduzir dor', total_sessions=10, start_date=date.today()
+        )
+    
+    def _get(self, url):
+        from authentication.current_user import clear_user_cache
+        # Cache do usuário vazio nas duas medições
+        clear_user_cache()
+        response = self.client.get(url, HTTP_X_USER_ID=self.gestor_geral.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+    
+    def _assert_consultas_constantes(self, url, criar):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        criar(0, 1)
+        with CaptureQueriesContext(connection) as consultas:
+            self._get(url)
+        
+        criar(1, self.MANY)
+        with self.assertNumQueries(len(consultas)):
+            data = self._get(url)
+        self.assertGreaterEqual(data['count'], self.MANY)
+        self.assertEqual(len(data['results']), 20)
+        return data
+    
+    def test_pacientes(self):
+        def criar(inicio, fim):
+            Patient.objects.bulk_create([
+                Patient(
+                    clinica=self.clinica, filial=self.filial_recife, fisioterapeuta=self.fisio_recife_1,
+                    full_name=f'Paciente Lote {i:03d}', cpf=f'700.000.{i:03d}-00',
+                    birth_date=date(1990, 1, 1), phone='(81) 90000-0000'
+                ) for i in range(inicio, fim)
+            ])
+        data = self._assert_consultas_constantes('/api/prontuario/patients/', criar)
+        self.assertTrue(all(row['fisioterapeuta_name'] and row['filial_nome'] for row in data['results']))
+    
+    def test_planos_de_tratamento(self):
+        def criar(inicio, fim):
+            planos = TreatmentPlan.objects.bulk_create([
+                TreatmentPlan(
+                    patient=self.paciente_recife_1, fisioterapeuta=self.fisio_recife_1, clinica=self.clinica,
+                    title=f'Plano {i}', objectives='Reduzir dor', total_sessions=4, start_date=date.today()
+                ) for i in range(inicio, fim)
+            ])
+            PhysioSession.objects.bulk_create([
+                PhysioSession(
+                    patient=self.paciente_recife_1, fisioterapeuta=self.fisio_recife_1, clinica=self.clinica,
+                    treatment_plan=plano, scheduled_date=date.today(), scheduled_time=time(8, 0),
+                    status='REALIZADA'
+                ) for plano in planos
+            ])
+            # bulk_create não dispara os signals do contador
+            TreatmentPlan.refresh_completed_sessions(plano.pk for plano in planos)
+        data = self._assert_consultas_constantes('/api/prontuario/treatment-plans/', criar)
+        # 1 de 4 sessões realizadas em cada plano do lote
+        self.assertIn(25, [row['progress'] for row in data['results']])
+    
+    def test_sessoes(self):
+        def criar(inicio, fim):
+            PhysioSession.objects.bulk_create([
+                PhysioSession(
+                    patient=self.paciente_recife_1, fisioterapeuta=self.fisio_recife_1, clinica=self.clinica,
+                    treatment_plan=self.plan, scheduled_date=date.today(), scheduled_time=time(8, 0)
+                ) for _ in range(inicio, fim)
+            ])
+        self._assert_consultas_constantes('/api/prontuario/sessions/', criar)
+    
+    def test_altas(self):
+        def criar(inicio, fim):
+            Discharge.objects.bulk_create([
+                Discharge(
+                    patient=self.paciente_recife_1, fisioterapeuta=self.fisio_recife_1, clinica=self.clinica,
+                    treatment_plan=self.plan, reason='MELHORA',
+                    discharge_date=date.today(), final_evaluation='Evolução completa'
+                ) for _ in range(inicio, fim)
+            ])
+        self._assert_consultas_constantes('/api/prontuario/discharges/', criar)
+    
+    def test_prontuarios(self):
+        def criar(inicio, fim):
+            MedicalRecord.objects.bulk_create([
+                MedicalRecord(
+                    patient=self.paciente_recife_1, created_by=self.fisio_recife_1,
+                    record_type='EVOLUCAO', title=f'Evolução {i}'
+                ) for i in range(inicio, fim)
+            ])
+        self._assert_consultas_constantes('/api/prontuario/medical-records/', criar)
+    
+    def test_documentos(self):
+        def criar(inicio, fim):
+            Document.objects.bulk_create([
+                Document(
+                    patient=self.paciente_recife_1, category=self.category, title=f'Exame {i}',
+                    document_type='EXAME', file=f'documents/patient_{self.paciente_recife_1.id}/exame_{i}.pdf'
+                ) for i in range(inicio, fim)
+            ])
+        self._assert_consultas_constantes('/api/documentos/documents/', criar)
+    
+    def test_itens_de_estoque(self):
+        from estoque.models import InventoryItem
+        
+        def criar(inicio, fim):
+            InventoryItem.objects.bulk_create([
+                InventoryItem(clinica=self.clinica, category=self.inventory_category, name=f'Item {i:03d}')
+                for i in range(inicio, fim)
+            ])
+        data = self._assert_consultas_constantes('/api/estoque/items/', criar)
+        self.assertEqual(data['results'][0]['category_name'], 'Materiais')
+
+
+class TreatmentPlanProgressTests(MultiFilialBaseTestCase):
+    """Contador de sessões realizadas do plano (TreatmentPlan.completed_sessions)"""
+    
+    def setUp(self):
+        super().setUp()
+        self.plan = TreatmentPlan.objects.create(
+            patient=self.paciente_recife_1, fisioterapeuta=self.fisio_recife_1, clinica=self.clinica,
+            title='Plano', objectives='Reduzir dor', total_sessions=4, start_date=date.today()
+        )
+        self.sessions = [
+            PhysioSession.objects.create(
+                patient=self.paciente_recife_1, fisioterapeuta=self.fisio_recife_1, clinica=self.clinica,
+                treatment_plan=self.plan, scheduled_date=date.today(), scheduled_time=time(8 + i, 0)
+            ) for i in range(3)
+        ]
+    
+    def _contador(self, plan=None):
+        return TreatmentPlan.objects.values_list('completed_sessions', flat=True).get(pk=(plan or self.plan).pk)
+    
+    def test_complete_atualiza_contador(self):
+        response = self.client.post(
+            f'/api/prontuario/sessions/{self.sessions[0].id}/complete/',
+            HTTP_X_USER_ID=self.fisio_recife_1.id
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._contador(), 1)
+        
+        plan = TreatmentPlan.objects.get(pk=self.plan.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(plan.progress_percentage, 25)
+    
+    def test_mudancas_de_status_plano_e_exclusao(self):
+        for session in self.sessions:
+            session.status = 'REALIZADA'
+            session.save()
+        self.assertEqual(self._contador(), 3)
+        
+        # Sessão realizada desfeita
+        self.sessions[0].status = 'CANCELADA'
+        self.sessions[0].save()
+        self.assertEqual(self._contador(), 2)
+        
+        # Sessão movida para outro plano
+        outro = TreatmentPlan.objects.create(
+            patient=self.paciente_recife_1, fisioterapeuta=self.fisio_recife_1, clinica=self.clinica,
+            title='Outro', objectives='Fortalecer', total_sessions=2, start_date=date.today()
+        )
+        self.sessions[1].treatment_plan = outro
+        self.sessions[1].save()
+        self.assertEqual(self._contador(), 1)
+        self.assertEqual(self._contador(outro), 1)
+        
+        self.sessions[2].delete()
+        self.assertEqual(self._contador(), 0)
+    
+    def test_comando_de_reparo(self):
+        from django.core.management import call_command
+        
+        PhysioSession.objects.filter(pk=self.sessions[0].pk).update(status='REALIZADA')
+        self.assertEqual(self._contador(), 0)
+        
+        out = StringIO()
+        call_command('repair_plan_progress', '--check', stdout=out)
+        self.assertIn('1 planos divergentes', out.getvalue())
+        self.assertEqual(self._contador(), 0)
+        
+        call_command('repair_plan_progress', stdout=StringIO())
+        self.assertEqual(self._contador(), 1)
+
+
+class CursorPaginationTests(MultiFilialBaseTestCase):
+    """Paginação por cursor (?cursor=) das listagens de alto volume"""
+    
+    def setUp(self):
+        super().setUp()
+        from datetime import timedelta
+        hoje = date.today()
+        # Vários empates de data e horário: o id desempata
+        PhysioSession.objects.bulk_create([
+            PhysioSession(
+                patient=self.paciente_recife_1, fisioterapeuta=self.fisio_recife_1, clinica=self.clinica,
+                scheduled_date=hoje - timedelta(days=i % 5), scheduled_time=time(8 + i % 3, 0)
+            ) for i in range(53)
+        ])
+    
+    def _percorrer(self, url):
+        """Segue os links `next` e devolve os ids na ordem recebida"""
+        ids, paginas = [], 0
+        while url:
+            response = self.client.get(url, HTTP_X_USER_ID=self.gestor_geral.id)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json()
+            self.assertNotIn('count', data)
+            ids += [row['id'] for row in data['results']]
+            url = data['next']
+            paginas += 1
+        return ids, paginas
+    
+    def test_sessoes_percorridas_sem_repeticao_na_ordem_da_agenda(self):
+        ids, paginas = self._percorrer('/api/prontuario/sessions/?cursor=')
+        esperado = list(
+            PhysioSession.objects.order_by('-scheduled_date', '-scheduled_time', '-pk').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, esperado)
+        self.assertEqual(paginas, 3)
+    
+    def test_ordering_do_usuario_e_respeitado(self):
+        ids, _ = self._percorrer('/api/prontuario/sessions/?cursor=&ordering=scheduled_time')
+        esperado = list(PhysioSession.objects.order_by('scheduled_time', 'pk').values_list('id', flat=True))
+        self.assertEqual(ids, esperado)
+    
+    def test_sem_cursor_mantem_paginacao_por_numero(self):
+        response = self.client.get('/api/prontuario/sessions/', HTTP_X_USER_ID=self.gestor_geral.id)
+        self.assertEqual(response.json()['count'], 53)
+    
+    def test_paginas_profundas_custam_o_mesmo(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        url = '/api/prontuario/sessions/?cursor='
+        consultas = []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                url = self.client.get(url, HTTP_X_USER_ID=self.gestor_geral.id).json()['next']
+            consultas.append(len(ctx))
+        self.assertEqual(len(set(consultas[1:])), 1)
+        self.assertTrue(all('OFFSET' not in q['sql'] and 'COUNT(' not in q['sql'] for q in ctx.captured_queries))
+    
+    def test_cursor_invalido(self):
+        response = self.client.get('/api/prontuario/sessions/?cursor=xyz', HTTP_X_USER_ID=self.gestor_geral.id)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_historico_do_prontuario(self):
+        from prontuario.models import MedicalRecordHistory
+        record = MedicalRecord.objects.create(patient=self.paciente_recife_1, record_type='EVOLUCAO', title='Evolução')
+        MedicalRecordHistory.objects.bulk_create([
+            MedicalRecordHistory(medical_record=record, action='UPDATE', user=self.fisio_recife_1) for _ in range(25)
+        ])
+        url = f'/api/prontuario/medical-records/{record.id}/history/'
+        
+        # Sem cursor: lista completa, como antes
+        self.assertEqual(len(self.client.get(url).json()), 25)
+        
+        ids, paginas = self._percorrer(url + '?cursor=')
+        self.assertEqual(sorted(ids), sorted(record.history_logs.values_list('id', flat=True)))
+        self.assertEqual(paginas, 2)
+    
+    def test_transacoes_de_estoque(self):
+        from estoque.models import InventoryItem, InventoryTransaction
+        item = InventoryItem.objects.create(clinica=self.clinica, name='Eletrodo')
+        InventoryTransaction.objects.bulk_create([
+            InventoryTransaction(item=item, transaction_type='ENTRADA', quantity=1, quantity_before=i, quantity_after=i + 1)
+            for i in range(120)
+        ])
+        
+        # Sem cursor: as 100 últimas, paginadas por número
+        self.assertEqual(self.client.get('/api/estoque/transactions/').json()['count'], 100)
+        
+        ids, _ = self._percorrer(f'/api/estoque/transactions/?item={item.id}&cursor=')
+        self.assertEqual(len(set(ids)), 120)
+    
+    def test_consulta_da_agenda_usa_indice_do_cursor(self):
+        from django.db import connection
+        from prontuario.pagination import KeysetCursorPagination
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plano de execução verificado apenas no SQLite')
+        
+        paginator = KeysetCursorPagination()
+        ordering = ['-scheduled_date', '-scheduled_time', '-pk']
+        ultima = PhysioSession.objects.order_by(*ordering)[20]
+        valores = [ultima.scheduled_date, ultima.scheduled_time, ultima.pk]
+        queryset = PhysioSession.objects.for_user(self.gestor_geral).filter(
+            paginator.keyset_filter(ordering, valores)
+        ).order_by(*ordering)[:21]
+        self.assertIn('session_clinica_cursor_idx', queryset.explain())
+
+
+class SparseFieldsetTests(MultiFilialBaseTestCase):
+    """?fields=, ?omit= e ?expand= (prontuario/fieldsets.py)"""
+    
+    def _get(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, HTTP_X_USER_ID=self.gestor_geral.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json(), ' '.join(q['sql'] for q in ctx.captured_queries)
+    
+    def test_fields_reduz_payload_e_select(self):
+        data, sql = self._get('/api/prontuario/patients/?fields=id,full_name')
+        self.assertEqual(set(data['results'][0]), {'id', 'full_name'})
+        self.assertNotIn('"medical_history"', sql)
+        self.assertNotIn('"allergies"', sql)
+    
+    def test_omit_no_detalhe(self):
+        url = f'/api/prontuario/patients/{self.paciente_recife_1.id}/'
+        data, sql = self._get(url)
+        self.assertIn('transfer_history', data)
+        self.assertIn('"medical_history"', sql)
+        
+        data, sql = self._get(url + '?omit=transfer_history,medical_history,allergies')
+        self.assertNotIn('transfer_history', data)
+        self.assertNotIn('medical_history', data)
+        self.assertIn('age', data)
+        self.assertNotIn('"medical_history"', sql)
+        self.assertNotIn('prontuario_patienttransferhistory', sql)
+    
+    def test_listagem_de_documentos_nao_le_ocr_text(self):
+        # bulk_create: o save() do Document lê o tamanho do arquivo
+        Document.objects.bulk_create([Document(
+            patient=self.paciente_recife_1, title='Exame', document_type='EXAME',
+            file='documents/exame.pdf', ocr_text='texto longo ' * 1000
+        )])
+        data, sql = self._get('/api/documentos/documents/')
+        self.assertEqual(data['results'][0]['title'], 'Exame')
+        # Apenas o início do texto, via SUBSTR (ocr_snippet)
+        self.assertNotRegex(sql, r'(?<!SUBSTR\()"documentos_document"\."ocr_text"')
+        
+        data, sql = self._get(f"/api/documentos/documents/{data['results'][0]['id']}/?fields=id,ocr_text")
+        self.assertEqual(set(data), {'id', 'ocr_text'})
+        self.assertIn('"ocr_text"', sql)
+    
+    def test_expand_sem_consultas_por_linha(self):
+        def criar(total):
+            PhysioSession.objects.bulk_create([
+                PhysioSession(
+                    patient=self.paciente_recife_1, fisioterapeuta=self.fisio_recife_1, clinica=self.clinica,
+                    scheduled_date=date.today(), scheduled_time=time(8, 0)
+                ) for _ in range(total)
+            ])
+        
+        url = '/api/prontuario/sessions/?expand=patient&fields=id,patient,status'
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from authentication.current_user import clear_user_cache
+        
+        criar(1)
+        clear_user_cache()
+        with CaptureQueriesContext(connection) as ctx:
+            self._get(url)
+        criar(15)
+        clear_user_cache()
+        with self.assertNumQueries(len(ctx)):
+            data, _ = self._get(url)
+        
+        row = data['results'][0]
+        self.assertEqual(set(row), {'id', 'patient', 'status'})
+        self.assertEqual(row['patient']['full_name'], self.paciente_recife_1.full_name)
+        self.assertEqual(row['patient']['filial_nome'], self.filial_recife.nome)
+    
+    def test_listagem_e_busca_de_prontuarios_nao_leem_history(self):
+        MedicalRecord.objects.create(
+            patient=self.paciente_recife_1, record_type='EVOLUCAO', title='Lombalgia',
+            history='Histórico longo ' * 500
+        )
+        for url in ['/api/prontuario/medical-records/', '/api/prontuario/medical-records/search/?q=lombalgia']:
+            with self.subTest(url=url):
+                data, sql = self._get(url)
+                self.assertEqual(data['results'][0]['title'], 'Lombalgia')
+                self.assertNotIn('"prontuario_medicalrecord"."history"', sql)
+    
+    def test_escrita_ignora_parametros(self):
+        response = self.client.patch(
+            f'/api/prontuario/patients/{self.paciente_recife_1.id}/?fields=id',
+            {'notes': 'Atualizado'}, content_type='application/json',
+            HTTP_X_USER_ID=self.gestor_geral.id
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('full_name', response.json())
+
+
+class PatientImportTests(MultiFilialBaseTestCase):
+    """Importação em massa de pacientes (prontuario/patient_import.py)"""
+    
+    HEADER = 'nome;cpf;data_nascimento;telefone;email;fisioterapeuta\n'
+    
+    def _csv(self, lines):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return SimpleUploadedFile('pacientes.csv', (self.HEADER + ''.join(lines)).encode(), content_type='text/csv')
+    
+    def _post(self, user, lines, **data):
+        return self.client.post(
+            '/api/prontuario/patients/import/', {'file': self._csv(lines), **data},
+            HTTP_X_USER_ID=user.id
+        )
+    
+    def test_importa_linhas_validas_e_relata_erros(self):
+        from prontuario.search import PATIENT_INDEX
+        
+        response = self._post(self.gestor_geral, [
+            'Ana Import;501.000.000-01;15/03/1990;(81) 97777-0001;ana@teste.com;fisio_olinda_test\n',
+            'Bruno Import;502.000.000-01;1985-07-20;(81) 97777-0002;;\n',
+            f'Já Cadastrado;{self.paciente_recife_1.cpf};01/01/1990;(81) 97777-0003;;\n',
+            'Repetido;501.000.000-01;01/01/1990;(81) 97777-0004;;\n',
+            'Sem Data;503.000.000-01;;(81) 97777-0005;email-invalido;\n',
+            'Fisio Inexistente;504.000.000-01;01/01/1990;(81) 97777-0006;;nao_existe\n',
+        ], filial=self.filial_olinda.id)
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertEqual((data['total'], data['created']), (6, 2))
+        erros = {erro['line']: erro['errors'] for erro in data['errors']}
+        self.assertEqual(set(erros), {4, 5, 6, 7})
+        self.assertIn('cpf', erros[4])
+        self.assertIn('cpf', erros[5])
+        self.assertEqual(set(erros[6]), {'birth_date', 'email'})
+        self.assertIn('fisioterapeuta', erros[7])
+        
+        ana = Patient.objects.get(cpf='501.000.000-01')
+        self.assertEqual((ana.clinica, ana.filial, ana.fisioterapeuta), (self.clinica, self.filial_olinda, self.fisio_olinda))
+        self.assertEqual(ana.birth_date, date(1990, 3, 15))
+        # bulk_create não dispara signals: índice de busca atualizado pela importação
+        self.assertEqual(list(PATIENT_INDEX.search(Patient.objects.all(), 'bruno')), [Patient.objects.get(cpf='502.000.000-01')])
+    
+    def test_csv_do_excel_em_cp1252_e_arquivo_invalido(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        
+        conteudo = (self.HEADER + 'João Importação;505.000.000-01;01/02/1980;(81) 97777-0007;;\n').encode('cp1252')
+        response = self.client.post(
+            '/api/prontuario/patients/import/',
+            {'file': SimpleUploadedFile('pacientes.csv', conteudo, content_type='text/csv')},
+            HTTP_X_USER_ID=self.gestor_recife.id
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Patient.objects.get(cpf='505.000.000-01').full_name, 'João Importação')
+        
+        # CSV malformado (aspas sem fechar engolindo o resto do arquivo): 400 com a mensagem, não 500
+        conteudo = (self.HEADER + 'Ana;506.000.000-01;01/01/1990;;;\n' * 50 + '"Aspas sem fechar;' + 'x' * 200000).encode()
+        response = self.client.post(
+            '/api/prontuario/patients/import/',
+            {'file': SimpleUploadedFile('pacientes.csv', conteudo)},
+            HTTP_X_USER_ID=self.gestor_recife.id
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('CSV inválido', str(response.json()))
+
+    def test_erro_depois_do_primeiro_lote_mantem_rollup_e_relata_gravados(self):
+        import io
+        from unittest import mock
+        from prontuario.models import DailyMetric
+        from prontuario.patient_import import import_patients, read_rows
+
+        linhas = ''.join(
+            f'Lote {numero};507.000.{numero:03d}-01;01/01/1990;(81) 97777-0008;;\n' for numero in range(30)
+        )
+        # Linha em cp1252 depois da amostra usada para detectar a codificação
+        cp1252 = 'José Acentuado;508.000.000-01;01/01/1990;;;\n'.encode('cp1252')
+        malformado = '"Aspas sem fechar;' + 'x' * 200000
+        conteudo = (self.HEADER + linhas).encode() + cp1252 + (linhas.replace('507.', '509.') + malformado).encode()
+
+        with mock.patch('prontuario.patient_import.CSV_SAMPLE_BYTES', 256):
+            data = import_patients(read_rows(io.BytesIO(conteudo), 'pacientes.csv'), self.filial_recife, chunk_size=10)
+
+        self.assertIn('CSV inválido', data['error'])
+        # Lotes de 10 linhas: 6 gravados (a linha 32 recusada); a 62, no lote interrompido, não
+        self.assertEqual((data['total'], data['created']), (60, 59))
+        self.assertEqual([erro['line'] for erro in data['errors']], [32])
+        self.assertFalse(Patient.objects.filter(cpf='509.000.029-01').exists())
+        self.assertFalse(Patient.objects.filter(cpf='508.000.000-01').exists())
+        # Rollup atualizado mesmo com a importação interrompida
+        self.assertEqual(
+            DailyMetric.objects.get(metric='PACIENTES_NOVOS', filial=self.filial_recife, fisioterapeuta=None).value,
+            59
+        )
+
+    def test_consultas_constantes_por_lote(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from prontuario.patient_import import import_patients
+        
+        def linhas(inicio, total):
+            return [
+                (numero, {'full_name': f'Paciente {numero}', 'cpf': f'600.{numero:03d}.000-01',
+                          'birth_date': '1990-01-01', 'phone': '(81) 90000-0000'})
+                for numero in range(inicio, inicio + total)
+            ]
+        
+        # Cria o bucket de métricas do dia (as próximas importações só o atualizam)
+        import_patients(linhas(900, 1), self.filial_recife)
+        with CaptureQueriesContext(connection) as poucas:
+            import_patients(linhas(0, 5), self.filial_recife)
+        with CaptureQueriesContext(connection) as muitas:
+            resultado = import_patients(linhas(100, 200), self.filial_recife)
+        
+        self.assertEqual(resultado['created'], 200)
+        # Fora os INSERTs (o SQLite limita as variáveis por comando), nada depende do número de linhas
+        def consultas(ctx):
+            return [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith('INSERT')]
+        self.assertEqual(len(consultas(muitas)), len(consultas(poucas)))
+    
+    def test_permissao_e_dry_run(self):
+        linha = ['Ana Import;501.000.000-01;15/03/1990;(81) 97777-0001;;\n']
+        
+        response = self._post(self.fisio_recife_1, linha)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        
+        response = self._post(self.gestor_recife, linha, dry_run='true')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.json()['created'], response.json()['errors']), (0, []))
+        self.assertFalse(Patient.objects.filter(cpf='501.000.000-01').exists())
+        
+        response = self.client.post(
+            '/api/prontuario/patients/import/', {'file': self._csv(linha), 'filial': self.filial_recife.id},
+            HTTP_X_USER_ID=self.gestor_recife.id
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Patient.objects.get(cpf='501.000.000-01').filial, self.filial_recife)
+    
+    def test_comando_import_patients(self):
+        import os
+        import tempfile
+        from django.core.management import call_command
+        
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as arquivo:
+            arquivo.write('full_name,cpf,birth_date,phone\nCarla Import,505.000.000-01,1992-02-02,(81) 97777-0007\n')
+        self.addCleanup(os.remove, arquivo.name)
+        
+        out = StringIO()
+        call_command('import_patients', arquivo.name, '--filial', str(self.filial_recife.id), stdout=out)
+        self.assertIn('1 de 1 pacientes importados', out.getvalue())
+        self.assertTrue(Patient.objects.filter(cpf='505.000.000-01', filial=self.filial_recife).exists())
+
+
+class PlanScheduleTests(MultiFilialBaseTestCase):
+    """Agendamento recorrente das sessões do plano (prontuario/scheduling.py)"""
+    
+    def setUp(self):
+        super().setUp()
+        from datetime import timedelta
+        hoje = date.today()
+        self.segunda = hoje + timedelta(days=7 - hoje.weekday())
+        self.plan = TreatmentPlan.objects.create(
+            patient=self.paciente_recife_1, fisioterapeuta=self.fisio_recife_1, clinica=self.clinica,
+            title='Plano', objectives='Reduzir dor', total_sessions=6, frequency='2x_semana',
+            start_date=self.segunda
+        )
+        # Sessão 1 do plano na primeira segunda; outro paciente do fisioterapeuta na quinta às 8h30
+        PhysioSession.objects.create(
+            patient=self.paciente_recife_1, fisioterapeuta=self.fisio_recife_1, clinica=self.clinica,
+            treatment_plan=self.plan, scheduled_date=self.segunda, scheduled_time=time(8, 0), session_number=1
+        )
+        PhysioSession.objects.create(
+            patient=self.paciente_recife_2, fisioterapeuta=self.fisio_recife_1, clinica=self.clinica,
+            scheduled_date=self.segunda + timedelta(days=3), scheduled_time=time(8, 30)
+        )
+    
+    def _post(self, **data):
+        return self.client.post(
+            f'/api/prontuario/treatment-plans/{self.plan.id}/schedule/', {'time': '08:00', **data},
+            content_type='application/json', HTTP_X_USER_ID=self.fisio_recife_1.id
+        )
+    
+    def test_agenda_sessoes_restantes_pulando_conflitos(self):
+        from datetime import timedelta
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._post()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        
+        self.assertEqual(data['created'], 5)
+        self.assertEqual([s['session_number'] for s in data['sessions']], [2, 3, 4, 5, 6])
+        esperado = [self.segunda + timedelta(days=dias) for dias in (7, 10, 14, 17, 21)]
+        self.assertEqual([s['scheduled_date'] for s in data['sessions']], [d.isoformat() for d in esperado])
+        self.assertEqual(len(data['skipped']), 2)
+        
+        # Um único INSERT para todas as sessões
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "prontuario_physiosession"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(self.plan.sessions.exclude(status='CANCELADA').count(), 6)
+        
+        # Plano completo: nada mais a agendar
+        response = self._post()
+        self.assertEqual(response.json()['sessions'], [])
+    
+    def test_dry_run_e_validacao(self):
+        response = self._post(dry_run=True)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['sessions']), 5)
+        self.assertEqual(self.plan.sessions.count(), 1)
+        
+        self.plan.frequency = 'sob_demanda'
+        self.plan.save()
+        self.assertEqual(self._post().status_code, status.HTTP_400_BAD_REQUEST)
+        response = self._post(weekdays=[2], dry_run=True)
+        self.assertEqual(
+            {date.fromisoformat(s['scheduled_date']).weekday() for s in response.json()['sessions']}, {2}
+        )
+        self.assertEqual(self._post(time='8h').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SessionAvailabilityTests(MultiFilialBaseTestCase):
+    """Disponibilidade dos fisioterapeutas e recusa de horários sobrepostos"""
+    
+    def setUp(self):
+        super().setUp()
+        from datetime import timedelta
+        self.dia = date.today() + timedelta(days=1)
+        self.sessao = PhysioSession.objects.create(
+            patient=self.paciente_recife_1, fisioterapeuta=self.fisio_recife_1, clinica=self.clinica,
+            scheduled_date=self.dia, scheduled_time=time(8, 0), duration_minutes=50
+        )
+    
+    def _criar(self, horario, paciente=None, fisioterapeuta=None):
+        return self.client.post('/api/prontuario/sessions/', {
+            'patient': (paciente or self.paciente_recife_2).id,
+            'fisioterapeuta': (fisioterapeuta or self.fisio_recife_1).id,
+            'scheduled_date': self.dia.isoformat(), 'scheduled_time': horario,
+        }, content_type='application/json', HTTP_X_USER_ID=self.gestor_recife.id)
+    
+    def test_disponibilidade_da_filial_em_uma_consulta(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                f'/api/prontuario/sessions/availability/?from={self.dia}&to={self.dia}',
+                HTTP_X_USER_ID=self.gestor_recife.id
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sessoes = [q for q in ctx.captured_queries if 'prontuario_physiosession' in q['sql']]
+        self.assertEqual(len(sessoes), 1)
+        
+        fisios = {fisio['id']: fisio['days'][0] for fisio in response.json()['fisioterapeutas']}
+        # Gestor de filial: apenas os fisioterapeutas de Recife
+        self.assertEqual(set(fisios), {self.fisio_recife_1.id, self.fisio_recife_2.id})
+        dia = fisios[self.fisio_recife_1.id]
+        self.assertEqual(dia['busy'], [['08:00', '08:50']])
+        self.assertEqual(dia['free'], [['07:00', '08:00'], ['08:50', '19:00']])
+        self.assertEqual(dia['slots'][:3], ['07:00', '08:50', '09:40'])
+        self.assertEqual(fisios[self.fisio_recife_2.id]['free'], [['07:00', '19:00']])
+    
+    def test_recusa_horario_sobreposto(self):
+        response = self._criar('08:30')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('scheduled_time', response.json())
+        # O mesmo paciente com outro fisioterapeuta também conflita
+        response = self._criar('08:30', paciente=self.paciente_recife_1, fisioterapeuta=self.fisio_recife_2)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self._criar('08:50')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        # Remarcação para um horário ocupado
+        nova = PhysioSession.objects.get(scheduled_time=time(8, 50))
+        url = f'/api/prontuario/sessions/{nova.id}/'
+        response = self.client.patch(
+            url, {'scheduled_time': '07:30'}, content_type='application/json', HTTP_X_USER_ID=self.gestor_recife.id
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        # Sessão cancelada libera o horário
+        self.sessao.status = 'CANCELADA'
+        self.sessao.save()
+        self.assertEqual(self._criar('08:00').status_code, status.HTTP_201_CREATED)
+
+
+class ApiBenchmarkTests(TestCase):
+    """Orçamento de consultas dos dashboards e listagens (prontuario/benchmarks.py)"""
+    
+    def test_consultas_nao_crescem_com_o_volume(self):
+        from prontuario.benchmarks import run_suite, seed_tenant
+        
+        pequena = run_suite(seed_tenant(filiais=1, fisioterapeutas=1, patients=2, sessions=3, records=1), runs=1)
+        grande = run_suite(seed_tenant(filiais=3, fisioterapeutas=3, patients=8, sessions=10, records=3, years=2), runs=1)
+        
+        for nome, resultado in grande.items():
+            self.assertEqual(resultado['status'], 200, nome)
+            self.assertEqual(resultado['queries'], pequena[nome]['queries'], nome)
+    
+    def test_baseline_detecta_regressao(self):
+        import json
+        import os
+        import tempfile
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        
+        opcoes = {'filiais': 1, 'fisioterapeutas': 1, 'patients': 2, 'sessions': 2, 'records': 1, 'runs': 1}
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, 'baseline.json')
+            call_command('benchmark_api', save=caminho, stdout=StringIO(), **opcoes)
+            # Os dados sintéticos são desfeitos ao final
+            self.assertFalse(Clinica.objects.exists())
+            
+            saida = StringIO()
+            call_command('benchmark_api', check=caminho, stdout=saida, **opcoes)
+            self.assertIn('Sem regressões', saida.getvalue())
+            
+            with open(caminho, encoding='utf-8') as arquivo:
+                baseline = json.load(arquivo)
+            baseline['endpoints']['dashboard_gestor']['queries'] -= 1
+            with open(caminho, 'w', encoding='utf-8') as arquivo:
+                json.dump(baseline, arquivo)
+            with self.assertRaisesMessage(CommandError, 'dashboard_gestor'):
+                call_command('benchmark_api', check=caminho, stdout=StringIO(), **opcoes)
+
+
+class LoadDatasetTests(TestCase):
+    """Comando generate_load_dataset (prontuario/benchmarks.py)"""
+    
+    opcoes = {
+        'clinics': 2, 'filiais': 1, 'fisioterapeutas': 2, 'patients': 3, 'sessions': 4, 'records': 1,
+        'documents': 2, 'ocr_chars': 100, 'items': 2, 'movements': 5, 'batch_size': 7,
+    }
+    
+    def test_gera_dados_deterministicos(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from django.db import transaction
+        from estoque.models import InventoryItem, InventoryTransaction
+        
+        def sessoes():
+            return list(PhysioSession.objects.order_by('id').values_list('scheduled_date', 'scheduled_time', 'status'))
+        
+        # Mesmo --seed, mesmos dados
+        with transaction.atomic():
+            call_command('generate_load_dataset', stdout=StringIO(), **self.opcoes)
+            primeira = sessoes()
+            transaction.set_rollback(True)
+        call_command('generate_load_dataset', stdout=StringIO(), **self.opcoes)
+        self.assertEqual(sessoes(), primeira)
+        
+        self.assertEqual(Clinica.objects.count(), 2)
+        self.assertEqual(Patient.objects.count(), 12)
+        self.assertEqual(PhysioSession.objects.count(), 48)
+        self.assertEqual(Document.objects.filter(ocr_processed=True).count(), 24)
+        self.assertEqual(InventoryTransaction.objects.count(), 20)
+        # Livro de movimentações encadeado, terminando no saldo do item
+        for item in InventoryItem.objects.all():
+            movimentos = list(item.transactions.order_by('id'))
+            self.assertEqual(movimentos[0].quantity_before, 0)
+            for anterior, seguinte in zip(movimentos, movimentos[1:]):
+                self.assertEqual(anterior.quantity_after, seguinte.quantity_before)
+            self.assertEqual(movimentos[-1].quantity_after, item.quantity)
+        
+        with self.assertRaisesMessage(CommandError, 'já existem'):
+            call_command('generate_load_dataset', stdout=StringIO(), **self.opcoes)
+
+    def test_seeds_com_o_mesmo_ultimo_digito_nao_colidem(self):
+        """--seed 1 e --seed 11 geram CNPJs, usernames e CPFs diferentes"""
+        from django.core.management import call_command
+        
+        opcoes = {**self.opcoes, 'clinics': 1, 'documents': 0, 'items': 0}
+        call_command('generate_load_dataset', stdout=StringIO(), seed=1, **opcoes)
+        call_command('generate_load_dataset', stdout=StringIO(), seed=11, **opcoes)
+        
+        self.assertEqual(Clinica.objects.count(), 2)
+        # Por clínica: gestor geral + gestor e atendente da filial + 2 fisioterapeutas
+        self.assertEqual(User.objects.filter(username__startswith='bench_').values('cpf').distinct().count(), 10)
+
+
+class SQLProfilingMiddlewareTests(MultiFilialBaseTestCase):
+    """Perfil SQL por requisição (prontuario/sql_profiling.py)"""
+    
+    def setUp(self):
+        import tempfile
+        super().setUp()
+        self.pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(self.pasta.cleanup)
+        self.log = f'{self.pasta.name}/lentas.jsonl'
+    
+    def _get(self, url, usuario, **perfil):
+        from django.test import Client
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+        from authentication.current_user import clear_user_cache
+        
+        configuracao = {'SQL_PROFILING': True, 'SQL_PROFILING_LOG': self.log, **perfil}
+        clear_user_cache()
+        with override_settings(**configuracao), CaptureQueriesContext(connection) as consultas:
+            response = Client().get(url, HTTP_X_USER_ID=usuario.id)
+        return response, len(consultas.captured_queries)
+    
+    def test_desativado_por_padrao(self):
+        response = self.client.get('/api/prontuario/patients/', HTTP_X_USER_ID=self.gestor_geral.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Query-Count', response)
+        self.assertNotIn('Server-Timing', response)
+    
+    def test_cabecalhos_com_contagem_e_tempos(self):
+        import re
+        response, consultas = self._get('/api/prontuario/patients/', self.gestor_geral, SQL_PROFILING_TOP_N=2)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(int(response['X-Query-Count']), consultas)
+        metricas = re.findall(r'(?:^|, )(\w+);dur=', response['Server-Timing'])
+        self.assertEqual(metricas, ['app', 'db', 'sql1', 'sql2'])
+    
+    def test_sql_fora_dos_cabecalhos_sem_expose_sql(self):
+        response, _ = self._get('/api/prontuario/patients/', self.gestor_geral)
+        cabecalhos = ' '.join(response[nome] for nome in ('Server-Timing', 'X-Query-Count', 'X-Query-Duplicates'))
+        for trecho in ('SELECT', 'FROM', 'prontuario_patient'):
+            self.assertNotIn(trecho, cabecalhos)
+        
+        response, _ = self._get('/api/prontuario/patients/', self.gestor_geral, SQL_PROFILING_EXPOSE_SQL=True)
+        self.assertIn('SELECT', response['Server-Timing'])
+        response['Server-Timing'].encode('latin-1')
+    
+    def test_impressao_digital_agrupa_consultas_repetidas(self):
+        from prontuario.sql_profiling import fingerprint
+        
+        self.assertEqual(
+            fingerprint('SELECT * FROM "p" WHERE "p"."id" = 10 AND "p"."cpf" IN (%s, %s, %s)'),
+            fingerprint('SELECT * FROM "p"  WHERE "p"."id" = 7 AND "p"."cpf" IN (%s)'),
+        )
+        self.assertNotEqual(fingerprint('SELECT * FROM "p"'), fingerprint('SELECT * FROM "q"'))
+    
+    def test_requisicao_lenta_vai_para_o_log(self):
+        import json
+        import logging
+        import os
+        from prontuario.sql_profiling import LOGGER_NAME
+        
+        logger = logging.getLogger(LOGGER_NAME)
+        self.addCleanup(lambda: [handler.close() or logger.removeHandler(handler) for handler in list(logger.handlers)])
+        
+        # Abaixo dos limites: nada no log
+        self._get('/api/prontuario/patients/', self.gestor_geral, SQL_PROFILING_SLOW_MS=60000)
+        self.assertFalse(os.path.exists(self.log))
+        
+        response, consultas = self._get(
+            f'/api/prontuario/patients/?search={self.paciente_recife_1.cpf}&page=1', self.gestor_geral,
+            SQL_PROFILING_SLOW_MS=0, SQL_PROFILING_DUPLICATE_THRESHOLD=1
+        )
+        with open(self.log, encoding='utf-8') as arquivo:
+            conteudo = arquivo.read()
+        linhas = [json.loads(linha) for linha in conteudo.splitlines()]
+        self.assertEqual(len(linhas), 1)
+        registro = linhas[0]
+        # Só os nomes dos parâmetros: o CPF buscado não vai para o log
+        self.assertEqual((registro['path'], registro['status']), ('/api/prontuario/patients/?search&page', 200))
+        self.assertNotIn(self.paciente_recife_1.cpf, conteudo)
+        self.assertEqual(str(registro['user_id']), str(self.gestor_geral.id))
+        self.assertEqual(registro['queries'], consultas)
+        self.assertEqual(sum(grupo['count'] for grupo in registro['duplicates']), consultas)
+        self.assertEqual(int(response['X-Query-Duplicates']), consultas)
+        self.assertLessEqual(len(registro['slowest']), 5)
@@ -1,11 +1,14 @@
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from django.db.models import Q, Count, F
+from django.db import transaction
+from django.db.models import Q, Count, F, Sum, Case, When, Value
 from django.db.models.functions import TruncDate, TruncWeek, TruncMonth
 from django.utils import timezone
-from datetime import timedelta, datetime
+from datetime import date, time, timedelta, datetime
 from .models import Patient, MedicalRecord, MedicalRecordHistory, PatientTransferHistory, TransferRequest
 from .serializers import (
     PatientSerializer, PatientListSerializer,
@@ -14,10 +17,23 @@ from .serializers import (
     PatientTransferSerializer, PatientTransferHistorySerializer,
     TransferRequestSerializer, TransferRequestCreateSerializer
 )
+from .metrics import metric_queryset, daily_totals, monthly_series
+from .dashboard_cache import cached_dashboard
+from .search import PATIENT_INDEX, MEDICAL_RECORD_INDEX
+from .pagination import CursorOrPageNumberPagination, KeysetCursorPagination
+from .fieldsets import SparseFieldsetViewMixin
+from .patient_import import PatientImportError, import_patients, read_rows
+from .scheduling import (
+    FREE_STATUSES, MAX_AVAILABILITY_DAYS, ScheduleError,
+    availability, check_booking, lock_agenda, parse_date, parse_time, schedule_plan
+)
+from authentication.current_user import (
+    get_current_user, get_current_user_or_default, get_fallback_user, requested_user_id
+)
 import json
 
 
-class PatientViewSet(viewsets.ModelViewSet):
+class PatientViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para gerenciar pacientes
     Endpoints:
@@ -44,45 +60,15 @@ class PatientViewSet(viewsets.ModelViewSet):
         return PatientSerializer
     
     def _get_current_user(self):
-        """Helper para obter o usuário atual"""
-        if self.request.user.is_authenticated:
-            return self.request.user
-        
-        user_id = self.request.headers.get('X-User-Id')
-        if user_id:
-            from authentication.models import User
-            try:
-                return User.objects.get(id=int(user_id), is_active_user=True)
-            except (User.DoesNotExist, ValueError):
-                pass
-        
-        # Fallback: primeiro usuário ativo
-        from authentication.models import User
-        return User.objects.filter(is_active_user=True).order_by('id').first()
+        """Helper para obter o usuário atual (fallback: primeiro usuário ativo)"""
+        return get_current_user(self.request) or get_fallback_user()
     
     def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self._get_current_user()
-        
-        if not user or not hasattr(user, 'clinica') or not user.clinica:
-            return queryset.none()
-        
-        # Base: filtrar por clínica
-        queryset = queryset.filter(clinica=user.clinica)
-        
-        # Filtrar por tipo de usuário
-        if user.is_gestor_geral:
-            # Gestor Geral: ver todos os pacientes da rede
-            pass
-        elif user.is_gestor_filial:
-            # Gestor Filial: ver apenas pacientes da sua filial
-            queryset = queryset.filter(filial=user.filial)
-        elif user.is_fisioterapeuta:
-            # Fisioterapeuta: ver apenas seus pacientes
-            queryset = queryset.filter(fisioterapeuta=user)
-        elif user.is_atendente:
-            # Atendente: ver pacientes da sua filial
-            queryset = queryset.filter(filial=user.filial)
+        # fisioterapeuta e filial entram no SELECT (nomes usados pelos serializers)
+        queryset = super().get_queryset().select_related('fisioterapeuta', 'filial')
+        # Regras de papel: rede (gestor geral), filial (gestor de filial e
+        # atendente) ou próprios pacientes (fisioterapeuta)
+        queryset = queryset.for_user(self._get_current_user())
         
         # Filtrar por filial (query param)
         filial_id = self.request.query_params.get('filial', None)
@@ -174,17 +160,12 @@ class PatientViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def search(self, request):
-        """Busca avançada de pacientes"""
+        """Busca avançada de pacientes (índice textual, ordenada por relevância)"""
         query = request.query_params.get('q', '')
         queryset = self.get_queryset()
         
         if query:
-            queryset = queryset.filter(
-                Q(full_name__icontains=query) |
-                Q(cpf__icontains=query) |
-                Q(email__icontains=query) |
-                Q(phone__icontains=query)
-            )
+            queryset = PATIENT_INDEX.search(queryset, query)
         
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -293,11 +274,59 @@ class PatientViewSet(viewsets.ModelViewSet):
         history = patient.transfer_history.all()
         serializer = PatientTransferHistorySerializer(history, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser])
+    def import_patients(self, request):
+        """
+        Importação em massa de pacientes (onboarding de clínica)
+        POST /api/prontuario/patients/import/
+        Form-data:
+            file: arquivo .csv ou .xlsx (uma linha por paciente, cabeçalho na primeira)
+            filial: id da filial (Gestor Geral; demais usam a própria filial)
+            dry_run: 'true' para apenas validar
+        
+        Retorna {total, created, dry_run, errors: [{line, cpf, errors}], error}
+        (400 com `error` se o arquivo não pôde ser lido até o fim; `created`
+        indica os pacientes gravados antes disso)
+        """
+        from authentication.models import Filial
+        
+        user = self._get_current_user()
+        if not user:
+            return Response({'error': 'Usuário não identificado'}, status=status.HTTP_401_UNAUTHORIZED)
+        if not (user.is_atendente or user.is_gestor):
+            return Response(
+                {'error': 'Apenas atendentes e gestores podem importar pacientes'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        filial = user.filial
+        filial_id = request.data.get('filial')
+        if user.is_gestor_geral and filial_id:
+            filial = Filial.objects.filter(pk=filial_id, clinica_id=user.clinica_id).first()
+            if filial is None:
+                return Response({'error': 'Filial não encontrada'}, status=status.HTTP_404_NOT_FOUND)
+        if filial is None:
+            return Response({'error': 'Informe a filial dos pacientes'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': 'Envie o arquivo no campo "file"'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+        try:
+            result = import_patients(read_rows(upload.file, upload.name), filial, dry_run=dry_run)
+        except PatientImportError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if result['error']:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK)
 
 
 
 
-class MedicalRecordViewSet(viewsets.ModelViewSet):
+class MedicalRecordViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para gerenciar prontuários médicos
     Endpoints:
@@ -307,6 +336,8 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
     - PUT/PATCH /api/prontuario/medical-records/{id}/ - Atualiza um prontuário
     - DELETE /api/prontuario/medical-records/{id}/ - Remove um prontuário
     - GET /api/prontuario/medical-records/{id}/history/ - Histórico de alterações
+    
+    Listagem e histórico aceitam ?cursor= (paginação por cursor)
     """
     queryset = MedicalRecord.objects.all()
     permission_classes = [AllowAny]  # Temporário para desenvolvimento
@@ -314,6 +345,7 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
     search_fields = ['title', 'patient__full_name', 'diagnosis', 'chief_complaint']
     ordering_fields = ['record_date', 'created_at', 'patient__full_name']
     ordering = ['-record_date']
+    pagination_class = CursorOrPageNumberPagination
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -323,7 +355,10 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
         return MedicalRecordSerializer
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related('patient', 'created_by')
+        # Listagem e busca não leem as colunas de texto exibidas só no detalhe
+        if self.action in ['list', 'search']:
+            queryset = queryset.summary()
         
         # Filtrar por paciente
         patient_id = self.request.query_params.get('patient', None)
@@ -420,13 +455,51 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
             )
         instance.delete()
     
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Busca textual nos campos clínicos dos prontuários
+        GET /api/prontuario/medical-records/search/?q=lombalgia
+        
+        Resultados restritos à clínica do usuário (e aos pacientes do
+        fisioterapeuta), ordenados por relevância
+        """
+        query = request.query_params.get('q', '')
+        queryset = self.get_queryset()
+        
+        user = get_current_user(request)
+        if not user or not user.clinica_id:
+            queryset = queryset.none()
+        else:
+            queryset = queryset.filter(patient__clinica_id=user.clinica_id)
+            if user.user_type == 'FISIOTERAPEUTA':
+                queryset = queryset.filter(patient__fisioterapeuta=user)
+        
+        if query:
+            queryset = MEDICAL_RECORD_INDEX.search(queryset, query)
+        
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = MedicalRecordListSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
+        serializer = MedicalRecordListSerializer(queryset, many=True)
+        return Response(serializer.data)
+    
     @action(detail=True, methods=['get'])
     def history(self, request, pk=None):
         """
         Retorna o histórico de alterações de um prontuário
         """
         record = self.get_object()
-        history = record.history_logs.all()
+        history = record.history_logs.select_related('user')
+        
+        paginator = KeysetCursorPagination()
+        page = paginator.paginate_queryset(history, request, view=self)
+        if page is not None:
+            serializer = MedicalRecordHistorySerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+        
         serializer = MedicalRecordHistorySerializer(history, many=True)
         return Response(serializer.data)
     
@@ -444,29 +517,45 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cached_dashboard('geral', rede=True)
 def dashboard_statistics(request):
     """
     Endpoint para retornar estatísticas do dashboard
     GET /api/prontuario/dashboard-stats/
     """
     today = timezone.now().date()
-    week_ago = today - timedelta(days=7)
-    month_ago = today - timedelta(days=30)
-    last_month_start = today - timedelta(days=60)
+    
+    # Contagens por período vêm do rollup diário (DailyMetric)
+    rollup = metric_queryset()
     
     # Total de pacientes
     total_patients = Patient.objects.filter(is_active=True).count()
     
-    # Pacientes criados esta semana
-    patients_this_week = Patient.objects.filter(
-        created_at__gte=timezone.now() - timedelta(days=7)
-    ).count()
+    totals = rollup.aggregate(
+        # Pacientes criados esta semana / semana passada
+        patients_this_week=Sum('value', default=0, filter=Q(
+            metric='PACIENTES_NOVOS', day__gt=today - timedelta(days=7)
+        )),
+        patients_last_week=Sum('value', default=0, filter=Q(
+            metric='PACIENTES_NOVOS', day__gt=today - timedelta(days=14), day__lte=today - timedelta(days=7)
+        )),
+        # Pacientes criados este mês / mês passado
+        patients_this_month=Sum('value', default=0, filter=Q(
+            metric='PACIENTES_NOVOS', day__gt=today - timedelta(days=30)
+        )),
+        patients_last_month=Sum('value', default=0, filter=Q(
+            metric='PACIENTES_NOVOS', day__gt=today - timedelta(days=60), day__lte=today - timedelta(days=30)
+        )),
+        # Prontuários ativos (últimos 30 dias)
+        active_records=Sum('value', default=0, filter=Q(
+            metric='PRONTUARIOS', day__gt=today - timedelta(days=30)
+        )),
+        # Documentos hoje (prontuários de hoje)
+        documents_today=Sum('value', default=0, filter=Q(metric='PRONTUARIOS', day=today)),
+    )
     
-    # Pacientes criados semana passada
-    patients_last_week = Patient.objects.filter(
-        created_at__gte=timezone.now() - timedelta(days=14),
-        created_at__lt=timezone.now() - timedelta(days=7)
-    ).count()
+    patients_this_week = totals['patients_this_week']
+    patients_last_week = totals['patients_last_week']
     
     # Crescimento semanal
     if patients_last_week > 0:
@@ -474,27 +563,15 @@ def dashboard_statistics(request):
     else:
         weekly_growth = 100 if patients_this_week > 0 else 0
     
-    # Prontuários ativos (criados nos últimos 30 dias)
-    active_records = MedicalRecord.objects.filter(
-        record_date__gte=timezone.now() - timedelta(days=30)
-    ).count()
-    
-    # Documentos hoje (prontuários criados hoje)
-    documents_today = MedicalRecord.objects.filter(
-        created_at__date=today
-    ).count()
+    active_records = totals['active_records']
+    documents_today = totals['documents_today']
     
     # Receita mensal estimada (R$ 150 por paciente ativo)
     monthly_revenue = total_patients * 150
     
     # Crescimento mensal
-    patients_this_month = Patient.objects.filter(
-        created_at__gte=timezone.now() - timedelta(days=30)
-    ).count()
-    patients_last_month = Patient.objects.filter(
-        created_at__gte=timezone.now() - timedelta(days=60),
-        created_at__lt=timezone.now() - timedelta(days=30)
-    ).count()
+    patients_this_month = totals['patients_this_month']
+    patients_last_month = totals['patients_last_month']
     
     if patients_last_month > 0:
         monthly_growth = ((patients_this_month - patients_last_month) / patients_last_month) * 100
@@ -505,44 +582,32 @@ def dashboard_statistics(request):
     weekly_data = []
     days_pt = ['Dom', 'Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb']
     
+    daily = daily_totals(
+        rollup, ['PACIENTES_NOVOS', 'PRONTUARIOS', 'CONSULTAS'],
+        start=today - timedelta(days=6), end=today
+    )
+    
     for i in range(6, -1, -1):
         day = today - timedelta(days=i)
         day_name = days_pt[day.weekday()]
         
-        patients_count = Patient.objects.filter(created_at__date=day).count()
-        records_count = MedicalRecord.objects.filter(record_date__date=day).count()
-        consultations = MedicalRecord.objects.filter(
-            record_date__date=day,
-            record_type='CONSULTA'
-        ).count()
-        
         weekly_data.append({
             'day': day_name,
-            'pacientes': patients_count,
-            'consultas': consultations,
-            'documentos': records_count
+            'pacientes': daily.get(('PACIENTES_NOVOS', day), 0),
+            'consultas': daily.get(('CONSULTAS', day), 0),
+            'documentos': daily.get(('PRONTUARIOS', day), 0)
         })
     
     # Tendência mensal (últimos 8 meses)
     monthly_trend = []
     months_pt = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
     
-    for i in range(7, -1, -1):
-        month_date = today - timedelta(days=30 * i)
-        month_start = month_date.replace(day=1)
-        if month_date.month == 12:
-            month_end = month_date.replace(year=month_date.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            month_end = month_date.replace(month=month_date.month + 1, day=1) - timedelta(days=1)
-        
-        patients_in_month = Patient.objects.filter(
-            created_at__date__gte=month_start,
-            created_at__date__lte=month_end
-        ).count()
-        
+    for month_start, value in monthly_series(
+        rollup.filter(metric='PACIENTES_NOVOS'), 'day', 8, aggregate=Sum('value')
+    ):
         monthly_trend.append({
-            'month': months_pt[month_date.month - 1],
-            'value': patients_in_month
+            'month': months_pt[month_start.month - 1],
+            'value': value
         })
     
     # Distribuição de serviços (por tipo de prontuário)
@@ -591,6 +656,7 @@ def dashboard_statistics(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cached_dashboard('gestor')
 def dashboard_statistics_gestor(request):
     """
     Endpoint para dashboard do GESTOR GERAL (Rede Multi-Filial)
@@ -604,88 +670,109 @@ def dashboard_statistics_gestor(request):
     - Comparativo entre filiais
     """
     from authentication.models import Clinica, Filial, User
-    from documentos.models import Document
-    from .models import PhysioSession, PatientTransferHistory
+    from .models import PatientTransferHistory
     
     # Identificar usuário/clínica
-    user = None
-    if request.user.is_authenticated:
-        user = request.user
-    else:
-        user_id = request.headers.get('X-User-Id')
-        if user_id:
-            try:
-                user = User.objects.get(id=int(user_id), is_active_user=True)
-            except (User.DoesNotExist, ValueError):
-                pass
-    
-    if not user:
-        user = User.objects.filter(is_active_user=True).order_by('id').first()
+    user = get_current_user(request) or get_fallback_user()
     
     if not user or not user.clinica:
         return Response({'error': 'Clínica não encontrada'}, status=status.HTTP_404_NOT_FOUND)
     
     clinica = user.clinica
     today = timezone.now().date()
+    inicio_mes = today - timedelta(days=30)
+    inicio_mes_anterior = today - timedelta(days=60)
+    
+    # Todas as métricas abaixo vêm de agregações agrupadas (values().annotate())
+    # montadas em memória, de modo que o número de consultas SQL é constante,
+    # independente da quantidade de filiais e fisioterapeutas da rede.
+    # Contagens por período são lidas do rollup diário (DailyMetric).
+    rollup = metric_queryset(clinica=clinica)
     
     # ==================== MÉTRICAS GLOBAIS DA REDE ====================
     all_patients = Patient.objects.filter(clinica=clinica, is_active=True)
-    all_fisios = User.objects.filter(clinica=clinica, user_type='FISIOTERAPEUTA', is_active_user=True)
-    all_filiais = Filial.objects.filter(clinica=clinica, ativa=True)
+    all_fisios = list(
+        User.objects.filter(clinica=clinica, user_type='FISIOTERAPEUTA', is_active_user=True)
+        .select_related('filial')
+        .order_by('id')
+    )
+    all_filiais = list(Filial.objects.filter(clinica=clinica, ativa=True))
     
-    total_patients = all_patients.count()
-    total_fisioterapeutas = all_fisios.count()
-    total_filiais = all_filiais.count()
+    patient_totals = all_patients.aggregate(
+        total=Count('id'),
+        disponiveis=Count('id', filter=Q(available_for_transfer=True)),
+    )
     
-    # Novos pacientes (últimos 30 dias)
-    new_patients_month = all_patients.filter(
-        created_at__gte=timezone.now() - timedelta(days=30)
-    ).count()
+    total_patients = patient_totals['total']
+    total_fisioterapeutas = len(all_fisios)
+    total_filiais = len(all_filiais)
+    
+    # ==================== AGREGAÇÕES POR FILIAL / FISIOTERAPEUTA ====================
+    pacientes_por_filial = {
+        row['filial']: row['total']
+        for row in all_patients.values('filial').annotate(total=Count('id'))
+    }
+    
+    pacientes_por_fisio = {
+        row['fisioterapeuta']: row['total']
+        for row in all_patients.values('fisioterapeuta').annotate(total=Count('id'))
+    }
+    
+    # Últimos 60 dias do rollup: novos pacientes, sessões realizadas,
+    # documentos e transferências por filial e fisioterapeuta
+    new_patients_month = 0
+    patients_prev_month = 0
+    total_transferencias_mes = 0
+    novos_por_filial = {}
+    sessoes_por_fisio = {}
+    sessoes_por_filial = {}
+    documentos_por_filial = {}
+    
+    for row in rollup.filter(day__gte=inicio_mes_anterior).values(
+        'metric', 'filial', 'fisioterapeuta'
+    ).annotate(
+        mes=Sum('value', default=0, filter=Q(day__gte=inicio_mes)),
+        mes_anterior=Sum('value', default=0, filter=Q(day__lt=inicio_mes)),
+    ).order_by():
+        metric = row['metric']
+        if metric == 'PACIENTES_NOVOS':
+            new_patients_month += row['mes']
+            patients_prev_month += row['mes_anterior']
+            novos_por_filial[row['filial']] = novos_por_filial.get(row['filial'], 0) + row['mes']
+        elif metric == 'SESSOES_REALIZADAS':
+            sessoes_por_fisio[row['fisioterapeuta']] = sessoes_por_fisio.get(row['fisioterapeuta'], 0) + row['mes']
+            sessoes_por_filial[row['filial']] = sessoes_por_filial.get(row['filial'], 0) + row['mes']
+        elif metric == 'DOCUMENTOS':
+            documentos_por_filial[row['filial']] = documentos_por_filial.get(row['filial'], 0) + row['mes']
+        elif metric == 'TRANSFERENCIAS':
+            total_transferencias_mes += row['mes']
     
     # Crescimento mensal
-    patients_prev_month = all_patients.filter(
-        created_at__gte=timezone.now() - timedelta(days=60),
-        created_at__lt=timezone.now() - timedelta(days=30)
-    ).count()
-    
     if patients_prev_month > 0:
         monthly_growth = ((new_patients_month - patients_prev_month) / patients_prev_month) * 100
     else:
         monthly_growth = 100 if new_patients_month > 0 else 0
     
+    
+    fisios_por_filial = {}
+    for fisio in all_fisios:
+        fisios_por_filial.setdefault(fisio.filial_id, []).append(fisio)
+    
     # ==================== ESTATÍSTICAS POR FILIAL ====================
     filiais_stats = []
     filial_colors = ['#009688', '#2196F3', '#FF9800', '#9C27B0', '#4CAF50', '#F44336']
     
     for idx, filial in enumerate(all_filiais):
-        filial_patients = all_patients.filter(filial=filial)
-        filial_fisios = all_fisios.filter(filial=filial)
-        filial_sessions = PhysioSession.objects.filter(
-            clinica=clinica,
-            patient__filial=filial,
-            scheduled_date__gte=today - timedelta(days=30),
-            status='REALIZADA'
-        ).count()
-        filial_docs = Document.objects.filter(
-            patient__filial=filial,
-            created_at__gte=timezone.now() - timedelta(days=30)
-        ).count()
-        
-        # Novos pacientes da filial este mês
-        filial_new_patients = filial_patients.filter(
-            created_at__gte=timezone.now() - timedelta(days=30)
-        ).count()
-        
         filiais_stats.append({
             'id': filial.id,
             'nome': filial.nome,
             'cidade': filial.cidade,
             'cor': filial_colors[idx % len(filial_colors)],
-            'totalPacientes': filial_patients.count(),
-            'novosPacientes': filial_new_patients,
-            'fisioterapeutas': filial_fisios.count(),
-            'sessoesRealizadas': filial_sessions,
-            'documentos': filial_docs,
+            'totalPacientes': pacientes_por_filial.get(filial.id, 0),
+            'novosPacientes': novos_por_filial.get(filial.id, 0),
+            'fisioterapeutas': len(fisios_por_filial.get(filial.id, [])),
+            'sessoesRealizadas': sessoes_por_filial.get(filial.id, 0),
+            'documentos': documentos_por_filial.get(filial.id, 0),
         })
     
     # ==================== TRANSFERÊNCIAS RECENTES ====================
@@ -712,29 +799,17 @@ def dashboard_statistics_gestor(request):
             'inter_filial': t.from_filial_id != t.to_filial_id if t.from_filial and t.to_filial else False
         })
     
-    total_transferencias_mes = PatientTransferHistory.objects.filter(
-        patient__clinica=clinica,
-        transfer_date__gte=timezone.now() - timedelta(days=30)
-    ).count()
-    
     # ==================== FISIOTERAPEUTAS POR FILIAL ====================
     fisioterapeutas_por_filial = []
     for filial in all_filiais:
-        fisios_filial = all_fisios.filter(filial=filial)
         fisios_data = []
-        for fisio in fisios_filial:
-            pacientes_count = all_patients.filter(fisioterapeuta=fisio).count()
-            sessoes_count = PhysioSession.objects.filter(
-                fisioterapeuta=fisio,
-                scheduled_date__gte=today - timedelta(days=30),
-                status='REALIZADA'
-            ).count()
+        for fisio in fisios_por_filial.get(filial.id, []):
             fisios_data.append({
                 'id': fisio.id,
                 'nome': fisio.get_full_name(),
                 'especialidade': fisio.especialidade or 'Geral',
-                'pacientes': pacientes_count,
-                'sessoes': sessoes_count
+                'pacientes': pacientes_por_fisio.get(fisio.id, 0),
+                'sessoes': sessoes_por_fisio.get(fisio.id, 0)
             })
         
         fisioterapeutas_por_filial.append({
@@ -744,28 +819,18 @@ def dashboard_statistics_gestor(request):
         })
     
     # ==================== COMPARATIVO MENSAL POR FILIAL ====================
+    months_pt = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+    novos_por_filial_mes = monthly_series(
+        rollup.filter(metric='PACIENTES_NOVOS'), 'day', 6, aggregate=Sum('value'), by='filial'
+    )
+    
     comparativo_filiais = []
     for filial in all_filiais:
-        filial_patients = all_patients.filter(filial=filial)
         dados_meses = []
-        months_pt = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
-        
-        for i in range(5, -1, -1):
-            month_date = today - timedelta(days=30 * i)
-            month_start = month_date.replace(day=1)
-            if month_date.month == 12:
-                month_end = month_date.replace(year=month_date.year + 1, month=1, day=1) - timedelta(days=1)
-            else:
-                month_end = month_date.replace(month=month_date.month + 1, day=1) - timedelta(days=1)
-            
-            count = filial_patients.filter(
-                created_at__date__gte=month_start,
-                created_at__date__lte=month_end
-            ).count()
-            
+        for month_start, valor in novos_por_filial_mes[filial.id]:
             dados_meses.append({
-                'mes': months_pt[month_date.month - 1],
-                'valor': count
+                'mes': months_pt[month_start.month - 1],
+                'valor': valor
             })
         
         comparativo_filiais.append({
@@ -776,12 +841,8 @@ def dashboard_statistics_gestor(request):
     # ==================== RANKING TOP FISIOTERAPEUTAS ====================
     ranking_fisios = []
     for fisio in all_fisios:
-        pacientes = all_patients.filter(fisioterapeuta=fisio).count()
-        sessoes = PhysioSession.objects.filter(
-            fisioterapeuta=fisio,
-            scheduled_date__gte=today - timedelta(days=30),
-            status='REALIZADA'
-        ).count()
+        pacientes = pacientes_por_fisio.get(fisio.id, 0)
+        sessoes = sessoes_por_fisio.get(fisio.id, 0)
         score = pacientes * 2 + sessoes  # Pontuação simples
         
         ranking_fisios.append({
@@ -797,7 +858,7 @@ def dashboard_statistics_gestor(request):
     ranking_fisios = sorted(ranking_fisios, key=lambda x: x['score'], reverse=True)[:10]
     
     # ==================== PACIENTES DISPONÍVEIS PARA TRANSFERÊNCIA ====================
-    pacientes_disponiveis = all_patients.filter(available_for_transfer=True).count()
+    pacientes_disponiveis = patient_totals['disponiveis']
     
     return Response({
         # Métricas globais
@@ -833,6 +894,7 @@ def dashboard_statistics_gestor(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cached_dashboard('gestor_filial')
 def dashboard_statistics_gestor_filial(request):
     """
     Endpoint para dashboard do GESTOR DE FILIAL
@@ -851,47 +913,69 @@ def dashboard_statistics_gestor_filial(request):
     today = timezone.now().date()
     
     # Obter usuário (gestor de filial)
-    user_id = request.query_params.get('user_id') or request.headers.get('X-User-Id')
-    if user_id:
-        try:
-            current_user = User.objects.get(id=int(user_id), is_active_user=True)
-        except (User.DoesNotExist, ValueError):
-            current_user = None
-    else:
-        current_user = User.objects.filter(is_active_user=True, user_type='GESTOR_FILIAL').first()
+    current_user = get_current_user_or_default(request, user_type='GESTOR_FILIAL')
     
     if not current_user or not current_user.clinica or not current_user.filial:
         return Response({'error': 'Gestor de filial não encontrado ou sem filial associada'}, status=400)
     
     clinica = current_user.clinica
     filial = current_user.filial
+    inicio_mes = today - timedelta(days=30)
+    inicio_semana = today - timedelta(days=7)
+    
+    # Consultas agrupadas (values().annotate()) montadas em memória: o número
+    # de consultas SQL é constante, independente do tamanho da equipe.
     
     # ==================== MÉTRICAS DA FILIAL ====================
     filial_patients = Patient.objects.filter(clinica=clinica, filial=filial, is_active=True)
-    filial_fisios = User.objects.filter(clinica=clinica, filial=filial, user_type='FISIOTERAPEUTA', is_active_user=True)
-    filial_atendentes = User.objects.filter(clinica=clinica, filial=filial, user_type='ATENDENTE', is_active_user=True)
-    
-    total_pacientes = filial_patients.count()
-    total_fisioterapeutas = filial_fisios.count()
-    total_atendentes = filial_atendentes.count()
-    
-    # Novos pacientes (últimos 30 dias)
-    novos_pacientes_mes = filial_patients.filter(
-        created_at__gte=timezone.now() - timedelta(days=30)
-    ).count()
-    
-    # Sessões realizadas no mês
-    sessoes_mes = PhysioSession.objects.filter(
-        fisioterapeuta__filial=filial,
-        scheduled_date__gte=today - timedelta(days=30),
-        status='REALIZADA'
-    ).count()
     
-    # Sessões agendadas para hoje
-    sessoes_hoje = PhysioSession.objects.filter(
-        fisioterapeuta__filial=filial,
-        scheduled_date=today
-    ).count()
+    # Equipe (fisioterapeutas e atendentes) em uma consulta
+    equipe = list(User.objects.filter(
+        clinica=clinica, filial=filial, user_type__in=['FISIOTERAPEUTA', 'ATENDENTE'], is_active_user=True
+    ))
+    filial_fisios = [user for user in equipe if user.user_type == 'FISIOTERAPEUTA']
+    filial_atendentes = [user for user in equipe if user.user_type == 'ATENDENTE']
+    
+    pacientes_por_fisio = {
+        row['fisioterapeuta']: row['total']
+        for row in filial_patients.values('fisioterapeuta').annotate(total=Count('id')).order_by()
+    }
+    
+    total_pacientes = sum(pacientes_por_fisio.values())
+    total_fisioterapeutas = len(filial_fisios)
+    total_atendentes = len(filial_atendentes)
+    
+    # Contagens dos últimos 30 dias vêm do rollup diário (DailyMetric):
+    # novos pacientes da filial e sessões realizadas por fisioterapeuta da filial
+    novos_pacientes_mes = 0
+    sessoes_por_fisio = {}
+    for row in metric_queryset(clinica=clinica).filter(
+        Q(metric='PACIENTES_NOVOS', filial=filial) | Q(metric='SESSOES_REALIZADAS', fisioterapeuta__filial=filial),
+        day__gte=inicio_mes,
+    ).values('metric', 'fisioterapeuta').annotate(total=Sum('value')).order_by():
+        if row['metric'] == 'PACIENTES_NOVOS':
+            novos_pacientes_mes += row['total']
+        else:
+            sessoes_por_fisio[row['fisioterapeuta']] = row['total']
+    sessoes_mes = sum(sessoes_por_fisio.values())
+    
+    # Sessões de hoje e distribuição por período (a partir de 7 dias atrás),
+    # em uma consulta agrupada pelo turno do horário
+    sessoes_por_periodo = {
+        row['periodo']: row
+        for row in PhysioSession.objects.filter(
+            fisioterapeuta__filial=filial,
+            scheduled_date__gte=inicio_semana,
+        ).values(periodo=Case(
+            When(scheduled_time__lt=time(12, 0), then=Value('manha')),
+            When(scheduled_time__lt=time(18, 0), then=Value('tarde')),
+            default=Value('noite'),
+        )).annotate(
+            total=Count('id'),
+            hoje=Count('id', filter=Q(scheduled_date=today)),
+        ).order_by()
+    }
+    sessoes_hoje = sum(row['hoje'] for row in sessoes_por_periodo.values())
     
     # Documentos da filial
     total_documentos = Document.objects.filter(
@@ -901,13 +985,6 @@ def dashboard_statistics_gestor_filial(request):
     # ==================== FISIOTERAPEUTAS DA EQUIPE ====================
     equipe_fisios = []
     for fisio in filial_fisios:
-        pacientes_fisio = filial_patients.filter(fisioterapeuta=fisio).count()
-        sessoes_fisio = PhysioSession.objects.filter(
-            fisioterapeuta=fisio,
-            scheduled_date__gte=today - timedelta(days=30),
-            status='REALIZADA'
-        ).count()
-        
         equipe_fisios.append({
             'id': fisio.id,
             'nome': fisio.get_full_name(),
@@ -915,8 +992,8 @@ def dashboard_statistics_gestor_filial(request):
             'phone': fisio.phone,
             'especialidade': fisio.especialidade or 'Geral',
             'crefito': fisio.crefito,
-            'pacientes': pacientes_fisio,
-            'sessoes_mes': sessoes_fisio
+            'pacientes': pacientes_por_fisio.get(fisio.id, 0),
+            'sessoes_mes': sessoes_por_fisio.get(fisio.id, 0)
         })
     
     # Ordenar por sessões (maior primeiro)
@@ -936,29 +1013,26 @@ def dashboard_statistics_gestor_filial(request):
     # Regras de visibilidade:
     # 1. Transferências INTERNAS (mesma filial origem e destino): só visível para essa filial
     # 2. Transferências INTER-FILIAIS (filiais diferentes): visível para ambas as filiais
-    
-    # Transferências internas da filial (from_filial == to_filial == filial atual)
-    transferencias_internas = PatientTransferHistory.objects.filter(
-        from_filial=filial,
-        to_filial=filial,
-        transfer_date__gte=timezone.now() - timedelta(days=30)
+    # Ambas vêm de uma única consulta (origem OU destino na filial, últimos 30 dias)
+    transferencias_mes = list(
+        PatientTransferHistory.objects.filter(
+            Q(from_filial=filial) | Q(to_filial=filial),
+            transfer_date__gte=timezone.now() - timedelta(days=30)
+        ).select_related(
+            'patient', 'from_fisioterapeuta', 'to_fisioterapeuta', 'from_filial', 'to_filial'
+        ).order_by('-transfer_date')
     )
     
-    # Transferências inter-filiais que envolvem esta filial (origem OU destino, mas não ambos)
-    transferencias_inter_filiais = PatientTransferHistory.objects.filter(
-        Q(from_filial=filial) | Q(to_filial=filial),
-        transfer_date__gte=timezone.now() - timedelta(days=30)
-    ).exclude(
-        from_filial=F('to_filial')  # Excluir transferências internas (já incluídas acima se forem da mesma filial)
+    total_transferencias_internas = sum(
+        1 for t in transferencias_mes if t.from_filial_id == t.to_filial_id == filial.id
     )
-    
-    # Combinar e ordenar
-    from itertools import chain
-    transferencias_combinadas = list(chain(transferencias_internas, transferencias_inter_filiais))
-    transferencias_combinadas = sorted(transferencias_combinadas, key=lambda x: x.transfer_date, reverse=True)[:10]
+    total_transferencias_inter = sum(
+        1 for t in transferencias_mes if t.from_filial_id != t.to_filial_id
+    )
+    total_transferencias_mes = total_transferencias_internas + total_transferencias_inter
     
     transferencias_recentes = []
-    for t in transferencias_combinadas:
+    for t in transferencias_mes[:10]:
         is_inter_filial = t.from_filial_id != t.to_filial_id if t.from_filial and t.to_filial else False
         transferencias_recentes.append({
             'id': t.id,
@@ -970,60 +1044,29 @@ def dashboard_statistics_gestor_filial(request):
             'para_filial': t.to_filial.nome if t.to_filial else 'N/A',
             'data': t.transfer_date.strftime('%d/%m/%Y %H:%M'),
             'motivo': t.reason or 'Não informado',
-            'tipo': 'entrada' if t.to_filial == filial else 'saida',
+            'tipo': 'entrada' if t.to_filial_id == filial.id else 'saida',
             'inter_filial': is_inter_filial
         })
     
-    # Contagem total: internas + inter-filiais que envolvem esta filial
-    total_transferencias_internas = PatientTransferHistory.objects.filter(
-        from_filial=filial,
-        to_filial=filial,
-        transfer_date__gte=timezone.now() - timedelta(days=30)
-    ).count()
-    
-    total_transferencias_inter = PatientTransferHistory.objects.filter(
-        Q(from_filial=filial) | Q(to_filial=filial),
-        transfer_date__gte=timezone.now() - timedelta(days=30)
-    ).exclude(
-        from_filial=F('to_filial')
-    ).count()
-    
-    total_transferencias_mes = total_transferencias_internas + total_transferencias_inter
-    
     # ==================== TOP PACIENTES (mais sessões) ====================
+    # Sessões dos últimos 30 dias anotadas na própria consulta dos pacientes
+    # (com GROUP BY o Meta.ordering não é aplicado; ordem explícita)
     top_pacientes = []
-    for paciente in filial_patients[:5]:
-        sessoes_paciente = PhysioSession.objects.filter(
-            patient=paciente,
-            scheduled_date__gte=today - timedelta(days=30)
-        ).count()
+    for paciente in filial_patients.select_related('fisioterapeuta').annotate(
+        sessoes_mes=Count('sessions', filter=Q(sessions__scheduled_date__gte=inicio_mes))
+    ).order_by('full_name')[:5]:
         top_pacientes.append({
             'id': paciente.id,
             'nome': paciente.full_name,
             'fisioterapeuta': paciente.fisioterapeuta.get_full_name() if paciente.fisioterapeuta else 'N/A',
-            'sessoes': sessoes_paciente
+            'sessoes': paciente.sessoes_mes
         })
     
     # ==================== DISTRIBUIÇÃO HORÁRIA ====================
     # Sessões por período do dia
-    sessoes_manha = PhysioSession.objects.filter(
-        fisioterapeuta__filial=filial,
-        scheduled_date__gte=today - timedelta(days=7),
-        scheduled_time__lt='12:00:00'
-    ).count()
-    
-    sessoes_tarde = PhysioSession.objects.filter(
-        fisioterapeuta__filial=filial,
-        scheduled_date__gte=today - timedelta(days=7),
-        scheduled_time__gte='12:00:00',
-        scheduled_time__lt='18:00:00'
-    ).count()
-    
-    sessoes_noite = PhysioSession.objects.filter(
-        fisioterapeuta__filial=filial,
-        scheduled_date__gte=today - timedelta(days=7),
-        scheduled_time__gte='18:00:00'
-    ).count()
+    sessoes_manha = sessoes_por_periodo.get('manha', {}).get('total', 0)
+    sessoes_tarde = sessoes_por_periodo.get('tarde', {}).get('total', 0)
+    sessoes_noite = sessoes_por_periodo.get('noite', {}).get('total', 0)
     
     return Response({
         # Info da filial
@@ -1065,6 +1108,7 @@ def dashboard_statistics_gestor_filial(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cached_dashboard('fisioterapeuta')
 def dashboard_statistics_fisioterapeuta(request):
     """
     Endpoint para retornar estatísticas do dashboard do FISIOTERAPEUTA
@@ -1085,26 +1129,11 @@ def dashboard_statistics_fisioterapeuta(request):
     #     return Response({'error': 'Acesso negado. Apenas fisioterapeutas.'}, status=status.HTTP_403_FORBIDDEN)
     
     # Identificar usuário: prioridade para sessão, depois header X-User-Id
-    from authentication.models import User
-    user = None
-    
-    if request.user.is_authenticated:
-        user = request.user
-    else:
-        # Tentar pegar do header X-User-Id
-        user_id = request.headers.get('X-User-Id')
-        if user_id:
-            try:
-                user = User.objects.get(id=int(user_id), is_active_user=True)
-            except (User.DoesNotExist, ValueError):
-                pass
+    user = get_current_user(request)
     
     # Fallback para desenvolvimento: primeiro fisioterapeuta ativo
     if not user or user.user_type != 'FISIOTERAPEUTA':
-        user = User.objects.filter(
-            user_type='FISIOTERAPEUTA',
-            is_active_user=True
-        ).order_by('id').first()
+        user = get_fallback_user(user_type='FISIOTERAPEUTA')
         
         if not user:
             return Response(
@@ -1120,16 +1149,24 @@ def dashboard_statistics_fisioterapeuta(request):
     # Total de pacientes próprios
     total_patients = my_patients.count()
     
-    # Pacientes criados esta semana
-    patients_this_week = my_patients.filter(
-        created_at__gte=timezone.now() - timedelta(days=7)
-    ).count()
+    # Contagens por período vêm do rollup diário (DailyMetric)
+    rollup = metric_queryset(fisioterapeuta=user)
+    week_ago = today - timedelta(days=7)
+    periodos = rollup.aggregate(
+        patients_this_week=Sum('value', default=0, filter=Q(metric='PACIENTES_NOVOS', day__gt=week_ago)),
+        patients_last_week=Sum('value', default=0, filter=Q(
+            metric='PACIENTES_NOVOS', day__gt=today - timedelta(days=14), day__lte=week_ago
+        )),
+        documents_today=Sum('value', default=0, filter=Q(metric='DOCUMENTOS', day=today)),
+        consultas_this_week=Sum('value', default=0, filter=Q(metric='PRONTUARIOS', day__gt=week_ago)),
+        active_records=Sum('value', default=0, filter=Q(
+            metric='PRONTUARIOS', day__gt=today - timedelta(days=30)
+        )),
+    )
     
-    # Pacientes semana passada
-    patients_last_week = my_patients.filter(
-        created_at__gte=timezone.now() - timedelta(days=14),
-        created_at__lt=timezone.now() - timedelta(days=7)
-    ).count()
+    # Pacientes criados esta semana / semana passada
+    patients_this_week = periodos['patients_this_week']
+    patients_last_week = periodos['patients_last_week']
     
     # Crescimento semanal
     if patients_last_week > 0:
@@ -1137,24 +1174,14 @@ def dashboard_statistics_fisioterapeuta(request):
     else:
         weekly_growth = 100 if patients_this_week > 0 else 0
     
-    # Documentos do fisioterapeuta
-    from documentos.models import Document
-    my_documents = Document.objects.filter(patient__fisioterapeuta=user)
-    
     # Documentos digitalizados hoje
-    documents_today = my_documents.filter(created_at__date=today).count()
+    documents_today = periodos['documents_today']
     
     # Prontuários/consultas desta semana
-    consultas_this_week = MedicalRecord.objects.filter(
-        patient__fisioterapeuta=user,
-        record_date__gte=timezone.now() - timedelta(days=7)
-    ).count()
+    consultas_this_week = periodos['consultas_this_week']
     
     # Prontuários ativos (últimos 30 dias)
-    active_records = MedicalRecord.objects.filter(
-        patient__fisioterapeuta=user,
-        record_date__gte=timezone.now() - timedelta(days=30)
-    ).count()
+    active_records = periodos['active_records']
     
     # Últimos pacientes atendidos (últimos 5)
     recent_patients = my_patients.order_by('-last_visit', '-updated_at')[:5]
@@ -1177,63 +1204,43 @@ def dashboard_statistics_fisioterapeuta(request):
     # Calcular início da semana (segunda-feira)
     week_start = today - timedelta(days=today.weekday())
     
+    semana = daily_totals(
+        rollup, ['PACIENTES_NOVOS', 'DOCUMENTOS', 'SESSOES_REALIZADAS'],
+        start=week_start, end=week_start + timedelta(days=6)
+    )
+    
     for i in range(7):
         day = week_start + timedelta(days=i)
-        day_name = days_pt[i]
-        
-        # Pacientes criados neste dia
-        patients_count = my_patients.filter(created_at__date=day).count()
-        
-        # Documentos reais criados neste dia (apenas dos meus pacientes)
-        docs_count = my_documents.filter(created_at__date=day).count()
-        
-        # Sessões/consultas realizadas neste dia
-        sessions_count = 0
-        try:
-            sessions_count = PhysioSession.objects.filter(
-                fisioterapeuta=user,
-                scheduled_date=day,
-                status='REALIZADA'
-            ).count()
-        except:
-            pass
         
         weekly_data.append({
-            'day': day_name,
-            'pacientes': patients_count,
-            'consultas': sessions_count,
-            'documentos': docs_count
+            'day': days_pt[i],
+            'pacientes': semana.get(('PACIENTES_NOVOS', day), 0),
+            'consultas': semana.get(('SESSOES_REALIZADAS', day), 0),
+            'documentos': semana.get(('DOCUMENTOS', day), 0)
         })
     
     # Tendência mensal (últimos 8 meses) - apenas do fisioterapeuta
     monthly_trend = []
     months_pt = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
     
-    for i in range(7, -1, -1):
-        month_date = today - timedelta(days=30 * i)
-        month_start = month_date.replace(day=1)
-        if month_date.month == 12:
-            month_end = month_date.replace(year=month_date.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            month_end = month_date.replace(month=month_date.month + 1, day=1) - timedelta(days=1)
-        
-        patients_in_month = my_patients.filter(
-            created_at__date__gte=month_start,
-            created_at__date__lte=month_end
-        ).count()
-        
+    for month_start, value in monthly_series(
+        rollup.filter(metric='PACIENTES_NOVOS'), 'day', 8, aggregate=Sum('value')
+    ):
         monthly_trend.append({
-            'month': months_pt[month_date.month - 1],
-            'value': patients_in_month
+            'month': months_pt[month_start.month - 1],
+            'value': value
         })
     
     # Distribuição de serviços (por tipo de prontuário) - apenas do fisioterapeuta
+    # Uma consulta agrupada; o total é a soma dos grupos
     service_distribution = []
-    record_types = MedicalRecord.objects.filter(patient__fisioterapeuta=user).values('record_type').annotate(
-        count=Count('id')
-    ).order_by('-count')
+    record_types = list(
+        MedicalRecord.objects.filter(patient__fisioterapeuta=user).values('record_type').annotate(
+            count=Count('id')
+        ).order_by('-count')
+    )
     
-    total_records = MedicalRecord.objects.filter(patient__fisioterapeuta=user).count()
+    total_records = sum(item['count'] for item in record_types)
     
     if total_records > 0:
         type_mapping = {
@@ -1264,7 +1271,7 @@ def dashboard_statistics_fisioterapeuta(request):
             fisioterapeuta=user,
             scheduled_date=today,
             status__in=['AGENDADA', 'CONFIRMADA']
-        ).order_by('scheduled_time')[:5]
+        ).select_related('patient').order_by('scheduled_time')[:5]
         
         for session in today_sessions:
             upcoming_sessions.append({
@@ -1306,7 +1313,7 @@ from authentication.permissions import (
 )
 
 
-class TreatmentPlanViewSet(viewsets.ModelViewSet):
+class TreatmentPlanViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para gerenciar Planos de Tratamento
     Endpoints:
@@ -1315,6 +1322,7 @@ class TreatmentPlanViewSet(viewsets.ModelViewSet):
     - GET /api/prontuario/treatment-plans/{id}/ - Detalhes do plano
     - PUT/PATCH /api/prontuario/treatment-plans/{id}/ - Atualiza plano
     - DELETE /api/prontuario/treatment-plans/{id}/ - Remove plano
+    - POST /api/prontuario/treatment-plans/{id}/schedule/ - Agenda as sessões do plano
     """
     queryset = TreatmentPlan.objects.all()
     permission_classes = [AllowAny]  # Temporário para desenvolvimento
@@ -1331,20 +1339,10 @@ class TreatmentPlanViewSet(viewsets.ModelViewSet):
         return TreatmentPlanSerializer
     
     def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
-        
-        # Para desenvolvimento: simular primeiro gestor se não autenticado
-        if not user.is_authenticated or not hasattr(user, 'clinica'):
-            from authentication.models import User
-            user = User.objects.filter(user_type='GESTOR', is_active_user=True).first()
-        
-        if user and hasattr(user, 'clinica'):
-            queryset = queryset.filter(clinica=user.clinica)
-            
-            # Fisioterapeuta vê apenas seus planos
-            if hasattr(user, 'is_fisioterapeuta') and user.is_fisioterapeuta:
-                queryset = queryset.filter(fisioterapeuta=user)
+        # Clínica do usuário; fisioterapeuta vê apenas seus planos
+        queryset = super().get_queryset().for_user(get_current_user(self.request))
+        # Progresso vem do contador completed_sessions (sem COUNT por plano)
+        queryset = queryset.select_related('patient', 'fisioterapeuta')
         
         # Filtros opcionais
         patient_id = self.request.query_params.get('patient', None)
@@ -1367,9 +1365,57 @@ class TreatmentPlanViewSet(viewsets.ModelViewSet):
                 serializer.save(clinica=user.clinica)
         else:
             serializer.save()
+    
+    @action(detail=True, methods=['post'])
+    def schedule(self, request, pk=None):
+        """
+        Agenda de uma vez as sessões que faltam do plano (prontuario/scheduling.py)
+        POST /api/prontuario/treatment-plans/{id}/schedule/
+        {
+            "time": "08:00",
+            "start_date": "2025-03-03",   # opcional (padrão: início do plano ou hoje)
+            "weekdays": [0, 3],           # opcional (padrão: conforme a frequência)
+            "dry_run": true               # opcional: apenas pré-visualiza
+        }
+        """
+        plan = self.get_object()
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+        try:
+            start_time = parse_time(request.data.get('time', ''))
+            start_date = request.data.get('start_date')
+            weekdays = request.data.get('weekdays') or None
+            try:
+                weekdays = [int(day) for day in weekdays] if weekdays else None
+            except (TypeError, ValueError):
+                raise ScheduleError('weekdays deve ser uma lista de números de 0 a 6.')
+            sessions, skipped = schedule_plan(
+                plan, start_time,
+                start_date=parse_date(start_date) if start_date else None,
+                weekdays=weekdays,
+                created_by=get_current_user(request),
+                dry_run=dry_run,
+            )
+        except ScheduleError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'dry_run': dry_run,
+            'created': 0 if dry_run else len(sessions),
+            'sessions': [
+                {
+                    'id': session.pk,
+                    'session_number': session.session_number,
+                    'scheduled_date': session.scheduled_date,
+                    'scheduled_time': session.scheduled_time,
+                    'duration_minutes': session.duration_minutes,
+                }
+                for session in sessions
+            ],
+            'skipped': skipped,
+        }, status=status.HTTP_200_OK if dry_run or not sessions else status.HTTP_201_CREATED)
 
 
-class PhysioSessionViewSet(viewsets.ModelViewSet):
+class PhysioSessionViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para gerenciar Sessões de Fisioterapia (Agenda)
     Endpoints:
@@ -1380,9 +1426,12 @@ class PhysioSessionViewSet(viewsets.ModelViewSet):
     - DELETE /api/prontuario/sessions/{id}/ - Remove sessão
     - GET /api/prontuario/sessions/today/ - Sessões de hoje
     - GET /api/prontuario/sessions/my_schedule/ - Minha agenda (fisio)
+    - GET /api/prontuario/sessions/availability/ - Horários livres dos fisioterapeutas
     - POST /api/prontuario/sessions/{id}/confirm/ - Confirma sessão
     - POST /api/prontuario/sessions/{id}/complete/ - Finaliza sessão
     - POST /api/prontuario/sessions/{id}/cancel/ - Cancela sessão
+    
+    A listagem aceita ?cursor= (paginação por cursor, rolagem infinita)
     """
     queryset = PhysioSession.objects.all()
     permission_classes = [AllowAny]  # Temporário para desenvolvimento
@@ -1390,6 +1439,7 @@ class PhysioSessionViewSet(viewsets.ModelViewSet):
     search_fields = ['patient__full_name', 'fisioterapeuta__first_name']
     ordering_fields = ['scheduled_date', 'scheduled_time', 'patient__full_name']
     ordering = ['-scheduled_date', '-scheduled_time']
+    pagination_class = CursorOrPageNumberPagination
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -1399,32 +1449,10 @@ class PhysioSessionViewSet(viewsets.ModelViewSet):
         return PhysioSessionSerializer
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related('patient', 'fisioterapeuta', 'treatment_plan')
         
-        # Identificar usuário: prioridade para sessão, depois header X-User-Id
-        user = None
-        if self.request.user.is_authenticated:
-            user = self.request.user
-        else:
-            user_id = self.request.headers.get('X-User-Id')
-            if user_id:
-                from authentication.models import User
-                try:
-                    user = User.objects.get(id=int(user_id), is_active_user=True)
-                except (User.DoesNotExist, ValueError):
-                    pass
-        
-        # Fallback para gestor
-        if not user:
-            from authentication.models import User
-            user = User.objects.filter(user_type='GESTOR', is_active_user=True).first()
-        
-        if user and hasattr(user, 'clinica') and user.clinica:
-            queryset = queryset.filter(clinica=user.clinica)
-            
-            # Fisioterapeuta vê apenas sua agenda
-            if user.user_type == 'FISIOTERAPEUTA':
-                queryset = queryset.filter(fisioterapeuta=user)
+        # Clínica do usuário; fisioterapeuta vê apenas sua agenda
+        queryset = queryset.for_user(get_current_user(self.request))
         
         # Filtros opcionais
         date_filter = self.request.query_params.get('date', None)
@@ -1445,33 +1473,102 @@ class PhysioSessionViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def _reject_conflicts(self, serializer):
+        """
+        Recusa (400) horário sobreposto a outra sessão do fisioterapeuta ou do paciente.
+        Chamado dentro da transação da gravação, com a agenda do fisioterapeuta bloqueada.
+        """
+        data = serializer.validated_data
+        instance = serializer.instance
+        
+        def value(field):
+            return data[field] if field in data else getattr(instance, field, None)
+        
+        scheduling_fields = ['fisioterapeuta', 'patient', 'scheduled_date', 'scheduled_time', 'duration_minutes', 'status']
+        if instance is not None and not any(field in data for field in scheduling_fields):
+            return
+        if value('status') in FREE_STATUSES:
+            return
+        
+        fisioterapeuta, patient = value('fisioterapeuta'), value('patient')
+        lock_agenda(fisioterapeuta.pk)
+        try:
+            check_booking(
+                fisioterapeuta.pk, patient.pk, value('scheduled_date'), value('scheduled_time'),
+                value('duration_minutes') or PhysioSession._meta.get_field('duration_minutes').default,
+                exclude_pk=getattr(instance, 'pk', None)
+            )
+        except ScheduleError as exc:
+            raise ValidationError({'scheduled_time': [str(exc)]})
+    
     def perform_create(self, serializer):
-        # Identificar usuário: prioridade para sessão, depois header X-User-Id
-        user = None
-        if self.request.user.is_authenticated:
-            user = self.request.user
-        else:
-            user_id = self.request.headers.get('X-User-Id')
-            if user_id:
-                from authentication.models import User
-                try:
-                    user = User.objects.get(id=int(user_id), is_active_user=True)
-                except (User.DoesNotExist, ValueError):
-                    pass
+        # Identificar usuário (fallback para desenvolvimento: primeiro usuário ativo)
+        user = get_current_user(self.request) or get_fallback_user()
+        
+        with transaction.atomic():
+            self._reject_conflicts(serializer)
+            # Preencher clinica automaticamente
+            if user and hasattr(user, 'clinica') and user.clinica:
+                serializer.save(clinica=user.clinica, created_by=user)
+            else:
+                # Fallback: usar primeira clínica
+                from authentication.models import Clinica
+                clinica = Clinica.objects.first()
+                serializer.save(clinica=clinica, created_by=user)
+    
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            self._reject_conflicts(serializer)
+            serializer.save()
+    
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        """
+        Horários livres e ocupados dos fisioterapeutas
+        GET /api/prontuario/sessions/availability/?fisioterapeuta=&filial=&from=&to=&duration=
         
-        # Fallback para desenvolvimento
-        if not user:
-            from authentication.models import User
-            user = User.objects.filter(is_active_user=True).order_by('id').first()
+        Padrões: fisioterapeutas visíveis ao usuário (o próprio, a filial ou a
+        clínica), de hoje a 6 dias depois, slots de 50 minutos no expediente
+        (WORKDAY_START a WORKDAY_END). No máximo 31 dias por consulta.
+        """
+        from authentication.models import User
         
-        # Preencher clinica automaticamente
-        if user and hasattr(user, 'clinica') and user.clinica:
-            serializer.save(clinica=user.clinica, created_by=user)
-        else:
-            # Fallback: usar primeira clínica
-            from authentication.models import Clinica
-            clinica = Clinica.objects.first()
-            serializer.save(clinica=clinica, created_by=user)
+        user = get_current_user(request)
+        if not user or not user.clinica_id:
+            return Response({'error': 'Usuário não identificado'}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        params = request.query_params
+        try:
+            start = parse_date(params['from'], 'from') if params.get('from') else date.today()
+            end = parse_date(params['to'], 'to') if params.get('to') else start + timedelta(days=6)
+            duration = int(params.get('duration') or PhysioSession._meta.get_field('duration_minutes').default)
+        except (ScheduleError, ValueError) as exc:
+            message = str(exc) if isinstance(exc, ScheduleError) else 'duration deve ser um número de minutos.'
+            return Response({'error': message}, status=status.HTTP_400_BAD_REQUEST)
+        if end < start or (end - start).days >= MAX_AVAILABILITY_DAYS or duration <= 0:
+            return Response(
+                {'error': f'Período inválido (até {MAX_AVAILABILITY_DAYS} dias) ou duração inválida.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        fisioterapeutas = User.objects.filter(
+            clinica_id=user.clinica_id, user_type='FISIOTERAPEUTA', is_active_user=True
+        ).order_by('first_name', 'last_name')
+        if user.is_fisioterapeuta:
+            fisioterapeutas = fisioterapeutas.filter(pk=user.pk)
+        elif user.is_gestor_filial or user.is_atendente:
+            fisioterapeutas = fisioterapeutas.filter(filial_id=user.filial_id)
+        if params.get('fisioterapeuta'):
+            fisioterapeutas = fisioterapeutas.filter(pk=params['fisioterapeuta'])
+        if params.get('filial'):
+            fisioterapeutas = fisioterapeutas.filter(filial_id=params['filial'])
+        
+        return Response({
+            'from': start,
+            'to': end,
+            'duration_minutes': duration,
+            'fisioterapeutas': availability(list(fisioterapeutas), start, end, duration),
+        })
     
     @action(detail=False, methods=['get'])
     def today(self, request):
@@ -1531,11 +1628,14 @@ class PhysioSessionViewSet(viewsets.ModelViewSet):
         session.pain_scale_before = request.data.get('pain_scale_before', session.pain_scale_before)
         session.pain_scale_after = request.data.get('pain_scale_after', session.pain_scale_after)
         session.observations = request.data.get('observations', session.observations)
-        session.save()
         
-        # Atualizar last_visit do paciente
-        session.patient.last_visit = timezone.now()
-        session.patient.save()
+        # Sessão, contador do plano (signal) e última visita na mesma transação
+        with transaction.atomic():
+            session.save()
+            
+            # Atualizar last_visit do paciente
+            session.patient.last_visit = timezone.now()
+            session.patient.save()
         
         return Response({'status': 'Sessão finalizada'})
     
@@ -1568,7 +1668,7 @@ class PhysioSessionViewSet(viewsets.ModelViewSet):
         return Response({'status': 'Falta registrada'})
 
 
-class DischargeViewSet(viewsets.ModelViewSet):
+class DischargeViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para gerenciar Altas/Encerramentos
     Endpoints:
@@ -1589,20 +1689,9 @@ class DischargeViewSet(viewsets.ModelViewSet):
         return DischargeSerializer
     
     def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
-        
-        if not user.is_authenticated or not hasattr(user, 'clinica'):
-            from authentication.models import User
-            user = User.objects.filter(user_type='GESTOR', is_active_user=True).first()
-        
-        if user and hasattr(user, 'clinica'):
-            queryset = queryset.filter(clinica=user.clinica)
-            
-            if hasattr(user, 'is_fisioterapeuta') and user.is_fisioterapeuta:
-                queryset = queryset.filter(fisioterapeuta=user)
-        
-        return queryset
+        # Clínica do usuário; fisioterapeuta vê apenas suas altas
+        queryset = super().get_queryset().for_user(get_current_user(self.request))
+        return queryset.select_related('patient', 'fisioterapeuta', 'treatment_plan')
     
     def perform_create(self, serializer):
         user = self.request.user if self.request.user.is_authenticated else None
@@ -1629,17 +1718,12 @@ def list_transfer_requests(request):
     - Gestor de Filial: vê solicitações que envolvem sua filial
     - Gestor Geral: vê todas as solicitações da clínica
     """
-    from authentication.models import User
-    
-    user_id = request.headers.get('X-User-Id') or request.query_params.get('user_id')
+    user = get_current_user(request)
     status_filter = request.query_params.get('status', None)
     
-    if not user_id:
-        return Response({'error': 'Usuário não identificado'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    try:
-        user = User.objects.get(id=user_id)
-    except User.DoesNotExist:
+    if not user:
+        if requested_user_id(request) is None:
+            return Response({'error': 'Usuário não identificado'}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'error': 'Usuário não encontrado'}, status=status.HTTP_404_NOT_FOUND)
     
     # Base queryset
@@ -1684,14 +1768,11 @@ def create_transfer_request(request):
     """
     from authentication.models import User
     
-    user_id = request.headers.get('X-User-Id') or request.query_params.get('user_id')
-    
-    if not user_id:
-        return Response({'error': 'Usuário não identificado'}, status=status.HTTP_400_BAD_REQUEST)
+    user = get_current_user(request)
     
-    try:
-        user = User.objects.get(id=user_id)
-    except User.DoesNotExist:
+    if not user:
+        if requested_user_id(request) is None:
+            return Response({'error': 'Usuário não identificado'}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'error': 'Usuário não encontrado'}, status=status.HTTP_404_NOT_FOUND)
     
     # Apenas fisioterapeutas podem criar solicitações
@@ -1768,16 +1849,11 @@ def approve_transfer_request(request, pk):
     Aprova uma solicitação de transferência
     Apenas Gestores podem aprovar
     """
-    from authentication.models import User
-    
-    user_id = request.headers.get('X-User-Id') or request.query_params.get('user_id')
-    
-    if not user_id:
-        return Response({'error': 'Usuário não identificado'}, status=status.HTTP_400_BAD_REQUEST)
+    user = get_current_user(request)
     
-    try:
-        user = User.objects.get(id=user_id)
-    except User.DoesNotExist:
+    if not user:
+        if requested_user_id(request) is None:
+            return Response({'error': 'Usuário não identificado'}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'error': 'Usuário não encontrado'}, status=status.HTTP_404_NOT_FOUND)
     
     # Apenas gestores podem aprovar
@@ -1824,16 +1900,11 @@ def reject_transfer_request(request, pk):
     Rejeita uma solicitação de transferência
     Apenas Gestores podem rejeitar
     """
-    from authentication.models import User
+    user = get_current_user(request)
     
-    user_id = request.headers.get('X-User-Id') or request.query_params.get('user_id')
-    
-    if not user_id:
-        return Response({'error': 'Usuário não identificado'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    try:
-        user = User.objects.get(id=user_id)
-    except User.DoesNotExist:
+    if not user:
+        if requested_user_id(request) is None:
+            return Response({'error': 'Usuário não identificado'}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'error': 'Usuário não encontrado'}, status=status.HTTP_404_NOT_FOUND)
     
     # Apenas gestores podem rejeitar
@@ -1886,16 +1957,11 @@ def cancel_transfer_request(request, pk):
     Cancela uma solicitação de transferência
     Apenas o fisioterapeuta que criou pode cancelar
     """
-    from authentication.models import User
-    
-    user_id = request.headers.get('X-User-Id') or request.query_params.get('user_id')
-    
-    if not user_id:
-        return Response({'error': 'Usuário não identificado'}, status=status.HTTP_400_BAD_REQUEST)
+    user = get_current_user(request)
     
-    try:
-        user = User.objects.get(id=user_id)
-    except User.DoesNotExist:
+    if not user:
+        if requested_user_id(request) is None:
+            return Response({'error': 'Usuário não identificado'}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'error': 'Usuário não encontrado'}, status=status.HTTP_404_NOT_FOUND)
     
     try:
@@ -0,0 +1,19 @@
+"""
+Initializer de pools de processos 'spawn' (ver generate_load_dataset)
+
+O processo filho importa o initializer antes de carregar o Django, por isso
+este módulo não importa modelos. As funções das tarefas só são
+desserializadas depois do initializer, e seus módulos podem importar
+modelos normalmente.
+"""
+import os
+
+
+def init_django_worker(settings_module):
+    """Carrega o Django no processo filho (que começa vazio no 'spawn')"""
+    import django
+    from django.apps import apps
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    if not apps.ready:
+        django.setup()